@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.executor import executor, loop_lag
+from app.core.metrics import ADMISSION_REJECTED
+
+# Route classes under admission control, by path prefix; everything else passes straight through.
+ROUTE_CLASSES = (("/v1/generate", "generate"), ("/v1/analytics", "analytics"))
+
+
+class Rejected(RuntimeError):
+    """A request refused before any work: 429 for a client over its rate, 503 while overloaded."""
+
+    def __init__(self, detail: str, status: int, retry_after: int, reason: str):
+        super().__init__(detail)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+@dataclass
+class TokenBucket:
+    tokens: float
+    updated: float
+
+    def take(self, rate: float, burst: float, now: float) -> float:
+        """Take one token; returns 0, or the seconds until one will be available."""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / rate
+
+
+def route_class(path: str) -> Optional[str]:
+    for prefix, name in ROUTE_CLASSES:
+        if path == prefix or path.startswith(prefix + "/"):
+            return name
+    return None
+
+
+class AdmissionController:
+    """Decides, before any database or CPU work, whether a request runs now, waits briefly or is refused.
+
+    In order: shed everything (503) while event-loop lag or the executor queue
+    is over its bound; refuse a client past its token bucket for the route
+    class (429); then run within max_concurrency requests, waiting at most
+    queue_timeout in a FIFO of at most max_queue. Refusals are cheap, so the
+    admitted requests keep their latency when a spike arrives. rate 0 or
+    max_concurrency 0 turns that stage off.
+    """
+
+    def __init__(
+        self,
+        rates: Dict[str, Tuple[float, float]],
+        max_clients: int = 10_000,
+        max_concurrency: int = 16,
+        max_queue: int = 64,
+        queue_timeout: float = 1.0,
+        max_loop_lag: float = 0.25,
+    ):
+        self.rates = rates  # route class -> (requests per second, burst)
+        self.max_clients = max_clients
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_loop_lag = max_loop_lag
+        self.in_flight = 0
+        self.queued = 0
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self, route: str, client: str) -> None:
+        """Take a concurrency slot for one request, or raise Rejected; pair with release()."""
+        if self.max_loop_lag and loop_lag.lag > self.max_loop_lag:
+            raise Rejected("overloaded: event_loop_lag", 503, 1, "event_loop_lag")
+        if executor.pending >= executor.max_pending:
+            raise Rejected("overloaded: executor_queue_full", 503, 1, "executor_queue_full")
+
+        rate, burst = self.rates.get(route, (0.0, 0.0))
+        if rate > 0:
+            wait = self._bucket(route, client, burst).take(rate, burst, time.monotonic())
+            if wait:
+                raise Rejected("rate_limited", 429, math.ceil(wait), "rate_limited")
+
+        if not self.max_concurrency or (self.in_flight < self.max_concurrency and not self.queued):
+            self.in_flight += 1
+            return
+        if self.queued >= self.max_queue:
+            raise Rejected("overloaded: admission_queue_full", 503, 1, "queue_full")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # On 3.12 wait_for can time out after release() handed the slot over in the same
+            # iteration; the slot is ours then, so take it rather than leak it.
+            if fut.done() and not fut.cancelled():
+                return
+            raise Rejected("overloaded: admission_queue_timeout", 503, 1, "queue_timeout")
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()  # the slot was handed over just as the caller went away
+            raise
+        finally:
+            self.queued -= 1
+
+    def release(self) -> None:
+        # Hand the slot to the oldest waiter still waiting, so in_flight never dips in between.
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _bucket(self, route: str, client: str, burst: float) -> TokenBucket:
+        key = (route, client)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(float(burst), time.monotonic())
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+
+def client_key(scope: Scope, header: str = "") -> str:
+    """The client a request is accounted to: first address of `header` when set and present, else the peer."""
+    if header:
+        name = header.lower().encode()
+        for key, value in scope.get("headers", ()):
+            if key == name:
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying `admission` to the ROUTE_CLASSES paths.
+
+    The slot is held until the response body is fully sent, so streamed
+    responses (generate/bulk) count for as long as they keep producing.
+    """
+
+    def __init__(self, app: ASGIApp, controller: Optional[AdmissionController] = None) -> None:
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        route = route_class(scope["path"]) if scope["type"] == "http" and scope["method"] != "OPTIONS" else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(route, client_key(scope, settings.admission_client_header))
+        except Rejected as exc:
+            ADMISSION_REJECTED.labels(route, exc.reason).inc()
+            response = JSONResponse(
+                {"detail": str(exc)}, status_code=exc.status, headers={"Retry-After": str(exc.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+
+admission = AdmissionController(
+    rates={
+        "generate": (settings.admission_generate_rate, settings.admission_generate_burst),
+        "analytics": (settings.admission_analytics_rate, settings.admission_analytics_burst),
+    },
+    max_clients=settings.admission_max_clients,
+    max_concurrency=settings.admission_max_concurrency,
+    max_queue=settings.admission_max_queue,
+    queue_timeout=settings.admission_queue_timeout_seconds,
+    max_loop_lag=settings.admission_max_loop_lag_seconds,
+)
@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,11 +13,77 @@ class Settings(BaseSettings):
     # Example: postgresql://postgres:<password>@db.<project>.supabase.co:5432/postgres
     database_url: str
 
+    # Connection pools: imports write through database_url (the primary); read-only routes use
+    # database_read_url (e.g. a replica), or their own pool on the primary when it is empty.
+    # Set a statement cache size of 0 behind pgbouncer in transaction mode.
+    database_read_url: str = ""
+    db_write_pool_min_size: int = 1
+    db_write_pool_max_size: int = 4
+    db_write_statement_cache_size: int = 100
+    db_write_acquire_timeout_seconds: float = 10.0
+    db_read_pool_min_size: int = 1
+    db_read_pool_max_size: int = 10
+    db_read_statement_cache_size: int = 100
+    db_read_acquire_timeout_seconds: float = 2.0
+
     # CORS
     cors_origins: str = "http://localhost:3000"
 
     # Optional simple admin key for imports
     admin_import_key: str = ""
 
+    # Background polling of active game_sources rows (see app.services.import_scheduler)
+    import_scheduler_enabled: bool = False
+    import_scheduler_tick_seconds: float = 15.0
+    import_scheduler_max_concurrency: int = 2  # each running import holds a write-pool connection
+    import_backoff_max_seconds: float = 6 * 3600
+    import_http_timeout_seconds: float = 30.0
+
+    # In-process stats/weights cache (see app.services.stats_cache)
+    stats_cache_max_bytes: int = 64 * 1024 * 1024
+    stats_cache_revalidate_seconds: float = 30.0
+    # How long past revalidation (or an import) a value is still served while it refreshes in the background
+    stats_cache_stale_seconds: float = 300.0
+
+    # Exact constrained sampler (see app.services.constraints)
+    constraint_table_max_cells: int = 8_000_000
+    constraint_table_cache_bytes: int = 128 * 1024 * 1024
+
+    # Upper bound on the total lines one /v1/generate/bulk request may ask for
+    generate_bulk_max_lines: int = 1_000_000
+
+    # /v1/analytics/backtest: upper bound on draws x lines x strategies, and per-task CPU timeout
+    backtest_max_lines: int = 50_000_000
+    backtest_task_timeout_seconds: float = 120.0
+
+    # Most explicit game ids one /v1/analytics/batch request may name
+    analytics_batch_max_games: int = 50
+
+    # Cache-Control sent with ETag'd read responses (games, draws, analytics); data only changes on import.
+    http_cache_control: str = "public, max-age=15, s-maxage=60, stale-while-revalidate=300"
+
+    # Admission control for /v1/generate* and /v1/analytics* (see app.core.admission): per-client token
+    # buckets (requests/second and burst; rate 0 disables), then one concurrency limit shared by both route
+    # classes (0 = unlimited) with a short bounded wait queue. Everything is shed while the event loop lags.
+    admission_generate_rate: float = 5.0
+    admission_generate_burst: int = 20
+    admission_analytics_rate: float = 10.0
+    admission_analytics_burst: int = 40
+    # Header naming the client (first address of e.g. x-forwarded-for) behind a trusted proxy; else the peer
+    admission_client_header: str = ""
+    admission_max_clients: int = 10_000  # token buckets kept, least recently used dropped first
+    admission_max_concurrency: int = 16
+    admission_max_queue: int = 64
+    admission_queue_timeout_seconds: float = 1.0
+    admission_max_loop_lag_seconds: float = 0.25  # 0 disables lag shedding
+
+    # CPU work executor (see app.core.executor); workers defaults to the CPU count
+    executor_kind: Literal["thread", "process"] = "thread"
+    executor_workers: Optional[int] = None
+    executor_max_pending: int = 64
+    executor_task_timeout_seconds: float = 10.0
+    loop_lag_interval_seconds: float = 0.5
+    loop_lag_warn_seconds: float = 0.1
+
 
 settings = Settings()  # type: ignore
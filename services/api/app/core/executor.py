@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Literal, Optional, TypeVar
+
+from app.core.config import settings
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ExecutorBusy(RuntimeError):
+    """The CPU task queue is full; the caller should back off and retry."""
+
+
+class TaskTimeout(RuntimeError):
+    """A CPU task did not finish within its timeout."""
+
+
+class TaskExecutor:
+    """Runs CPU-bound work (stats, weights, sampling) off the event loop.
+
+    At most max_pending tasks may be queued or running; further submissions
+    raise ExecutorBusy instead of piling up. A task that overruns its timeout
+    raises TaskTimeout to the caller, but keeps its slot until the worker
+    actually finishes, so the bound stays honest.
+    """
+
+    def __init__(
+        self,
+        kind: Literal["thread", "process"] = "thread",
+        workers: Optional[int] = None,
+        max_pending: int = 64,
+        timeout: Optional[float] = 10.0,
+    ):
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._pool: Optional[Executor] = None
+
+    def start(self) -> None:
+        if self._pool is not None:
+            return
+        if self.kind == "process":
+            # spawn: forking a process that runs an event loop and DB pool is not safe.
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="cpu")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, fn: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> T:
+        """Run fn(*args, **kwargs) in the pool; with kind="process" everything must be picklable."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorBusy("executor_queue_full")
+        self.start()
+
+        self.pending += 1
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+        fut.add_done_callback(self._release)
+        limit = self.timeout if timeout is None else timeout
+        try:
+            # shield: a timed-out task keeps running (threads cannot be killed), only the caller stops waiting.
+            return await asyncio.wait_for(asyncio.shield(fut), limit)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise TaskTimeout(f"task_timeout: {getattr(fn, '__name__', 'task')} exceeded {limit}s")
+
+    def _release(self, _fut: asyncio.Future) -> None:
+        self.pending -= 1
+
+
+class LoopLagMonitor:
+    """Measures event-loop lag: how late a periodic sleep wakes up."""
+
+    def __init__(self, interval: float = 0.5, warn_seconds: float = 0.1):
+        self.interval = interval
+        self.warn_seconds = warn_seconds
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(loop.time() - start - self.interval, 0.0)
+            self.max_lag = max(self.max_lag, self.lag)
+            if self.lag > self.warn_seconds:
+                log.warning("event loop lag %.0f ms", self.lag * 1000)
+
+
+executor = TaskExecutor(
+    kind=settings.executor_kind,
+    workers=settings.executor_workers,
+    max_pending=settings.executor_max_pending,
+    timeout=settings.executor_task_timeout_seconds,
+)
+loop_lag = LoopLagMonitor(
+    interval=settings.loop_lag_interval_seconds,
+    warn_seconds=settings.loop_lag_warn_seconds,
+)
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import hashlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Sequence
+
+import asyncpg
+from fastapi import Request, Response
+
+from app.core.config import settings
+
+# The response conditional() last put validators on, in this request's context.
+_validated: ContextVar[Optional[Response]] = ContextVar("validated_response", default=None)
+# (game_id, draws version, games.updated_at) when those validators cover a single game.
+_validated_game: ContextVar[Optional[tuple]] = ContextVar("validated_game", default=None)
+
+
+def make_etag(*parts: object) -> str:
+    """Strong ETag over the given version parts."""
+    digest = hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/"x" matches "x".
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """RFC 9110 precedence: If-None-Match wins; If-Modified-Since only applies without it."""
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return _etag_matches(inm, etag)
+    ims = request.headers.get("if-modified-since")
+    if ims and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": settings.http_cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+async def data_version(
+    conn: asyncpg.Connection, game_id: Optional[str] = None, game_ids: Optional[Sequence[str]] = None
+) -> tuple:
+    """(games count, games updated_at, draws version, latest draw_date, draws updated_at) for ETag building.
+
+    With game_ids, games updated_at and the draw fields cover just those games
+    (latest timestamps, summed versions). The draw fields are None when no game
+    is given or none has draws yet.
+    """
+    if game_ids is None and game_id is not None:
+        game_ids = [game_id]
+    row = await conn.fetchrow(
+        """
+        select
+            (select count(*) from public.games) as games_count,
+            (
+                select max(updated_at) from public.games
+                where $1::text[] is null or id::text = any($1::text[])
+            ) as games_updated_at,
+            v.version, v.latest_draw_date, v.updated_at
+        from (
+            select sum(version) as version, max(latest_draw_date) as latest_draw_date, max(updated_at) as updated_at
+            from public.game_data_versions
+            where game_id::text = any($1::text[])
+        ) v
+        """,
+        list(game_ids) if game_ids is not None else None,
+    )
+    return tuple(row)
+
+
+async def conditional(
+    request: Request,
+    response: Response,
+    conn: asyncpg.Connection,
+    game_id: Optional[str] = None,
+    game_ids: Optional[Sequence[str]] = None,
+) -> Optional[Response]:
+    """Validate the request against the current data version before any real work.
+
+    Returns a 304 response to send as-is, or None after putting ETag,
+    Last-Modified and Cache-Control on `response` for the normal 200.
+    """
+    version = await data_version(conn, game_id, game_ids)
+    params = sorted(request.query_params.multi_items())
+    etag = make_etag(request.url.path, params, *version)
+    stamps = [t for t in (version[1], version[4]) if t is not None]
+    last_modified = max(stamps) if stamps else None
+
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    _validated.set(response)
+    if game_ids is None and game_id is not None:
+        _validated_game.set((game_id, version[2], version[1]))
+    return None
+
+
+def validated_version(game_id: str) -> Optional[tuple]:
+    """(draws version, games.updated_at) this request's validators were built from, if they cover just game_id.
+
+    A body built from data at any other version must not carry them (see mark_stale).
+    """
+    validated = _validated_game.get()
+    if validated is None or validated[0] != game_id or _validated.get() is None:
+        return None
+    return validated[1:]
+
+
+def mark_stale() -> None:
+    """The body is being built from data older than the version conditional() validated.
+
+    Drops the validators and makes the response uncacheable, so no cache keeps
+    the stale body under the new ETag.
+    """
+    response = _validated.get()
+    if response is None:
+        return
+    for name in ("etag", "last-modified"):
+        if name in response.headers:
+            del response.headers[name]
+    response.headers["Cache-Control"] = "no-store"
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+import asyncpg
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+_LATENCY_BUCKETS = (0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    "mp_http_request_duration_seconds",
+    "Request latency by route template, until the last body byte is sent.",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+POOL_ACQUIRE_WAIT = Histogram(
+    "mp_db_pool_acquire_seconds",
+    "Time spent waiting for an asyncpg pool connection.",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+POOL_EXHAUSTED = Counter(
+    "mp_db_pool_exhausted_total", "Acquires that hit the acquire timeout (answered with 503).", ["pool"]
+)
+STAGE_DURATION = Histogram(
+    "mp_stage_duration_seconds",
+    "Hot-path stage timings (db fetch, stats build, sampling, ...).",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+GENERATOR_CANDIDATES = Counter(
+    "mp_generator_candidates_total", "Candidate lines drawn by the generator.", ["sampler"]
+)
+GENERATOR_ACCEPTED = Counter("mp_generator_lines_total", "Lines returned by the generator.", ["sampler"])
+GENERATOR_REJECTIONS = Counter(
+    "mp_generator_rejections_total",
+    "Candidates rejected per constraint rule (a candidate may fail several).",
+    ["constraint"],
+)
+ADMISSION_REJECTED = Counter(
+    "mp_admission_rejected_total",
+    "Requests refused by admission control (rate_limited, event_loop_lag, executor_queue_full, queue_*).",
+    ["route_class", "reason"],
+)
+IMPORT_ROWS = Counter("mp_import_rows_total", "Draw rows processed by imports.", ["outcome"])
+IMPORT_POLLS = Counter(
+    "mp_import_polls_total", "Scheduled source polls (not_modified, imported, failed).", ["outcome"]
+)
+IMPORT_DURATION = Histogram(
+    "mp_import_duration_seconds",
+    "Wall time of whole import runs.",
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block into mp_stage_duration_seconds{stage=name}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.labels(name).observe(time.perf_counter() - start)
+
+
+def record_generation(sampler: str, candidates: int, accepted: int, rejections: dict) -> None:
+    GENERATOR_CANDIDATES.labels(sampler).inc(candidates)
+    GENERATOR_ACCEPTED.labels(sampler).inc(accepted)
+    for rule, n in rejections.items():
+        GENERATOR_REJECTIONS.labels(rule).inc(n)
+
+
+def record_import(result, seconds: float) -> None:
+    """result: services.draw_import.ImportResult."""
+    IMPORT_DURATION.observe(seconds)
+    for outcome in ("inserted", "updated", "unchanged", "skipped_old"):
+        IMPORT_ROWS.labels(outcome).inc(getattr(result, outcome))
+
+
+class RuntimeCollector(Collector):
+    """Pool, executor and cache state, read at scrape time."""
+
+    def __init__(self) -> None:
+        self.pools: Dict[str, asyncpg.Pool] = {}
+
+    def describe(self):
+        # Without this, register() calls collect() to learn the names, before those imports can resolve.
+        return []
+
+    def collect(self):
+        # Imported here: these modules import settings and would create a cycle at import time.
+        from app.core.admission import admission
+        from app.core.executor import executor, loop_lag
+        from app.services.stats_cache import stats_cache
+
+        if self.pools:
+            size = GaugeMetricFamily("mp_db_pool_size", "Open pool connections.", labels=["pool"])
+            in_use = GaugeMetricFamily("mp_db_pool_in_use", "Pool connections checked out.", labels=["pool"])
+            max_size = GaugeMetricFamily("mp_db_pool_max_size", "Pool max_size.", labels=["pool"])
+            for name, pool in self.pools.items():
+                size.add_metric([name], pool.get_size())
+                in_use.add_metric([name], pool.get_size() - pool.get_idle_size())
+                max_size.add_metric([name], pool.get_max_size())
+            yield from (size, in_use, max_size)
+
+        yield GaugeMetricFamily("mp_executor_pending", "CPU tasks queued or running.", value=executor.pending)
+        yield GaugeMetricFamily("mp_executor_max_pending", "CPU task queue bound.", value=executor.max_pending)
+        yield CounterMetricFamily("mp_executor_rejected", "CPU tasks refused (queue full).", value=executor.rejected)
+        yield CounterMetricFamily("mp_executor_timed_out", "CPU tasks past their timeout.", value=executor.timed_out)
+        yield GaugeMetricFamily("mp_event_loop_lag_seconds", "Last measured event-loop lag.", value=loop_lag.lag)
+        yield GaugeMetricFamily("mp_admission_in_flight", "Admitted requests running.", value=admission.in_flight)
+        yield GaugeMetricFamily("mp_admission_queued", "Requests waiting for a slot.", value=admission.queued)
+        yield CounterMetricFamily("mp_stats_cache_hits", "Stats cache hits.", value=stats_cache.hits)
+        yield CounterMetricFamily("mp_stats_cache_misses", "Stats cache misses.", value=stats_cache.misses)
+        yield CounterMetricFamily(
+            "mp_stats_cache_coalesced", "Loads joined while already in flight.", value=stats_cache.coalesced
+        )
+        yield CounterMetricFamily(
+            "mp_stats_cache_stale_served", "Out-of-date values served during a refresh.", value=stats_cache.stale_served
+        )
+        yield CounterMetricFamily(
+            "mp_stats_cache_refresh_failures", "Background refreshes that failed.", value=stats_cache.refresh_failures
+        )
+
+
+runtime = RuntimeCollector()
+REGISTRY.register(runtime)
+
+
+def render() -> tuple:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording REQUEST_LATENCY with the matched route template as label.
+
+    Unmatched paths share one label so arbitrary URLs cannot blow up cardinality.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], getattr(route, "path", "<unmatched>"), str(status)
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, AsyncIterable, Dict, Iterable, Optional, Tuple, Union
+
+import asyncpg
+
+DrawRecord = Tuple[Union[date, str], Dict[str, Any]]
+
+
+@dataclass
+class UpsertCounts:
+    rows: int  # records staged, including repeated draw dates
+    inserted: int
+    updated: int
+    unchanged: int
+
+
+async def _stage_rows(records: Union[Iterable[DrawRecord], AsyncIterable[DrawRecord]], source: Optional[str]):
+    if hasattr(records, "__aiter__"):
+        async for draw_date, numbers in records:
+            yield (str(draw_date), json.dumps(numbers), source)
+    else:
+        for draw_date, numbers in records:
+            yield (str(draw_date), json.dumps(numbers), source)
+
+
+async def upsert_draws(
+    conn: asyncpg.Connection,
+    game_id: str,
+    records: Union[Iterable[DrawRecord], AsyncIterable[DrawRecord]],
+    source: Optional[str] = None,
+) -> UpsertCounts:
+    """Upsert (draw_date, numbers) records for one game in a single transaction.
+
+    Rows are streamed into a temp table with COPY and merged into public.draws
+    with one statement; for a repeated draw_date the last record wins. A None
+    source keeps the existing source of updated rows.
+    """
+    async with conn.transaction():
+        await conn.execute("drop table if exists pg_temp.draws_stage")
+        await conn.execute(
+            """
+            create temp table draws_stage (
+                seq bigserial,
+                draw_date text not null,
+                numbers text not null,
+                source text
+            ) on commit drop
+            """
+        )
+        status = await conn.copy_records_to_table(
+            "draws_stage",
+            records=_stage_rows(records, source),
+            columns=["draw_date", "numbers", "source"],
+        )
+        counts = await conn.fetchrow(
+            """
+            with staged as (
+                select distinct on (draw_date::date)
+                    draw_date::date as draw_date, numbers::jsonb as numbers, source
+                from draws_stage
+                order by draw_date::date, seq desc
+            ),
+            merged as (
+                insert into public.draws as d (game_id, draw_date, numbers, source)
+                select $1::uuid, draw_date, numbers, source
+                from staged
+                on conflict (game_id, draw_date) do update
+                    set numbers = excluded.numbers, source = coalesce(excluded.source, d.source)
+                    where d.numbers is distinct from excluded.numbers
+                       or d.source is distinct from coalesce(excluded.source, d.source)
+                returning (xmax = 0) as inserted
+            )
+            select
+                (select count(*) from staged) as unique_dates,
+                count(*) filter (where inserted) as inserted,
+                count(*) filter (where not inserted) as updated
+            from merged
+            """,
+            game_id,
+        )
+
+    inserted, updated = counts["inserted"], counts["updated"]
+    return UpsertCounts(
+        rows=int(status.split()[-1]),
+        inserted=inserted,
+        updated=updated,
+        unchanged=counts["unique_dates"] - inserted - updated,
+    )
@@ -3,11 +3,25 @@ from typing import AsyncIterator
 import asyncpg
 from fastapi import Depends, Request
 
+from app.core.config import settings
+from app.db.session import acquire
 
-async def get_pg_pool(request: Request) -> asyncpg.Pool:
-    return request.app.state.pg_pool
 
+async def get_read_pool(request: Request) -> asyncpg.Pool:
+    return request.app.state.pg_read_pool
 
-async def get_pg_conn(pool: asyncpg.Pool = Depends(get_pg_pool)) -> AsyncIterator[asyncpg.Connection]:
-    async with pool.acquire() as conn:
+
+async def get_write_pool(request: Request) -> asyncpg.Pool:
+    return request.app.state.pg_write_pool
+
+
+async def get_read_conn(pool: asyncpg.Pool = Depends(get_read_pool)) -> AsyncIterator[asyncpg.Connection]:
+    """A connection from the read pool, for routes that never write."""
+    async with acquire(pool, settings.db_read_acquire_timeout_seconds, "read") as conn:
+        yield conn
+
+
+async def get_write_conn(pool: asyncpg.Pool = Depends(get_write_pool)) -> AsyncIterator[asyncpg.Connection]:
+    """A connection from the write pool (primary), for imports."""
+    async with acquire(pool, settings.db_write_acquire_timeout_seconds, "write") as conn:
         yield conn
@@ -1,18 +1,76 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
 import asyncpg
 from fastapi import FastAPI
 
 from app.core.config import settings
+from app.core.metrics import POOL_ACQUIRE_WAIT, POOL_EXHAUSTED, runtime
+
+
+class PoolExhausted(RuntimeError):
+    """No pool connection became free within the acquire timeout; the caller should back off and retry."""
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    # rules / numbers come back as dicts and lists, and are sent as plain Python values.
+    for name in ("json", "jsonb"):
+        await conn.set_type_codec(name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+async def create_pool(dsn: str, min_size: int, max_size: int, statement_cache_size: int) -> asyncpg.Pool:
+    return await asyncpg.create_pool(
+        dsn=dsn,
+        min_size=min_size,
+        max_size=max_size,
+        statement_cache_size=statement_cache_size,
+        init=_init_connection,
+    )
 
 
 async def init_db(app: FastAPI) -> None:
-    app.state.pg_pool = await asyncpg.create_pool(dsn=settings.database_url, min_size=1, max_size=10)
+    """Open the write pool (primary) and the read pool (replica, or a separate pool on the primary).
+
+    Separate pools keep a long import from holding connections that reads are waiting for.
+    """
+    app.state.pg_write_pool = await create_pool(
+        settings.database_url,
+        settings.db_write_pool_min_size,
+        settings.db_write_pool_max_size,
+        settings.db_write_statement_cache_size,
+    )
+    app.state.pg_read_pool = await create_pool(
+        settings.database_read_url or settings.database_url,
+        settings.db_read_pool_min_size,
+        settings.db_read_pool_max_size,
+        settings.db_read_statement_cache_size,
+    )
+    runtime.pools = {"read": app.state.pg_read_pool, "write": app.state.pg_write_pool}
 
 
 async def close_db(app: FastAPI) -> None:
-    pool = getattr(app.state, "pg_pool", None)
-    if pool:
-        await pool.close()
+    for name in ("pg_read_pool", "pg_write_pool"):
+        pool = getattr(app.state, name, None)
+        if pool:
+            await pool.close()
 
 
-def get_pool(app: FastAPI):
-    return app.state.pg_pool
+@asynccontextmanager
+async def acquire(
+    pool: asyncpg.Pool, timeout: Optional[float], role: str = "read"
+) -> AsyncIterator[asyncpg.Connection]:
+    """pool.acquire() that raises PoolExhausted after `timeout` seconds instead of queueing indefinitely."""
+    start = time.perf_counter()
+    try:
+        conn = await pool.acquire(timeout=timeout)
+    except asyncio.TimeoutError:
+        POOL_EXHAUSTED.labels(role).inc()
+        raise PoolExhausted(f"db_pool_exhausted: {role}")
+    POOL_ACQUIRE_WAIT.labels(role).observe(time.perf_counter() - start)
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
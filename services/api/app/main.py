@@ -1,12 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app.core.admission import AdmissionMiddleware
 from app.core.config import settings
-from app.db.session import init_db, close_db
+from app.core.executor import ExecutorBusy, TaskTimeout, executor, loop_lag
+from app.core.metrics import MetricsMiddleware, render
+from app.db.session import PoolExhausted, init_db, close_db
 from app.routers import games, draws, analytics, generator, importer
+from app.services.import_scheduler import import_scheduler
+from app.services.stats_cache import stats_cache
 
 app = FastAPI(title=settings.app_name)
 
+# Innermost, so refusals still get CORS headers and are counted by MetricsMiddleware.
+app.add_middleware(AdmissionMiddleware)
 origins = [o.strip() for o in settings.cors_origins.split(",") if o.strip()]
 app.add_middleware(
     CORSMiddleware,
@@ -15,21 +23,57 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 
 @app.on_event("startup")
 async def _startup():
     await init_db(app)
+    stats_cache.pool = app.state.pg_read_pool
+    executor.start()
+    loop_lag.start()
+    if settings.import_scheduler_enabled:
+        import_scheduler.start(app.state.pg_write_pool)
 
 
 @app.on_event("shutdown")
 async def _shutdown():
+    await import_scheduler.stop()
+    await loop_lag.stop()
+    await stats_cache.stop()
+    executor.shutdown()
     await close_db(app)
 
 
+@app.exception_handler(ExecutorBusy)
+async def _executor_busy(request: Request, exc: ExecutorBusy):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(PoolExhausted)
+async def _pool_exhausted(request: Request, exc: PoolExhausted):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(TaskTimeout)
+async def _task_timeout(request: Request, exc: TaskTimeout):
+    return JSONResponse({"detail": str(exc)}, status_code=504)
+
+
 @app.get("/health")
 async def health():
-    return {"ok": True, "name": settings.app_name, "environment": settings.environment}
+    return {
+        "ok": True,
+        "name": settings.app_name,
+        "environment": settings.environment,
+        "loop_lag_ms": round(loop_lag.lag * 1000, 1),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render()
+    return Response(body, media_type=content_type)
 
 
 app.include_router(games.router, prefix="/v1", tags=["games"])
@@ -1,31 +1,51 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Query
+import asyncio
+import secrets
+from datetime import date
+from typing import Dict, List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 import asyncpg
+import numpy as np
 
-from app.db.deps import get_pg_conn
-from app.services.scoring import compute_number_stats
+from app.core.config import settings
+from app.core.executor import executor
+from app.core.http_cache import conditional
+from app.core.metrics import stage
+from app.db.deps import get_read_conn
+from app.services import backtest, gaps
+from app.services.cooccurrence import pair_matrix, top_pairs, top_triples
+from app.services.number_stats import SUMMARY_WINDOWS, summary_stats, trend_stats
+from app.services.rules import rule_int
+from app.services.scoring import NumberStats, grouped_number_stats, stats_from_arrays
+from app.services.stats_cache import HISTORY_LIMIT, stats_cache
+from app.services.timeseries import draw_range, rolling_counts, sample_points
 
 router = APIRouter()
 
 
 @router.get("/analytics")
 async def analytics(
+    request: Request,
+    response: Response,
     game_id: str = Query(...),
     window: int = Query(150, ge=20, le=2000),
-    conn: asyncpg.Connection = Depends(get_pg_conn),
+    conn: asyncpg.Connection = Depends(get_read_conn),
 ):
-    game = await conn.fetchrow(
-        """
-        select rules
-        from public.games
-        where id::text = $1
-        """,
-        game_id,
-    )
-    if not game:
-        return {"error": "game_not_found"}
-    rules = game["rules"] or {}
+    not_modified = await conditional(request, response, conn, game_id)
+    if not_modified:
+        return not_modified
+    if window in SUMMARY_WINDOWS:
+        # Precomputed window: read the summary rows instead of parsing draws.
+        rules = await conn.fetchval("select rules from public.games where id::text = $1", game_id)
+        if rules is None:
+            return {"error": "game_not_found"}
+    else:
+        entry = await stats_cache.stats(conn, game_id, window)
+        if entry is None:
+            return {"error": "game_not_found"}
+        rules = entry.snapshot.rules
     main_count = rules.get("main_count")
     main_min = rules.get("main_min")
     main_max = rules.get("main_max")
@@ -33,28 +53,17 @@ async def analytics(
         # Non-numeric games (e.g., Alaska charitable templates)
         return {"window_draws": 0, "main": {"top_hot": [], "top_cold": []}, "note": "non_numeric_game"}
 
-    rows = await conn.fetch(
-        """
-        select numbers
-        from public.draws
-        where game_id::text = $1
-        order by draw_date desc
-        limit $2
-        """,
-        game_id,
-        window,
-    )
-    draws_main = []
-    for r in rows:
-        nums = r["numbers"] or {}
-        main = nums.get("main")
-        if isinstance(main, list) and all(isinstance(x, int) for x in main):
-            draws_main.append(main)
-
-    if not draws_main:
+    if window in SUMMARY_WINDOWS:
+        window_draws, stats = await summary_stats(conn, game_id, "main", window, main_min, main_max)
+    else:
+        window_draws, stats = entry.window_draws, entry.stats_main
+    return _hot_cold(window_draws, stats)
+
+
+def _hot_cold(window_draws: int, stats: Dict[int, NumberStats]) -> dict:
+    if not window_draws:
         return {"window_draws": 0, "main": {"top_hot": [], "top_cold": []}}
 
-    stats = compute_number_stats(draws_main, main_min=main_min, main_max=main_max)
     hot = sorted(((n, s.count) for n, s in stats.items()), key=lambda x: (-x[1], x[0]))[:10]
     cold = sorted(
         ((n, s.last_seen_draws_ago) for n, s in stats.items()),
@@ -62,9 +71,447 @@ async def analytics(
     )[:10]
 
     return {
-        "window_draws": len(draws_main),
+        "window_draws": window_draws,
         "main": {
             "top_hot": [{"n": n, "count": c} for n, c in hot],
             "top_cold": [{"n": n, "last_seen_draws_ago": a} for n, a in cold],
         },
     }
+
+
+def _batch_hot_cold(
+    ids: List[str],
+    lows: List[int],
+    sizes: List[int],
+    groups: List[int],
+    ago: List[int],
+    draws: List[List[int]],
+    window: int,
+) -> Dict[str, dict]:
+    offsets, counts, last_seen = grouped_number_stats(
+        np.asarray(groups, dtype=np.int64),
+        np.asarray(ago, dtype=np.int64),
+        draws,
+        np.asarray(lows, dtype=np.int64),
+        np.asarray(sizes, dtype=np.int64),
+    )
+    window_draws = np.bincount(np.asarray(groups, dtype=np.int64), minlength=len(ids)).tolist()
+    out = {}
+    for g, game_id in enumerate(ids):
+        a, b = offsets[g], offsets[g + 1]
+        out[game_id] = _hot_cold(window_draws[g], stats_from_arrays(counts[a:b], last_seen[a:b], lows[g], window))
+    return out
+
+
+@router.get("/analytics/batch")
+async def analytics_batch(
+    request: Request,
+    response: Response,
+    game_ids: str = Query("all", description="Comma separated game ids, or all for every active game"),
+    window: int = Query(150, ge=20, le=2000),
+    conn: asyncpg.Connection = Depends(get_read_conn),
+):
+    """/v1/analytics hot/cold for several games, from one windowed query over their draws."""
+    if game_ids.strip() == "all":
+        games = await conn.fetch(
+            """
+            select id::text as id, rules
+            from public.games
+            where is_active = true
+            order by game_type, name
+            """
+        )
+        wanted = [g["id"] for g in games]
+    else:
+        wanted = list(dict.fromkeys(x.strip() for x in game_ids.split(",") if x.strip()))
+        if not wanted:
+            raise HTTPException(status_code=400, detail="invalid_game_ids")
+        if len(wanted) > settings.analytics_batch_max_games:
+            raise HTTPException(status_code=400, detail="too_many_games")
+        games = await conn.fetch(
+            "select id::text as id, rules from public.games where id::text = any($1::text[])",
+            wanted,
+        )
+
+    not_modified = await conditional(request, response, conn, game_ids=[g["id"] for g in games])
+    if not_modified:
+        return not_modified
+
+    results: Dict[str, dict] = {game_id: {"error": "game_not_found"} for game_id in wanted}
+    ids: List[str] = []
+    lows: List[int] = []
+    sizes: List[int] = []
+    for g in games:
+        rules = g["rules"] or {}
+        main_min, main_max = rules.get("main_min"), rules.get("main_max")
+        if isinstance(rules.get("main_count"), int) and isinstance(main_min, int) and isinstance(main_max, int):
+            ids.append(g["id"])
+            lows.append(main_min)
+            sizes.append(main_max - main_min + 1)
+        else:
+            results[g["id"]] = {
+                "window_draws": 0,
+                "main": {"top_hot": [], "top_cold": []},
+                "note": "non_numeric_game",
+            }
+    if not ids:
+        return {"window": window, "games": results}
+
+    # Latest `window` parseable draws per game (as the stats cache counts them), numbered from 0.
+    with stage("db_fetch_batch"):
+        rows = await conn.fetch(
+            """
+            select game_id::text as game_id, rn - 1 as ago, main
+            from (
+                select
+                    d.game_id,
+                    public.draw_pool_numbers(d.numbers, 'main') as main,
+                    row_number() over (partition by d.game_id order by d.draw_date desc) as rn
+                from public.draws d
+                where d.game_id = any($1::uuid[])
+                  and public.draw_pool_numbers(d.numbers, 'main') is not null
+            ) r
+            where rn <= $2
+            """,
+            ids,
+            window,
+        )
+    index = {game_id: g for g, game_id in enumerate(ids)}
+    groups = [index[r["game_id"]] for r in rows]
+    ago = [r["ago"] for r in rows]
+    draws = [r["main"] for r in rows]
+    with stage("batch_stats"):
+        results.update(await executor.run(_batch_hot_cold, ids, lows, sizes, groups, ago, draws, window))
+    return {"window": window, "games": results}
+
+
+def _pool_pairs(
+    packed: Optional[np.ndarray],
+    lo: Optional[int],
+    hi: Optional[int],
+    window: int,
+    top: int,
+    triples: bool,
+    matrix: bool,
+) -> Optional[dict]:
+    if packed is None or lo is None or hi is None:
+        return None
+    size = hi - lo + 1
+    rows = packed[:window]
+    counts = pair_matrix(rows, size)
+    out: dict = {
+        "top_pairs": [{"a": lo + i, "b": lo + j, "count": c} for i, j, c in top_pairs(counts, top)],
+    }
+    if triples:
+        out["top_triples"] = [
+            {"a": lo + i, "b": lo + j, "c": lo + k, "count": c} for i, j, k, c in top_triples(rows, size, top)
+        ]
+    if matrix:
+        # Row/column r is number lo + r; the diagonal holds single-number counts.
+        out["matrix"] = {"min": lo, "counts": counts.tolist()}
+    return out
+
+
+@router.get("/analytics/pairs")
+async def analytics_pairs(
+    request: Request,
+    response: Response,
+    game_id: str = Query(...),
+    window: int = Query(150, ge=20, le=2000),
+    top: int = Query(20, ge=1, le=200),
+    triples: bool = Query(False),
+    matrix: bool = Query(False),
+    conn: asyncpg.Connection = Depends(get_read_conn),
+):
+    not_modified = await conditional(request, response, conn, game_id)
+    if not_modified:
+        return not_modified
+    snap = await stats_cache.snapshot(conn, game_id)
+    if snap is None:
+        return {"error": "game_not_found"}
+    rules = snap.rules
+    if snap.main is None:
+        return {"window_draws": 0, "main": None, "bonus": None, "note": "non_numeric_game"}
+
+    main_lo, main_hi = rule_int(rules, "main_min"), rule_int(rules, "main_max")
+    bonus_lo, bonus_hi = rule_int(rules, "bonus_min"), rule_int(rules, "bonus_max")
+    with stage("pairs"):
+        main = await executor.run(_pool_pairs, snap.main, main_lo, main_hi, window, top, triples, matrix)
+        bonus = await executor.run(_pool_pairs, snap.bonus, bonus_lo, bonus_hi, window, top, triples, matrix)
+    return {"window_draws": min(window, len(snap.main)), "main": main, "bonus": bonus}
+
+
+@router.get("/analytics/timeseries")
+async def analytics_timeseries(
+    request: Request,
+    response: Response,
+    game_id: str = Query(...),
+    window: int = Query(50, ge=1, le=2000),
+    pool: Literal["main", "bonus"] = Query("main"),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    points: int = Query(200, ge=2, le=2000),
+    numbers: Optional[str] = Query(None, description="Comma separated subset, e.g. 7,21,33"),
+    conn: asyncpg.Connection = Depends(get_read_conn),
+):
+    not_modified = await conditional(request, response, conn, game_id)
+    if not_modified:
+        return not_modified
+    hist = await stats_cache.history(conn, game_id)
+    if hist is None:
+        return {"error": "game_not_found"}
+    cum = hist.main_cum if pool == "main" else hist.bonus_cum
+    lo = rule_int(hist.rules, f"{pool}_min")
+    if cum is None or lo is None:
+        return {
+            "window": window,
+            "pool": pool,
+            "dates": [],
+            "window_draws": [],
+            "series": [],
+            "note": "non_numeric_game",
+        }
+
+    size = cum.shape[1]
+    if numbers:
+        try:
+            wanted = sorted({int(x) for x in numbers.split(",") if x.strip()})
+        except ValueError:
+            raise HTTPException(status_code=400, detail="invalid_numbers")
+        if any(not (lo <= n < lo + size) for n in wanted):
+            raise HTTPException(status_code=400, detail="number_out_of_range")
+    else:
+        wanted = list(range(lo, lo + size))
+
+    a, b = draw_range(hist.dates, start, end)
+    positions = sample_points(a, b, points)
+    counts, span = rolling_counts(cum, positions, window)
+    counts = counts[:, [n - lo for n in wanted]]
+
+    return {
+        "window": window,
+        "pool": pool,
+        "total_draws": b - a,
+        "dates": [str(d) for d in hist.dates[positions].tolist()],
+        "window_draws": span.tolist(),
+        "series": [{"n": n, "counts": col} for n, col in zip(wanted, counts.T.tolist())],
+    }
+
+
+def _gap_stats(cum: np.ndarray) -> gaps.GapStats:
+    return gaps.gap_stats(gaps.hits_from_cumulative(cum))
+
+
+def _rounded(x: float, digits: int = 2) -> Optional[float]:
+    return None if np.isnan(x) else round(float(x), digits)
+
+
+@router.get("/analytics/gaps")
+async def analytics_gaps(
+    request: Request,
+    response: Response,
+    game_id: str = Query(...),
+    pool: Literal["main", "bonus"] = Query("main"),
+    conn: asyncpg.Connection = Depends(get_read_conn),
+):
+    """Per-number gap distribution, current gap percentile and longest streak over the whole history."""
+    not_modified = await conditional(request, response, conn, game_id)
+    if not_modified:
+        return not_modified
+    hist = await stats_cache.history(conn, game_id)
+    if hist is None:
+        return {"error": "game_not_found"}
+    cum = hist.main_cum if pool == "main" else hist.bonus_cum
+    lo = rule_int(hist.rules, f"{pool}_min")
+    if cum is None or lo is None:
+        return {"pool": pool, "total_draws": 0, "numbers": [], "note": "non_numeric_game"}
+
+    with stage("gaps"):
+        g = await executor.run(_gap_stats, cum)
+    dates = hist.dates
+    numbers = []
+    for i in range(cum.shape[1]):
+        out: dict = {"n": lo + i, "appearances": int(g.appearances[i]), "gaps": None}
+        if g.gap_count[i]:
+            out["gaps"] = {
+                "count": int(g.gap_count[i]),
+                "min": int(g.gap_min[i]),
+                "mean": _rounded(g.gap_mean[i]),
+                "max": int(g.gap_max[i]),
+                **{f"p{p}": _rounded(v) for p, v in zip(gaps.PERCENTILES, g.gap_percentiles[i])},
+            }
+        out["current_gap"] = int(g.current_gap[i]) if g.current_gap[i] >= 0 else None
+        out["current_gap_percentile"] = _rounded(g.current_gap_percentile[i], 1)
+        out["longest_streak"] = None
+        if g.longest_streak[i]:
+            out["longest_streak"] = {
+                "draws": int(g.longest_streak[i]),
+                "end_date": str(dates[g.longest_streak_end[i]]),
+            }
+        numbers.append(out)
+    return {"pool": pool, "total_draws": int(cum.shape[0] - 1), "numbers": numbers}
+
+
+@router.get("/analytics/trend")
+async def analytics_trend(
+    request: Request,
+    response: Response,
+    game_id: str = Query(...),
+    pool: Literal["main", "bonus"] = Query("main"),
+    conn: asyncpg.Connection = Depends(get_read_conn),
+):
+    """Recency-decayed appearance rate per number, as used by the "trend" generator strategy."""
+    not_modified = await conditional(request, response, conn, game_id)
+    if not_modified:
+        return not_modified
+    rules = await conn.fetchval("select rules from public.games where id::text = $1", game_id)
+    if rules is None:
+        return {"error": "game_not_found"}
+    count, lo, hi = (rule_int(rules, f"{pool}_{k}") for k in ("count", "min", "max"))
+    if count is None or lo is None or hi is None:
+        return {"pool": pool, "numbers": [], "note": "non_numeric_game"}
+
+    trend = await trend_stats(conn, game_id, pool, lo, hi)
+    if trend is None or not trend.mass:
+        return {"pool": pool, "effective_draws": 0, "numbers": [], "top_trending": [], "top_fading": []}
+    rates = (trend.weights / trend.mass).tolist()
+    numbers = [
+        {"n": lo + i, "weight": _rounded(w, 4), "rate": _rounded(r, 4)}
+        for i, (w, r) in enumerate(zip(trend.weights, rates))
+    ]
+    trending = sorted(range(len(rates)), key=lambda i: (-rates[i], i))[:10]
+    fading = sorted(range(len(rates)), key=lambda i: (rates[i], i))[:10]
+    return {
+        "pool": pool,
+        "half_life_draws": trend.half_life_draws,
+        "effective_draws": _rounded(trend.mass, 2),
+        "latest_draw_date": trend.latest_draw_date.isoformat(),
+        # Rate every number would have if all were equally likely.
+        "expected_rate": _rounded(count / (hi - lo + 1), 4),
+        "numbers": numbers,
+        "top_trending": [{"n": lo + i, "rate": numbers[i]["rate"]} for i in trending],
+        "top_fading": [{"n": lo + i, "rate": numbers[i]["rate"]} for i in fading],
+    }
+
+
+async def _backtest_pool(
+    packed: Optional[np.ndarray],
+    lo: Optional[int],
+    hi: Optional[int],
+    k: Optional[int],
+    stream: int,
+    seed: int,
+    window: int,
+    n_draws: int,
+    lines: int,
+    strategies: List[str],
+) -> Optional[dict]:
+    if packed is None or lo is None or hi is None or k is None or not (1 <= k <= hi - lo + 1):
+        return None
+    # Pools can hold different numbers of draws; every replayed draw needs one before it.
+    n_draws = min(n_draws, len(packed) - 1)
+    if n_draws < 1:
+        return None
+    size = hi - lo + 1
+    timeout = settings.backtest_task_timeout_seconds
+    weights, draws = await executor.run(backtest.prepare, packed, size, window, n_draws, strategies, timeout=timeout)
+
+    # Whole blocks per task, about one task per worker; see backtest.backtest_blocks for why the split is free.
+    step = backtest.block_draws(lines)
+    n_blocks = -(-n_draws // step)
+    per_task = -(-n_blocks // min(executor.workers, n_blocks))
+    tasks = []
+    for first in range(0, n_blocks, per_task):
+        rows = slice(first * step, (first + per_task) * step)
+        chunk = {s: w[rows] for s, w in weights.items()}
+        tasks.append(
+            executor.run(
+                backtest.backtest_blocks, seed, stream, first, chunk, draws[rows], lines, k, size, timeout=timeout
+            )
+        )
+    hist = {s: np.zeros(k + 1, dtype=np.int64) for s in strategies}
+    for part in await asyncio.gather(*tasks):
+        for s, counts in part.items():
+            hist[s] += counts
+
+    total = n_draws * lines
+    return {
+        "draws_tested": n_draws,
+        "picks": k,
+        "expected_random": [round(p, 6) for p in backtest.hypergeometric(size, k)],
+        "strategies": {
+            s: {
+                "lines": total,
+                "mean_matches": round(float(counts @ np.arange(k + 1)) / total, 6),
+                "distribution": counts.tolist(),
+            }
+            for s, counts in hist.items()
+        },
+    }
+
+
+@router.get("/analytics/backtest")
+async def analytics_backtest(
+    request: Request,
+    response: Response,
+    game_id: str = Query(...),
+    strategies: Optional[str] = Query(None, description="Comma separated, default all: balanced,hot,cold,random"),
+    draws: int = Query(500, ge=1, le=HISTORY_LIMIT - 1),
+    lines: int = Query(1000, ge=1, le=10000),
+    window: int = Query(150, ge=20, le=2000),
+    rng_seed: Optional[int] = Query(None, ge=0),
+    conn: asyncpg.Connection = Depends(get_read_conn),
+):
+    """Replay the latest `draws` draws: before each, weight every strategy on the preceding `window`
+    draws, sample `lines` lines and count how many numbers each shares with the actual draw.
+
+    distribution[m] is the number of lines with m matches; expected_random is the
+    same distribution (as probabilities) for uniformly random lines. Each pool reports its own
+    draws_tested, as the bonus pool can hold fewer draws than the main one.
+    """
+    wanted = [s.strip() for s in strategies.split(",") if s.strip()] if strategies else list(backtest.STRATEGIES)
+    if not wanted or any(s not in backtest.STRATEGIES for s in wanted):
+        raise HTTPException(status_code=400, detail="invalid_strategies")
+    wanted = list(dict.fromkeys(wanted))
+    if draws * lines * len(wanted) > settings.backtest_max_lines:
+        raise HTTPException(status_code=422, detail=f"too_many_lines: max {settings.backtest_max_lines}")
+
+    # Only a seeded backtest is repeatable, so only that one gets validators.
+    if rng_seed is not None:
+        not_modified = await conditional(request, response, conn, game_id)
+        if not_modified:
+            return not_modified
+    snap = await stats_cache.snapshot(conn, game_id)
+    if snap is None:
+        return {"error": "game_not_found"}
+    seed = rng_seed if rng_seed is not None else secrets.randbits(63)
+    out = {"window": window, "draws_tested": 0, "lines_per_draw": lines, "rng_seed": seed}
+    if snap.main is None:
+        return {**out, "main": None, "bonus": None, "note": "non_numeric_game"}
+
+    # Every replayed draw needs at least one draw before it.
+    n_draws = min(draws, len(snap.main) - 1)
+    if n_draws < 1:
+        return {**out, "main": None, "bonus": None}
+    out["draws_tested"] = n_draws
+    rules = snap.rules
+
+    args = (seed, window, n_draws, lines, wanted)
+    with stage("backtest"):
+        main = await _backtest_pool(
+            snap.main,
+            rule_int(rules, "main_min"),
+            rule_int(rules, "main_max"),
+            rule_int(rules, "main_count"),
+            0,
+            *args,
+        )
+        bonus = await _backtest_pool(
+            snap.bonus,
+            rule_int(rules, "bonus_min"),
+            rule_int(rules, "bonus_max"),
+            rule_int(rules, "bonus_count"),
+            1,
+            *args,
+        )
+    return {**out, "main": main, "bonus": bonus}
@@ -1,20 +1,32 @@
 from __future__ import annotations
 
+import uuid
 from datetime import date
-from fastapi import APIRouter, Depends, Query
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 import asyncpg
 
-from app.db.deps import get_pg_conn
+from app.core.config import settings
+from app.core.http_cache import conditional
+from app.db.deps import get_read_conn, get_read_pool
+from app.services.export import DEFAULT_PAGE_SIZE, arrow_stream, draw_pages, ndjson_stream
 
 router = APIRouter()
 
 
 @router.get("/draws")
 async def list_draws(
+    request: Request,
+    response: Response,
     game_id: str = Query(...),
     limit: int = Query(50, ge=1, le=500),
-    conn: asyncpg.Connection = Depends(get_pg_conn),
+    conn: asyncpg.Connection = Depends(get_read_conn),
 ):
+    not_modified = await conditional(request, response, conn, game_id)
+    if not_modified:
+        return not_modified
     rows = await conn.fetch(
         """
         select draw_date, numbers
@@ -28,3 +40,32 @@ async def list_draws(
     )
     draws = [{"draw_date": r["draw_date"].isoformat(), "numbers": r["numbers"]} for r in rows]
     return {"draws": draws}
+
+
+@router.get("/draws/export")
+async def export_draws(
+    game_id: List[str] = Query(..., description="Repeat for several games"),
+    format: Literal["ndjson", "arrow"] = Query("ndjson"),
+    since: Optional[date] = Query(None),
+    until: Optional[date] = Query(None),
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=100, le=50_000),
+    pool: asyncpg.Pool = Depends(get_read_pool),
+):
+    """Stream full draw history ordered by (game_id, draw_date), in bounded memory."""
+    try:
+        game_ids = sorted({uuid.UUID(g) for g in game_id})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid_game_id")
+
+    pages = draw_pages(pool, game_ids, since, until, page_size, settings.db_read_acquire_timeout_seconds)
+    if format == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="arrow_format_unavailable")
+        return StreamingResponse(
+            arrow_stream(pages),
+            media_type="application/vnd.apache.arrow.stream",
+            headers={"Content-Disposition": 'attachment; filename="draws.arrows"'},
+        )
+    return StreamingResponse(ndjson_stream(pages), media_type="application/x-ndjson")
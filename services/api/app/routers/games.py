@@ -1,15 +1,19 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 import asyncpg
 
-from app.db.deps import get_pg_conn
+from app.core.http_cache import conditional
+from app.db.deps import get_read_conn
 
 router = APIRouter()
 
 
 @router.get("/games")
-async def list_games(conn: asyncpg.Connection = Depends(get_pg_conn)):
+async def list_games(request: Request, response: Response, conn: asyncpg.Connection = Depends(get_read_conn)):
+    not_modified = await conditional(request, response, conn)
+    if not_modified:
+        return not_modified
     rows = await conn.fetch(
         """
         select id::text as id, key, name, region, game_type, rules
@@ -1,12 +1,25 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+import asyncio
+import json
+import secrets
+from collections import deque
+from typing import AsyncIterator, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import asyncpg
+import numpy as np
 
-from app.db.deps import get_pg_conn
-from app.services.scoring import compute_number_stats
-from app.services.picker import Constraints, generate_lines
+from app.core.config import settings
+from app.core.executor import ExecutorBusy, TaskTimeout, executor
+from app.core.metrics import record_generation, stage
+from app.db.deps import get_read_conn
+from app.services.constraints import ConstraintError, Constraints, constraint_table
+from app.services.number_stats import trend_stats
+from app.services.picker import LineArrays, sample_shard, shard_sizes, trend_weights
+from app.services.stats_cache import HISTORY_LIMIT, StatsEntry, stats_cache
 
 router = APIRouter()
 
@@ -14,24 +27,34 @@ router = APIRouter()
 class GenerateRequest(BaseModel):
     game_id: str
     n_lines: int = Field(5, ge=1, le=100)
-    strategy: str = Field("balanced")  # balanced|hot|cold|random
+    strategy: str = Field("balanced")  # balanced|hot|cold|random|trend
+    constraints: dict = Field(default_factory=dict)  # see constraints.Constraints
+    # Same seed + same draw history -> same lines; omitted means a fresh seed, echoed back.
+    rng_seed: Optional[int] = Field(None, ge=0, lt=2**63)
+
+
+class BulkSpec(BaseModel):
+    game_id: str
+    n_lines: int = Field(1000, ge=1)
+    strategy: str = Field("balanced")  # balanced|hot|cold|random|trend
     constraints: dict = Field(default_factory=dict)
 
 
-@router.post("/generate")
-async def generate(req: GenerateRequest, conn: asyncpg.Connection = Depends(get_pg_conn)):
-    game = await conn.fetchrow(
-        """
-        select id::text as id, rules
-        from public.games
-        where id = $1::uuid
-        """,
-        req.game_id,
-    )
-    if not game:
-        return {"lines": []}
+class BulkGenerateRequest(BaseModel):
+    specs: List[BulkSpec] = Field(..., min_length=1, max_length=50)
+    # Spec i draws from stream i of this seed; returned in the X-RNG-Seed header.
+    rng_seed: Optional[int] = Field(None, ge=0, lt=2**63)
+
+
+NON_NUMERIC_WARNING = "This game uses a custom (non-numeric) format. Generator is enabled only for numeric games."
 
-    rules = game["rules"] or {}
+# Weighted by the trigger-maintained decayed counts instead of window stats (see number_stats.trend_stats).
+TREND = "trend"
+
+
+def _sampler_kwargs(entry: StatsEntry, strategy: str, constraints: Constraints) -> Optional[dict]:
+    """sample_lines keyword arguments for a cached stats entry, or None for non-numeric games."""
+    rules = entry.snapshot.rules
     main_count = rules.get("main_count")
     main_min = rules.get("main_min")
     main_max = rules.get("main_max")
@@ -40,54 +63,159 @@ async def generate(req: GenerateRequest, conn: asyncpg.Connection = Depends(get_
     bonus_max = rules.get("bonus_max")
 
     if not (main_count and main_min and main_max):
-        # Non-numeric / custom game template
-        return {
-            "lines": [],
-            "warning": "This game uses a custom (non-numeric) format. Generator is enabled only for numeric games.",
-        }
-
-    draw_rows = await conn.fetch(
-        """
-        select numbers
-        from public.draws
-        where game_id = $1::uuid
-        order by draw_date desc
-        limit 2000
-        """,
-        req.game_id,
-    )
-
-    draws_main: list[list[int]] = []
-    draws_bonus: list[list[int]] = []
-    for r in draw_rows:
-        numbers = r["numbers"] or {}
-        if isinstance(numbers.get("main"), list):
-            draws_main.append([int(x) for x in numbers.get("main")])
-        if isinstance(numbers.get("bonus"), list):
-            draws_bonus.append([int(x) for x in numbers.get("bonus")])
-
-    stats_main = compute_number_stats(draws_main, int(main_min), int(main_max))
-    stats_bonus = None
-    if bonus_count and bonus_min and bonus_max:
-        stats_bonus = compute_number_stats(draws_bonus, int(bonus_min), int(bonus_max))
-
-    constraints = Constraints(
-        odd_even=req.constraints.get("odd_even", "any"),
-        avoid_runs=bool(req.constraints.get("avoid_runs", True)),
-    )
-
-    lines = generate_lines(
-        n_lines=req.n_lines,
-        strategy=req.strategy,
+        return None
+    return dict(
+        strategy=strategy,
         main_count=int(main_count),
         main_min=int(main_min),
         main_max=int(main_max),
-        stats_main=stats_main,
+        stats_main=entry.stats_main,
         bonus_count=int(bonus_count) if bonus_count else 0,
         bonus_min=int(bonus_min) if bonus_min else 0,
         bonus_max=int(bonus_max) if bonus_max else 0,
-        stats_bonus=stats_bonus,
+        stats_bonus=entry.stats_bonus,
         constraints=constraints,
+        weights_main=entry.weights_main,
+        weights_bonus=entry.weights_bonus,
     )
 
-    return {"lines": lines}
+
+async def _use_trend_weights(conn: asyncpg.Connection, game_id: str, kwargs: dict) -> None:
+    """Replace the sampler weights with the game's trend summary; uniform for pools without draws yet."""
+    pools = ["main"] + (["bonus"] if kwargs["bonus_count"] and kwargs["bonus_min"] and kwargs["bonus_max"] else [])
+    for pool in pools:
+        lo, hi = kwargs[f"{pool}_min"], kwargs[f"{pool}_max"]
+        trend = await trend_stats(conn, game_id, pool, lo, hi)
+        kwargs[f"weights_{pool}"] = trend_weights(trend.weights if trend else np.zeros(hi - lo + 1))
+
+
+@router.post("/generate")
+async def generate(req: GenerateRequest, conn: asyncpg.Connection = Depends(get_read_conn)):
+    # The trend strategy only needs the rules and window stats from the cache, not weights.
+    entry = await stats_cache.stats(conn, req.game_id, HISTORY_LIMIT, None if req.strategy == TREND else req.strategy)
+    if entry is None:
+        return {"lines": []}
+
+    try:
+        constraints = Constraints.from_dict(req.constraints)
+        kwargs = _sampler_kwargs(entry, req.strategy, constraints)
+        if kwargs is None:
+            # Non-numeric / custom game template
+            return {"lines": [], "warning": NON_NUMERIC_WARNING}
+        if req.strategy == TREND:
+            await _use_trend_weights(conn, req.game_id, kwargs)
+        seed = req.rng_seed if req.rng_seed is not None else secrets.randbits(63)
+        with stage("sampling"):
+            sizes = shard_sizes(req.n_lines)
+            shards = await asyncio.gather(
+                *(executor.run(sample_shard, seed, 0, i, size, **kwargs) for i, size in enumerate(sizes))
+            )
+    except ConstraintError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    result = LineArrays.concat(shards)
+    record_generation(result.method, result.candidates, len(result.main), result.rejections)
+
+    acceptance_rate = result.accepted / result.candidates if result.candidates else 0.0
+    return {
+        "lines": result.to_lines(req.strategy),
+        "acceptance_rate": round(acceptance_rate, 4),
+        "sampler": result.method,
+        "rng_seed": seed,
+    }
+
+
+def _ndjson_lines(spec: int, strategy: str, main: np.ndarray, bonus: Optional[np.ndarray], hints: np.ndarray) -> str:
+    # Hand-built rows (a list of ints reprs as valid JSON); json.dumps per line dominates at 1M lines.
+    prefix = f'{{"spec":{spec},"main":'
+    meta = f',"meta":{{"strategy":{json.dumps(strategy)},"score_hint":'
+    bonus_rows = map(str, bonus.tolist()) if bonus is not None else ["null"] * len(main)
+    return "".join(
+        f'{prefix}{m},"bonus":{b}{meta}{h!r}}}}}\n' for m, b, h in zip(main.tolist(), bonus_rows, hints.tolist())
+    )
+
+
+def _bulk_chunk(seed: int, spec: int, shard: int, size: int, kwargs: dict) -> tuple:
+    """Serialized shard plus (sampler, candidates, rejections) for metrics, which live in the parent process."""
+    arrays = sample_shard(seed, spec, shard, size, **kwargs)
+    body = _ndjson_lines(spec, kwargs["strategy"], arrays.main, arrays.bonus, arrays.score_hints).encode()
+    return body, arrays.method, arrays.candidates, arrays.rejections
+
+
+async def _bulk_stream(seed: int, jobs: List[tuple]) -> AsyncIterator[bytes]:
+    for spec, n_lines, kwargs in jobs:
+        if kwargs is None:
+            error = {"spec": spec, "error": "non_numeric_game", "warning": NON_NUMERIC_WARNING}
+            yield (json.dumps(error) + "\n").encode()
+            continue
+        # Shards run concurrently (up to one per worker) but are sent in shard order,
+        # so the output for a seed does not depend on how many workers produced it.
+        sizes = iter(enumerate(shard_sizes(n_lines)))
+        in_flight: deque = deque()
+        try:
+            while True:
+                while len(in_flight) < executor.workers:
+                    nxt = next(sizes, None)
+                    if nxt is None:
+                        break
+                    shard, size = nxt
+                    in_flight.append(asyncio.ensure_future(executor.run(_bulk_chunk, seed, spec, shard, size, kwargs)))
+                if not in_flight:
+                    break
+                with stage("bulk_shard_wait"):
+                    body, method, candidates, rejections = await in_flight.popleft()
+                record_generation(method, candidates, body.count(b"\n"), rejections)
+                yield body
+        except (ConstraintError, ExecutorBusy, TaskTimeout) as exc:
+            # Headers are long gone; report in-band and move on to the next spec.
+            yield (json.dumps({"spec": spec, "error": str(exc)}) + "\n").encode()
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+
+@router.post("/generate/bulk")
+async def generate_bulk(req: BulkGenerateRequest, conn: asyncpg.Connection = Depends(get_read_conn)):
+    """Stream lines for several (game, strategy, constraints) specs as NDJSON.
+
+    Each row is a /generate line plus the index of its spec. Stats are
+    loaded once per (game, strategy) before streaming starts; lines are then
+    sampled in fixed-size seeded shards (see picker.shard_rng) spread over the
+    executor and sent in order, so memory does not grow with n_lines and a
+    given rng_seed always reproduces the same stream.
+    """
+    total = sum(spec.n_lines for spec in req.specs)
+    if total > settings.generate_bulk_max_lines:
+        raise HTTPException(status_code=422, detail=f"too_many_lines: max {settings.generate_bulk_max_lines}")
+
+    entries = {}
+    jobs = []
+    for i, spec in enumerate(req.specs):
+        key = (spec.game_id, spec.strategy)
+        if key not in entries:
+            strategy = None if spec.strategy == TREND else spec.strategy
+            entries[key] = await stats_cache.stats(conn, spec.game_id, HISTORY_LIMIT, strategy)
+        entry = entries[key]
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"game_not_found: spec {i}")
+        try:
+            kwargs = _sampler_kwargs(entry, spec.strategy, Constraints.from_dict(spec.constraints))
+            if kwargs is not None and spec.strategy == TREND:
+                await _use_trend_weights(conn, spec.game_id, kwargs)
+            if kwargs is not None and not kwargs["constraints"].is_trivial:
+                # Builds (and caches) the exact table now so infeasible specs fail before streaming.
+                await executor.run(
+                    constraint_table,
+                    kwargs["weights_main"],
+                    kwargs["main_min"],
+                    kwargs["main_max"],
+                    kwargs["main_count"],
+                    kwargs["constraints"],
+                )
+        except ConstraintError as exc:
+            raise HTTPException(status_code=422, detail=f"spec {i}: {exc}")
+        jobs.append((i, spec.n_lines, kwargs))
+
+    seed = req.rng_seed if req.rng_seed is not None else secrets.randbits(63)
+    return StreamingResponse(
+        _bulk_stream(seed, jobs), media_type="application/x-ndjson", headers={"X-RNG-Seed": str(seed)}
+    )
@@ -4,12 +4,13 @@ from datetime import datetime
 from typing import Literal, Optional
 
 import asyncpg
-import httpx
 from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import BaseModel, Field
 
 from app.core.config import settings
-from app.db.deps import get_pg_conn
+from app.db.deps import get_write_conn
+from app.services.draw_import import ImportFormatError, run_import
+from app.services.stats_cache import stats_cache
 
 router = APIRouter()
 
@@ -19,13 +20,15 @@ class ImportRequest(BaseModel):
     game_key: Optional[str] = None
     csv_url: Optional[str] = None
     source: Optional[str] = "manual_import"
+    # Only import rows on or after the game's latest stored draw_date.
+    delta: bool = False
 
 
 @router.post("/import")
 async def import_data(
     body: ImportRequest,
     x_admin_key: str = Header(default="", convert_underscores=False),
-    conn: asyncpg.Connection = Depends(get_pg_conn),
+    conn: asyncpg.Connection = Depends(get_write_conn),
 ):
     expected = settings.admin_import_key
     if not expected or x_admin_key != expected:
@@ -45,48 +48,26 @@ async def import_data(
 
         game_id = str(game_row["id"])
 
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.get(body.csv_url)
-            resp.raise_for_status()
-            csv_text = resp.text
-
         # Expected CSV columns: draw_date, main_1..main_5, bonus_1 (or similar). You can adapt per source.
         # This importer is intentionally conservative for launch safety.
-        imported = 0
-        for line in csv_text.splitlines():
-            if not line.strip() or line.lower().startswith("draw"):
-                continue
-            parts = [p.strip() for p in line.split(",")]
-            if len(parts) < 6:
-                continue
-            draw_date = parts[0]
-            try:
-                main = list(map(int, parts[1:6]))
-                bonus = [int(parts[6])] if len(parts) > 6 and parts[6].isdigit() else []
-            except ValueError:
-                continue
-
-            numbers = {"main": main}
-            if bonus:
-                numbers["bonus"] = bonus
-
-            await conn.execute(
-                """
-                insert into public.draws (game_id, draw_date, numbers, source)
-                values ($1, $2::date, $3::jsonb, $4)
-                on conflict (game_id, draw_date) do update set numbers=excluded.numbers, source=excluded.source
-                """,
+        try:
+            result = await run_import(
+                conn,
                 game_id,
-                draw_date,
-                numbers,
-                body.source or "manual_import",
+                body.csv_url,
+                "positional_csv",
+                source=body.source or "manual_import",
+                delta=body.delta,
             )
-            imported += 1
+        except ImportFormatError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        stats_cache.invalidate(game_id)
 
         await conn.execute(
             """
             insert into public.game_sources (game_id, source_type, source_url, notes, last_import_at)
             values ($1, 'official_csv', $2, $3, $4)
+            on conflict (game_id, source_url) do update set last_import_at = excluded.last_import_at
             """,
             game_id,
             body.csv_url,
@@ -94,4 +75,12 @@ async def import_data(
             datetime.utcnow(),
         )
 
-        return {"ok": True, "imported": imported, "game_id": game_id}
+        return {
+            "ok": True,
+            "imported": result.rows,
+            "inserted": result.inserted,
+            "updated": result.updated,
+            "unchanged": result.unchanged,
+            "skipped_old": result.skipped_old,
+            "game_id": game_id,
+        }
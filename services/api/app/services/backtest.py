@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from math import comb
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.services.picker import shard_rng, weights_from_arrays
+
+STRATEGIES = ("balanced", "hot", "cold", "random")
+
+# Lines sampled per block (all lines of block_draws() consecutive draws); bounds the work arrays.
+BLOCK_LINES = 1 << 17
+
+_ONE = np.uint64(1)
+
+
+def bit_table(size: int) -> np.ndarray:
+    """(size + 1, words) uint64: row i is offset i as a bitmask, the last row is empty.
+
+    The empty row makes padding (-1 in a packed draw matrix) index to no bits.
+    """
+    words = (size + 63) // 64
+    table = np.zeros((size + 1, words), dtype=np.uint64)
+    offsets = np.arange(size)
+    table[offsets, offsets >> 6] = np.left_shift(_ONE, (offsets & 63).astype(np.uint64))
+    return table
+
+
+def draw_masks(packed: np.ndarray, table: np.ndarray) -> np.ndarray:
+    """(n_draws, words) bitmasks of a packed draw matrix (see scoring.pack_draws)."""
+    masks = np.zeros((packed.shape[0], table.shape[1]), dtype=np.uint64)
+    for col in packed.T:
+        masks |= table[col]
+    return masks
+
+
+def popcount(masks: np.ndarray) -> np.ndarray:
+    """Set bits per mask, summed over the trailing word axis."""
+    return np.bitwise_count(masks).sum(axis=-1, dtype=np.int64)
+
+
+def replay_features(packed: np.ndarray, size: int, window: int, n_draws: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Counts and last-seen as the stats cache would have computed them before each of the latest draws.
+
+    packed is most-recent-first. Row r of the result describes the `window`
+    draws preceding packed row r (r < n_draws), in the form
+    weights_from_arrays takes: last_seen is draws ago, or -1 when not seen
+    in the window. Every replayed draw needs one before it, so n_draws < len(packed).
+    """
+    n = packed.shape[0]
+    assert n_draws < n, "every replayed draw needs a preceding draw"
+    chron = packed[::-1]
+    hit = np.zeros((n, size), dtype=bool)
+    rows = np.repeat(np.arange(n), chron.shape[1])
+    cols = chron.ravel()
+    valid = cols >= 0
+    hit[rows[valid], cols[valid]] = True
+
+    cum = np.zeros((n + 1, size), dtype=np.int64)
+    np.cumsum(hit, axis=0, out=cum[1:])
+    latest = np.maximum.accumulate(np.where(hit, np.arange(n)[:, None], -1), axis=0)
+
+    # Chronological index of each replayed draw; it is preceded by exactly t draws.
+    t = n - 1 - np.arange(n_draws)
+    counts = cum[t] - cum[np.maximum(t - window, 0)]
+    prev = latest[t - 1]
+    ago = t[:, None] - 1 - prev
+    last_seen = np.where((prev >= 0) & (ago < window), ago, -1)
+    return counts, last_seen
+
+
+def sample_line_masks(
+    rng: np.random.Generator, weights: np.ndarray, lines: int, k: int, table: np.ndarray
+) -> np.ndarray:
+    """(draws, lines, words) bitmasks of weighted k-subsets, `lines` per row of weights.
+
+    Same distribution as picker._sample_batch (successive weighted picks
+    without replacement): candidates are drawn with replacement and repeats
+    skipped until k are distinct. The with-replacement draws for a row are its
+    multinomial counts in random order, which is much cheaper than one
+    categorical draw (or one Gumbel key per number) at a time.
+    """
+    n, size = weights.shape
+    p = weights / weights.sum(axis=1, keepdims=True)
+    counts = rng.multinomial(lines * k, p)
+    values = np.repeat(np.tile(np.arange(size, dtype=np.int16), n), counts.ravel()).reshape(n, lines * k)
+    cand = rng.permuted(values, axis=1).reshape(n, k, lines)
+
+    masks = table[cand[:, 0]]
+    for j in range(1, k):
+        masks |= table[cand[:, j]]
+
+    # Top up lines that drew repeats. A line short by `need` takes `need` more candidates at once:
+    # each adds at most one new number, so it cannot overshoot k.
+    flat = masks.reshape(n * lines, -1)
+    short = np.flatnonzero(popcount(flat) < k)
+    bounds = (np.cumsum(p, axis=1) + np.arange(n)[:, None]).ravel()
+    while short.size:
+        need = k - popcount(flat[short])
+        row = short // lines
+        u = rng.random((short.size, int(need.max()))) + row[:, None]
+        picks = np.minimum(np.searchsorted(bounds, u, side="right") - row[:, None] * size, size - 1)
+        picks[np.arange(picks.shape[1]) >= need[:, None]] = size  # the empty row of the table
+        added = table[picks[:, 0]]
+        for col in picks.T[1:]:
+            added |= table[col]
+        flat[short] |= added
+        short = short[popcount(flat[short]) < k]
+    return masks
+
+
+def block_draws(lines: int) -> int:
+    return max(1, BLOCK_LINES // lines)
+
+
+def backtest_blocks(
+    seed: int,
+    stream: int,
+    first_block: int,
+    weights: Dict[str, np.ndarray],
+    draws: np.ndarray,
+    lines: int,
+    k: int,
+    size: int,
+) -> Dict[str, np.ndarray]:
+    """Match-count histograms (length k + 1) per strategy for a run of consecutive blocks.
+
+    weights[strategy] and draws hold one row per replayed draw, starting at
+    block first_block. Each (block, strategy) samples from its own
+    shard_rng stream, so results do not depend on how blocks are split
+    across tasks or which other strategies are requested.
+    """
+    table = bit_table(size)
+    step = block_draws(lines)
+    out = {s: np.zeros(k + 1, dtype=np.int64) for s in weights}
+    for b, start in enumerate(range(0, draws.shape[0], step), start=first_block):
+        target = draws[start : start + step, None, :]
+        for strategy, w in weights.items():
+            rng = shard_rng(seed, stream, b * len(STRATEGIES) + STRATEGIES.index(strategy))
+            masks = sample_line_masks(rng, w[start : start + step], lines, k, table)
+            out[strategy] += np.bincount(popcount(masks & target).ravel(), minlength=k + 1)[: k + 1]
+    return out
+
+
+def prepare(
+    packed: np.ndarray, size: int, window: int, n_draws: int, strategies: Sequence[str]
+) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Per-strategy weights and target bitmasks for the latest n_draws draws (most recent first)."""
+    counts, last_seen = replay_features(packed, size, window, n_draws)
+    weights = {s: weights_from_arrays(counts, last_seen, s) for s in strategies}
+    return weights, draw_masks(packed[:n_draws], bit_table(size))
+
+
+def hypergeometric(size: int, k: int) -> List[float]:
+    """P(m matches) for a uniformly random k-line against a k-number draw from `size` numbers."""
+    total = comb(size, k)
+    return [comb(k, m) * comb(size - k, k - m) / total for m in range(k + 1)]
@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, fields
+from itertools import product
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.lru import LRUCache
+
+MAX_RUN = 3  # longest consecutive run allowed when avoid_runs is on (12,13,14 ok; 12..15 not)
+
+_SPLIT_MODES = {
+    "odd_even": ("any", "balanced", "more_odd", "more_even"),
+    "low_high": ("any", "balanced", "more_low", "more_high"),
+}
+
+
+class ConstraintError(ValueError):
+    """Constraints that are malformed or that no line can satisfy."""
+
+
+@dataclass(frozen=True)
+class Constraints:
+    odd_even: str = "any"  # any | balanced | more_odd | more_even
+    avoid_runs: bool = True
+    sum_min: Optional[int] = None
+    sum_max: Optional[int] = None
+    low_high: str = "any"  # any | balanced | more_low | more_high (low = lower half of the range)
+    min_decades: Optional[int] = None  # decade spread: distinct decades (1-9, 10-19, ...) covered
+    max_per_decade: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, raw: dict) -> "Constraints":
+        known = {f.name for f in fields(cls)}
+        unknown = sorted(set(raw) - known)
+        if unknown:
+            raise ConstraintError(f"unknown_constraint: {', '.join(unknown)}")
+        for key, modes in _SPLIT_MODES.items():
+            if key in raw and raw[key] not in modes:
+                raise ConstraintError(f"invalid_constraint: {key} must be one of {', '.join(modes)}")
+        kwargs = {}
+        for key in ("sum_min", "sum_max", "min_decades", "max_per_decade"):
+            value = raw.get(key)
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ConstraintError(f"invalid_constraint: {key} must be a non-negative integer")
+            kwargs[key] = value
+        return cls(
+            odd_even=raw.get("odd_even", "any"),
+            avoid_runs=bool(raw.get("avoid_runs", True)),
+            low_high=raw.get("low_high", "any"),
+            **kwargs,
+        )
+
+    @property
+    def is_trivial(self) -> bool:
+        return self == Constraints(avoid_runs=False)
+
+    def rule_masks(self, lines: np.ndarray, main_min: int, main_max: int) -> Dict[str, np.ndarray]:
+        """Per-rule pass masks over a (batch, k) array of sorted line numbers; only active rules appear."""
+        k = lines.shape[1]
+        masks: Dict[str, np.ndarray] = {}
+        if self.odd_even != "any":
+            masks["odd_even"] = _in_range(np.count_nonzero(lines % 2 == 1, axis=1), _split_bounds(self.odd_even, k))
+        if self.low_high != "any":
+            low = np.count_nonzero(lines <= _low_cutoff(main_min, main_max), axis=1)
+            masks["low_high"] = _in_range(low, _split_bounds(self.low_high, k))
+        if self.avoid_runs:
+            masks["avoid_runs"] = ~_long_run_mask(lines, MAX_RUN)
+        if self.sum_min is not None or self.sum_max is not None:
+            masks["sum"] = _in_range(lines.sum(axis=1), (self.sum_min or 0, self.sum_max))
+        if self.min_decades is not None or self.max_per_decade is not None:
+            decades = lines // 10
+            first = main_min // 10
+            n_dec = main_max // 10 - first + 1
+            flat = (np.arange(len(lines))[:, None] * n_dec + decades - first).ravel()
+            per_decade = np.bincount(flat, minlength=len(lines) * n_dec).reshape(len(lines), n_dec)
+            if self.min_decades is not None:
+                masks["min_decades"] = np.count_nonzero(per_decade, axis=1) >= self.min_decades
+            if self.max_per_decade is not None:
+                masks["max_per_decade"] = per_decade.max(axis=1) <= self.max_per_decade
+        return masks
+
+    def mask(self, lines: np.ndarray, main_min: int, main_max: int) -> np.ndarray:
+        """Vectorized check of every rule over a (batch, k) array of sorted line numbers."""
+        ok = np.ones(len(lines), dtype=bool)
+        for rule_ok in self.rule_masks(lines, main_min, main_max).values():
+            ok &= rule_ok
+        return ok
+
+
+def _long_run_mask(lines: np.ndarray, max_run: int = MAX_RUN) -> np.ndarray:
+    """True for rows (sorted ascending) with a consecutive run longer than max_run, like 12,13,14,15."""
+    if lines.shape[1] < max_run + 1:
+        return np.zeros(len(lines), dtype=bool)
+    step = np.diff(lines, axis=1) == 1
+    return np.lib.stride_tricks.sliding_window_view(step, max_run, axis=1).all(axis=2).any(axis=1)
+
+
+def _split_bounds(mode: str, k: int) -> Tuple[int, int]:
+    """Allowed count of the first category (odd / low) among k numbers for a split mode."""
+    if mode == "balanced":
+        return k // 2, (k + 1) // 2
+    if mode in ("more_odd", "more_low"):
+        return (k + 1) // 2, k
+    if mode in ("more_even", "more_high"):
+        return 0, k // 2
+    return 0, k
+
+
+def _in_range(values: np.ndarray, bounds: Tuple[Optional[int], Optional[int]]) -> np.ndarray:
+    lo, hi = bounds
+    ok = values >= (lo or 0)
+    if hi is not None:
+        ok &= values <= hi
+    return ok
+
+
+def _low_cutoff(main_min: int, main_max: int) -> int:
+    return (main_min + main_max) // 2
+
+
+class ConstraintTable:
+    """Exact sampler over the lines that satisfy a Constraints, built by dynamic programming.
+
+    Numbers are visited in ascending order. The state after each number is
+    (picked, sum, odd, trailing run, picked in current decade, decades
+    covered); axes for inactive rules have size 1. layers[i][state] holds
+    the total weight (product of number weights) of all ways to finish a
+    valid line from that state using numbers i.., so sampling walks forward
+    picking each number with probability w_i * layers[i+1][next] / layers[i][state].
+    Every valid line is drawn with probability proportional to the product
+    of its weights; lines that break a rule are never generated.
+
+    When storing every layer would exceed max_cells, only every block-th
+    layer is kept and the layers in between are recomputed while sampling.
+    """
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        main_min: int,
+        main_max: int,
+        k: int,
+        constraints: Constraints,
+        max_cells: Optional[int] = None,
+    ):
+        c = constraints
+        self.k = k
+        values = np.arange(main_min, main_max + 1)
+        self.values = values
+        self.weights = weights / weights.mean()
+        n = len(values)
+
+        top = int(values[n - k :].sum())
+        bottom = int(values[:k].sum())
+        sum_min = c.sum_min if c.sum_min is not None and c.sum_min > bottom else None
+        sum_max = c.sum_max if c.sum_max is not None and c.sum_max < top else None
+        self.sum_mode = "max" if sum_max is not None else ("min" if sum_min is not None else None)
+        self.sum_lo = sum_min or 0
+
+        odd_lo, odd_hi = _split_bounds(c.odd_even, k)
+        self.odd_lo = odd_lo
+        self.odd_active = (odd_lo, odd_hi) != (0, k)
+        self.low_bounds = _split_bounds(c.low_high, k)
+        self.per_decade_cap = c.max_per_decade if c.max_per_decade is not None and c.max_per_decade < k else None
+        self.need_decades = c.min_decades if c.min_decades else None
+
+        self.dims = (
+            k + 1,
+            (sum_max + 1) if sum_max is not None else ((sum_min + 1) if sum_min is not None else 1),
+            (odd_hi + 1) if self.odd_active else 1,
+            (MAX_RUN + 1) if c.avoid_runs else 1,
+            (self.per_decade_cap + 1) if self.per_decade_cap is not None else (2 if self.need_decades else 1),
+            (self.need_decades + 1) if self.need_decades else 1,
+        )
+        layer_cells = int(np.prod(self.dims))
+        self.block = 1
+        if max_cells is not None and layer_cells * (n + 1) > max_cells:
+            self.block = int(np.ceil(np.sqrt(n + 1)))
+        self.cells = layer_cells * (-(-n // self.block) + 1 + (self.block if self.block > 1 else 0))
+
+        decades = values // 10
+        self.decade_start = np.r_[False, decades[1:] != decades[:-1]]
+        self.low_layer = int(np.count_nonzero(values <= _low_cutoff(main_min, main_max)))
+        self.checkpoints: Dict[int, np.ndarray] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return self.cells * 8
+
+    def build(self) -> "ConstraintTable":
+        C, S, O, R, D, E = self.dims
+        final = np.zeros(self.dims)
+        s_ok = slice(self.sum_lo, None) if self.sum_mode == "max" else slice(S - 1, None)
+        o_ok = slice(self.odd_lo, None)
+        final[self.k, s_ok, o_ok, :, :, E - 1] = 1.0
+
+        n = len(self.values)
+        z = self._check_low(final, n)
+        self.checkpoints = {n: z}
+        for i in range(n - 1, -1, -1):
+            z = self._layer(z, i)
+            if i % self.block == 0:
+                self.checkpoints[i] = z
+        return self
+
+    @property
+    def feasible(self) -> bool:
+        return bool(self.checkpoints[0][0, 0, 0, 0, 0, 0] > 0)
+
+    def _layer(self, nxt: np.ndarray, i: int) -> np.ndarray:
+        z = self._step_back(nxt, i)
+        if self.decade_start[i]:
+            z = np.broadcast_to(z[:, :, :, :, :1, :], self.dims).copy()
+        return self._check_low(z, i)
+
+    def _check_low(self, z: np.ndarray, i: int) -> np.ndarray:
+        # The low/high split is settled once every low number has been visited.
+        if i == self.low_layer and self.low_bounds != (0, self.k):
+            lo, hi = self.low_bounds
+            z[:lo] = 0.0
+            z[hi + 1 :] = 0.0
+        return z
+
+    def _segment(self, start: int, stop: int) -> Dict[int, np.ndarray]:
+        """Layers start..stop, recomputed from the checkpoint at stop."""
+        layers = {stop: self.checkpoints[stop]}
+        for i in range(stop - 1, start - 1, -1):
+            layers[i] = self.checkpoints.get(i)
+            if layers[i] is None:
+                layers[i] = self._layer(layers[i + 1], i)
+        return layers
+
+    def _step_back(self, nxt: np.ndarray, i: int) -> np.ndarray:
+        """layers[i] from layers[i + 1]: skip number i, or take it."""
+        R = self.dims[3]
+        skip = nxt if R == 1 else np.broadcast_to(nxt[:, :, :, :1], self.dims)
+        take = np.zeros(self.dims)
+        for combo in product(*self._take_pieces(int(self.values[i]))):
+            take[sum((d for d, _ in combo), ())] = nxt[sum((s for _, s in combo), ())]
+        return skip + self.weights[i] * take
+
+    def _take_pieces(self, v: int):
+        """Per axis group, (destination, source) slices mapping a state to its state after taking v."""
+        C, S, O, R, D, E = self.dims
+        full = ((slice(None),), (slice(None),))
+        pieces = [[((slice(0, C - 1),), (slice(1, C),))]]
+
+        if self.sum_mode is None:
+            pieces.append([full])
+        else:
+            sums = [((slice(0, S - v),), (slice(v, S),))] if v < S else []
+            if self.sum_mode == "min":
+                sums.append(((slice(max(S - v, 0), S),), (slice(S - 1, S),)))
+            pieces.append(sums)
+
+        pieces.append([((slice(0, O - 1),), (slice(1, O),))] if self.odd_active and v % 2 == 1 else [full])
+        pieces.append([((slice(0, R - 1),), (slice(1, R),))] if R > 1 else [full])
+
+        cap = self.per_decade_cap
+        if D == 1 and cap is None:
+            pieces.append([(full[0] * 2, full[1] * 2)])
+        else:
+            # Decade count d comes from d + 1 (capped) or from 1 (spread only, saturating).
+            n_dst = D - 1 if cap is not None else D
+            src = (lambda lo, hi: slice(lo + 1, hi + 1)) if cap is not None else (lambda lo, hi: slice(1, 2))
+            decade = []
+            if n_dst and E > 1:
+                # Taking the first number of a decade covers one more decade.
+                decade.append(((slice(0, 1), slice(0, E - 1)), (src(0, 1), slice(1, E))))
+                decade.append(((slice(0, 1), slice(E - 1, E)), (src(0, 1), slice(E - 1, E))))
+                if n_dst > 1:
+                    decade.append(((slice(1, n_dst), slice(None)), (src(1, n_dst), slice(None))))
+            elif n_dst:
+                decade.append(((slice(0, n_dst), slice(None)), (src(0, n_dst), slice(None))))
+            pieces.append(decade)
+        return pieces
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Draw `size` valid lines; returns a (size, k) array of sorted zero-based offsets."""
+        C, S, O, R, D, E = self.dims
+        strides = np.array([S * O * R * D * E, O * R * D * E, R * D * E, D * E, E, 1])
+        state = np.zeros((6, size), dtype=np.int64)
+        out = np.empty((size, self.k), dtype=np.int64)
+        rows = np.arange(size)
+        n = len(self.values)
+
+        for start in range(0, n, self.block):
+            layers = self._segment(start, min(start + self.block, n))
+            for i in range(start, min(start + self.block, n)):
+                if self.decade_start[i]:
+                    state[4] = 0
+                here = layers[i].ravel()[strides @ state]
+                nxt, valid = self._step_forward(state, int(self.values[i]))
+                p = np.zeros(size)
+                p[valid] = self.weights[i] * layers[i + 1].ravel()[strides @ nxt[:, valid]] / here[valid]
+                take = rng.random(size) < p
+                out[rows[take], state[0, take]] = i
+                state[:, take] = nxt[:, take]
+                state[3, ~take] = 0
+        return out
+
+    def _step_forward(self, state: np.ndarray, v: int) -> Tuple[np.ndarray, np.ndarray]:
+        C, S, O, R, D, E = self.dims
+        nxt = state.copy()
+        valid = state[0] < self.k
+        nxt[0] += 1
+        if self.sum_mode is not None:
+            nxt[1] += v
+            if self.sum_mode == "min":
+                np.minimum(nxt[1], S - 1, out=nxt[1])
+            else:
+                valid &= nxt[1] < S
+        if self.odd_active and v % 2 == 1:
+            nxt[2] += 1
+            valid &= nxt[2] < O
+        if R > 1:
+            nxt[3] += 1
+            valid &= nxt[3] < R
+        if D > 1 or self.per_decade_cap is not None:
+            if E > 1:
+                nxt[5] = np.where(state[4] == 0, np.minimum(state[5] + 1, E - 1), state[5])
+            if self.per_decade_cap is not None:
+                nxt[4] += 1
+                valid &= nxt[4] < D
+            else:
+                nxt[4] = 1
+        return nxt, valid
+
+
+_tables = LRUCache(settings.constraint_table_cache_bytes)
+
+
+def constraint_table(
+    weights: np.ndarray, main_min: int, main_max: int, k: int, constraints: Constraints
+) -> Optional[ConstraintTable]:
+    """Cached exact sampler for these weights and constraints.
+
+    Returns None when the table would exceed constraint_table_max_cells (the
+    caller then falls back to batched rejection); raises ConstraintError
+    when no line can satisfy the constraints.
+    """
+    key = (main_min, main_max, k, constraints, weights.tobytes())
+    table: Optional[ConstraintTable] = _tables.get(key)
+    if table is None:
+        table = ConstraintTable(weights, main_min, main_max, k, constraints, settings.constraint_table_max_cells)
+        if table.cells > settings.constraint_table_max_cells:
+            return None
+        table.build()
+        _tables.put(key, table, table.nbytes)
+    if not table.feasible:
+        raise ConstraintError(
+            f"constraints_unsatisfiable: no {k}-number line from {main_min}-{main_max} meets the constraints"
+        )
+    return table
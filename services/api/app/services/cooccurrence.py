@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from itertools import combinations
+from typing import List, Tuple
+
+import numpy as np
+
+# Up to this many possible triple codes, count with one dense bincount instead of a sort.
+_DENSE_TRIPLE_CODES = 1 << 22
+
+
+def one_hot(packed: np.ndarray, size: int) -> np.ndarray:
+    """Draw-by-number 0/1 matrix from a packed draw matrix (see scoring.pack_draws)."""
+    n_draws, width = packed.shape
+    # float32 so the product below goes through BLAS; counts stay exact well past any window.
+    x = np.zeros((n_draws, size), dtype=np.float32)
+    if n_draws and width:
+        rows = np.repeat(np.arange(n_draws), width)
+        cols = packed.ravel()
+        valid = cols >= 0
+        x[rows[valid], cols[valid]] = 1.0
+    return x
+
+
+def pair_matrix(packed: np.ndarray, size: int) -> np.ndarray:
+    """Symmetric co-occurrence counts: [i, j] = draws containing both i and j.
+
+    The diagonal holds single-number counts.
+    """
+    x = one_hot(packed, size)
+    return np.rint(x.T @ x).astype(np.int64)
+
+
+def top_pairs(matrix: np.ndarray, k: int) -> List[Tuple[int, int, int]]:
+    """Top-k (i, j, count) over the strict upper triangle, by count desc then (i, j); zeros are skipped."""
+    ii, jj = np.triu_indices(matrix.shape[0], k=1)
+    return _top(matrix[ii, jj], [ii, jj], k)
+
+
+def triple_counts(packed: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Flattened triple codes (i * size**2 + j * size + l, i < j < l) with their counts.
+
+    Only triples that occur are returned.
+    """
+    n_draws, width = packed.shape
+    if n_draws == 0 or width < 3:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    rows = np.sort(packed, axis=1)
+    combos = np.array(list(combinations(range(width), 3)), dtype=np.int64)
+    t = rows[:, combos]  # (draws, C(width, 3), 3), each triple ascending
+    # Drops padding (-1) and repeated numbers in one check.
+    ok = (t[..., 0] >= 0) & (t[..., 0] < t[..., 1]) & (t[..., 1] < t[..., 2])
+    codes = (t[..., 0] * size + t[..., 1]) * size + t[..., 2]
+    codes = codes[ok]
+    if size**3 <= _DENSE_TRIPLE_CODES:
+        counts = np.bincount(codes, minlength=size**3)
+        codes = np.flatnonzero(counts)
+        return codes, counts[codes]
+    return np.unique(codes, return_counts=True)
+
+
+def top_triples(packed: np.ndarray, size: int, k: int) -> List[Tuple[int, int, int, int]]:
+    """Top-k (i, j, l, count) triples, by count desc then (i, j, l)."""
+    codes, counts = triple_counts(packed, size)
+    return _top(counts, [codes // (size * size), codes // size % size, codes % size], k)
+
+
+def _top(counts: np.ndarray, keys: List[np.ndarray], k: int) -> list:
+    nonzero = np.flatnonzero(counts)
+    counts = counts[nonzero]
+    keys = [a[nonzero] for a in keys]
+    if counts.size == 0 or k <= 0:
+        return []
+    if counts.size > k:
+        # Keep every candidate tied with the k-th count so tie-breaking stays deterministic.
+        kth = np.partition(counts, counts.size - k)[counts.size - k]
+        keep = np.flatnonzero(counts >= kth)
+        counts = counts[keep]
+        keys = [a[keep] for a in keys]
+    order = np.lexsort(tuple(reversed(keys)) + (-counts,))[:k]
+    cols = [a[order].tolist() for a in keys] + [counts[order].tolist()]
+    return list(zip(*cols))
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
+
+import asyncpg
+import httpx
+
+from app.core.metrics import record_import
+from app.db.bulk import DrawRecord, upsert_draws
+
+ImportFormat = Literal["positional_csv", "csv", "json"]
+
+# Largest single CSV line / JSON value accepted while streaming.
+MAX_PENDING_BYTES = 1024 * 1024
+
+_DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y/%m/%d")
+
+
+class ImportFormatError(ValueError):
+    """The downloaded document does not match the requested import format."""
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0  # records written to the staging table
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped_old: int = 0  # delta mode: rows older than the game's latest draw
+
+
+def parse_draw_date(value: str) -> Optional[date]:
+    value = value.strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_nums(s: str) -> List[int]:
+    # space or comma separated ints; anything else is dropped
+    out = []
+    for p in s.replace(" ", ",").split(","):
+        p = p.strip()
+        if not p:
+            continue
+        try:
+            out.append(int(p))
+        except ValueError:
+            continue
+    return out
+
+
+def _numbers(main: List[int], bonus: List[int]) -> Dict[str, Any]:
+    numbers: Dict[str, Any] = {"main": main}
+    if bonus:
+        numbers["bonus"] = bonus
+    return numbers
+
+
+async def _bounded_lines(resp: httpx.Response) -> AsyncIterator[str]:
+    async for line in resp.aiter_lines():
+        if len(line) > MAX_PENDING_BYTES:
+            raise ImportFormatError("line_too_long")
+        yield line
+
+
+async def positional_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[DrawRecord]:
+    """Rows of draw_date, main_1..main_5[, bonus_1]; header and malformed rows are skipped."""
+    async for line in lines:
+        if not line.strip() or line.lower().startswith("draw"):
+            continue
+        parts = [p.strip() for p in line.split(",")]
+        if len(parts) < 6:
+            continue
+        d = parse_draw_date(parts[0])
+        if d is None:
+            continue
+        try:
+            main = list(map(int, parts[1:6]))
+            bonus = [int(parts[6])] if len(parts) > 6 and parts[6].isdigit() else []
+        except ValueError:
+            continue
+        yield d, _numbers(main, bonus)
+
+
+async def column_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[DrawRecord]:
+    """CSV with a header naming draw_date, main_numbers and optionally bonus_numbers."""
+    idx_date = idx_main = idx_bonus = None
+    async for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if idx_date is None:
+            header = [h.strip().lower() for h in line.split(",")]
+            if "draw_date" not in header or "main_numbers" not in header:
+                raise ImportFormatError("csv_missing_required_columns")
+            idx_date = header.index("draw_date")
+            idx_main = header.index("main_numbers")
+            idx_bonus = header.index("bonus_numbers") if "bonus_numbers" in header else None
+            continue
+
+        cols = [c.strip() for c in line.split(",")]
+        if max(idx_date, idx_main) >= len(cols):
+            continue
+        d = parse_draw_date(cols[idx_date])
+        if d is None:
+            continue
+        main = parse_nums(cols[idx_main])
+        bonus = parse_nums(cols[idx_bonus]) if idx_bonus is not None and idx_bonus < len(cols) else []
+        yield d, _numbers(main, bonus)
+
+
+def _json_record(obj: Any) -> Optional[DrawRecord]:
+    # Anything but a draw object (a wrapper like {"draws": [...]}, a "date" key) would otherwise import nothing.
+    if not isinstance(obj, dict) or "draw_date" not in obj:
+        raise ImportFormatError("json_value_not_a_draw")
+    if not isinstance(obj["draw_date"], str):
+        return None
+    d = parse_draw_date(obj["draw_date"])
+    if d is None:
+        return None
+    if isinstance(obj.get("numbers"), dict):
+        return d, obj["numbers"]
+
+    def nums(*keys: str) -> List[int]:
+        for key in keys:
+            value = obj.get(key)
+            if isinstance(value, list):
+                return [int(x) for x in value if isinstance(x, int) or (isinstance(x, str) and x.isdigit())]
+            if isinstance(value, str):
+                return parse_nums(value)
+        return []
+
+    main = nums("main", "main_numbers")
+    if not main:
+        return None
+    return d, _numbers(main, nums("bonus", "bonus_numbers"))
+
+
+async def json_records(chunks: AsyncIterator[str]) -> AsyncIterator[DrawRecord]:
+    """Draw objects from a top-level JSON array or newline-delimited JSON, decoded incrementally.
+
+    Objects carry draw_date plus either a numbers object or main/main_numbers
+    and optional bonus/bonus_numbers (lists or space/comma separated strings).
+    Any other top-level value, or a document without a single usable draw, is
+    an ImportFormatError.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    done = False
+    found = False
+    while not done:
+        try:
+            buf += await anext(chunks)
+        except StopAsyncIteration:
+            done = True
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,[]":
+                pos += 1
+            if pos >= len(buf):
+                break
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if done:
+                    raise ImportFormatError("invalid_json")
+                break
+            pos = end
+            record = _json_record(obj)
+            if record is not None:
+                found = True
+                yield record
+        buf = buf[pos:]
+        if len(buf) > MAX_PENDING_BYTES:
+            raise ImportFormatError("json_value_too_large")
+    if not found:
+        raise ImportFormatError("json_no_draws")
+
+
+def _records(resp: httpx.Response, fmt: ImportFormat) -> AsyncIterator[DrawRecord]:
+    if fmt == "json":
+        return json_records(resp.aiter_text())
+    if fmt == "csv":
+        return column_csv_records(_bounded_lines(resp))
+    return positional_csv_records(_bounded_lines(resp))
+
+
+async def import_response(
+    conn: asyncpg.Connection,
+    game_id: str,
+    resp: httpx.Response,
+    fmt: ImportFormat,
+    *,
+    source: Optional[str] = None,
+    delta: bool = False,
+) -> ImportResult:
+    """Stream an open (streaming) response's CSV/JSON body straight into upsert_draws.
+
+    The body is parsed as it downloads and fed to COPY, so memory stays flat
+    regardless of document size. In delta mode rows older than the game's
+    latest stored draw_date are dropped before they reach the database.
+    """
+    started = time.perf_counter()
+    result = ImportResult()
+    since: Optional[date] = None
+    if delta:
+        since = await conn.fetchval("select max(draw_date) from public.draws where game_id = $1::uuid", game_id)
+
+    async def fresh(records: AsyncIterator[DrawRecord]) -> AsyncIterator[DrawRecord]:
+        async for d, numbers in records:
+            if since is not None and d < since:
+                result.skipped_old += 1
+                continue
+            yield d, numbers
+
+    counts = await upsert_draws(conn, game_id, fresh(_records(resp, fmt)), source)
+    result.rows = counts.rows
+    result.inserted = counts.inserted
+    result.updated = counts.updated
+    result.unchanged = counts.unchanged
+    record_import(result, time.perf_counter() - started)
+    return result
+
+
+async def run_import(
+    conn: asyncpg.Connection,
+    game_id: str,
+    url: str,
+    fmt: ImportFormat,
+    *,
+    source: Optional[str] = None,
+    delta: bool = False,
+) -> ImportResult:
+    """Download a remote CSV/JSON document and import it (see import_response)."""
+    async with httpx.AsyncClient(timeout=30) as client:
+        async with client.stream("GET", url) as resp:
+            resp.raise_for_status()
+            return await import_response(conn, game_id, resp, fmt, source=source, delta=delta)
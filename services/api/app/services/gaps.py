@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+PERCENTILES = (25, 50, 75, 90)
+
+
+@dataclass
+class GapStats:
+    """Per-number appearance gaps over a whole history; index i is offset i.
+
+    A gap is the number of draws missed between two consecutive appearances
+    (0 for back-to-back draws). The open gap since the last appearance is
+    current_gap and is not part of the distribution. Float fields are NaN and
+    int fields -1 where there is nothing to measure.
+    """
+
+    appearances: np.ndarray
+    gap_count: np.ndarray
+    gap_min: np.ndarray
+    gap_mean: np.ndarray
+    gap_max: np.ndarray
+    gap_percentiles: np.ndarray  # (size, len(percentiles)), linear interpolation like np.percentile
+    current_gap: np.ndarray
+    current_gap_percentile: np.ndarray  # mid-rank of current_gap among the completed gaps, 0..100
+    longest_streak: np.ndarray  # most consecutive draws containing the number
+    longest_streak_end: np.ndarray  # draw index of the last draw of the (latest) longest streak
+
+
+def hits_from_cumulative(cum: np.ndarray) -> np.ndarray:
+    """(n_draws, size) bool one-hot draw matrix from prefix sums (see stats_cache.GameHistory)."""
+    return np.not_equal(cum[1:], cum[:-1])
+
+
+def gap_stats(hits: np.ndarray, percentiles: Sequence[float] = PERCENTILES) -> GapStats:
+    """Gap distribution and streaks for every number of a one-hot draw matrix, oldest draw first.
+
+    Works on the matrix's nonzeros only: each number's appearance indices,
+    their diff (the gaps) and run-length encoding of back-to-back appearances
+    (the streaks), grouped by number with sorted keys, bincount and
+    searchsorted instead of a loop per number.
+    """
+    n_draws, size = hits.shape
+    # Appearances grouped by number, ascending draw index within each: one sort of number-major keys.
+    stride = n_draws + 1
+    flat = np.flatnonzero(hits)
+    num, t = np.divmod(np.sort((flat % size) * stride + flat // size), stride)
+    appearances = np.bincount(num, minlength=size)
+    seen = appearances > 0
+
+    # Gaps between consecutive appearances of the same number.
+    same = num[1:] == num[:-1]
+    step = t[1:] - t[:-1]
+    gap_num = num[1:][same]
+    gaps = step[same] - 1
+    gap_count = np.bincount(gap_num, minlength=size)
+    has_gaps = gap_count > 0
+
+    # Sorting (number, gap) keys sorts each number's gaps in place; the numbers stay grouped.
+    keys = np.sort(gap_num * stride + gaps)
+    sorted_gaps = keys - gap_num * stride
+    first = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(gap_count, out=first[1:])
+    start, stop = first[:-1], first[1:]
+
+    # A trailing pad keeps empty groups indexable; their results are masked out.
+    padded = np.append(sorted_gaps, 0)
+    nan = np.full(size, np.nan)
+    gap_min = np.where(has_gaps, padded[start], nan)
+    gap_max = np.where(has_gaps, padded[stop - 1], nan)
+    gap_sum = np.bincount(gap_num, weights=gaps, minlength=size)
+    gap_mean = np.divide(gap_sum, gap_count, out=nan.copy(), where=has_gaps)
+
+    q = np.asarray(percentiles, dtype=np.float64) / 100.0
+    pos = np.maximum(gap_count - 1, 0)[:, None] * q
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    below = padded[start[:, None] + lo]
+    gap_percentiles = below + (padded[start[:, None] + hi] - below) * (pos - lo)
+    gap_percentiles[~has_gaps] = np.nan
+
+    # Open gap since each number's last appearance (the last entry of its group).
+    last = np.append(t, 0)[np.cumsum(appearances) - 1]
+    current_gap = np.where(seen, n_draws - 1 - last, -1)
+
+    # Mid-rank of the current gap within the number's sorted gaps, via one searchsorted on (number, gap) keys.
+    probe = np.arange(size) * stride + current_gap
+    shorter = np.searchsorted(keys, probe, side="left") - start
+    not_longer = np.searchsorted(keys, probe, side="right") - start
+    rank = np.divide(50.0 * (shorter + not_longer), gap_count, out=nan.copy(), where=has_gaps & seen)
+
+    # Streaks: run-length encode each number's appearances, a run breaking wherever step != 1.
+    longest_streak = np.zeros(size, dtype=np.int64)
+    longest_streak_end = np.full(size, -1, dtype=np.int64)
+    if t.size:
+        breaks = np.ones(t.size, dtype=bool)
+        breaks[1:] = ~(same & (step == 1))
+        run_start = np.flatnonzero(breaks)
+        run_len = np.diff(np.append(run_start, t.size))
+        run_num = num[run_start]
+        run_end = t[run_start + run_len - 1]
+        np.maximum.at(longest_streak, run_num, run_len)
+        best = run_len == longest_streak[run_num]
+        np.maximum.at(longest_streak_end, run_num[best], run_end[best])
+
+    return GapStats(
+        appearances=appearances,
+        gap_count=gap_count,
+        gap_min=gap_min,
+        gap_mean=gap_mean,
+        gap_max=gap_max,
+        gap_percentiles=gap_percentiles,
+        current_gap=current_gap,
+        current_gap_percentile=rank,
+        longest_streak=longest_streak,
+        longest_streak_end=longest_streak_end,
+    )
@@ -0,0 +1,226 @@
+"""Background polling of active public.game_sources rows (see 004_import_sources.sql).
+
+Each tick claims the sources that are due, up to the free concurrency slots,
+and polls them concurrently. A poll is a conditional GET with the validators
+of the last successful import: a 304 ends it there, anything else is streamed
+through the regular importer (delta mode). Claims move next_poll_at forward
+under FOR UPDATE SKIP LOCKED, so several API processes never poll the same
+source at once.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import asyncpg
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import IMPORT_POLLS
+from app.db.session import acquire
+from app.services.draw_import import ImportFormatError, import_response
+from app.services.stats_cache import stats_cache
+
+log = logging.getLogger(__name__)
+
+# Stored last_error is cut to this many characters.
+_ERROR_CHARS = 500
+
+
+@dataclass
+class Source:
+    id: str
+    game_id: str
+    url: str
+    fmt: str
+    interval: int
+    etag: Optional[str]
+    last_modified: Optional[str]
+    failures: int
+
+
+def backoff_seconds(interval: float, failures: int, max_seconds: float) -> float:
+    """Delay before the next poll after `failures` consecutive failures: the interval doubled per failure, capped."""
+    return max(interval, min(interval * 2.0**failures, max_seconds))
+
+
+def validators(source: Source) -> Dict[str, str]:
+    headers = {}
+    if source.etag:
+        headers["If-None-Match"] = source.etag
+    if source.last_modified:
+        headers["If-Modified-Since"] = source.last_modified
+    return headers
+
+
+async def claim_due(conn: asyncpg.Connection, limit: int) -> List[Source]:
+    """Take up to `limit` due sources, pushing their next_poll_at one interval out."""
+    rows = await conn.fetch(
+        """
+        update public.game_sources s
+        set next_poll_at = now() + make_interval(secs => s.poll_interval_seconds),
+            last_checked_at = now()
+        where s.id in (
+            select id
+            from public.game_sources
+            where is_active and source_url is not null and next_poll_at <= now()
+            order by next_poll_at
+            limit $1
+            for update skip locked
+        )
+        returning s.id::text as id, s.game_id::text as game_id, s.source_url, s.import_format,
+            s.poll_interval_seconds, s.etag, s.last_modified, s.consecutive_failures
+        """,
+        limit,
+    )
+    return [
+        Source(
+            id=r["id"],
+            game_id=r["game_id"],
+            url=r["source_url"],
+            fmt=r["import_format"],
+            interval=r["poll_interval_seconds"],
+            etag=r["etag"],
+            last_modified=r["last_modified"],
+            failures=r["consecutive_failures"],
+        )
+        for r in rows
+    ]
+
+
+class ImportScheduler:
+    """Polls due game sources every tick_seconds, at most max_concurrency at a time."""
+
+    def __init__(
+        self,
+        tick_seconds: float = 15.0,
+        max_concurrency: int = 2,
+        backoff_max_seconds: float = 6 * 3600,
+        http_timeout_seconds: float = 30.0,
+    ):
+        self.tick_seconds = tick_seconds
+        self.max_concurrency = max_concurrency
+        self.backoff_max_seconds = backoff_max_seconds
+        self.http_timeout_seconds = http_timeout_seconds
+        self._pool: Optional[asyncpg.Pool] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._polls: Dict[str, asyncio.Task] = {}
+
+    def start(self, pool: asyncpg.Pool) -> None:
+        if self._task is not None:
+            return
+        self._pool = pool
+        self._client = httpx.AsyncClient(timeout=self.http_timeout_seconds, follow_redirects=True)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        tasks = [self._task, *self._polls.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._client.aclose()
+        self._task = self._client = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                log.warning("import scheduler tick failed", exc_info=True)
+            await asyncio.sleep(self.tick_seconds)
+
+    async def tick(self) -> int:
+        """Claim due sources into the free slots and start polling them; returns how many started."""
+        free = self.max_concurrency - len(self._polls)
+        if free <= 0:
+            return 0
+        async with acquire(self._pool, settings.db_write_acquire_timeout_seconds, "write") as conn:
+            sources = await claim_due(conn, free)
+        for source in sources:
+            task = asyncio.get_running_loop().create_task(self.poll(source))
+            self._polls[source.id] = task
+            task.add_done_callback(lambda _, key=source.id: self._polls.pop(key, None))
+        return len(sources)
+
+    async def poll(self, source: Source) -> str:
+        """Conditional GET + import of one claimed source; returns the outcome label."""
+        try:
+            outcome = await self._fetch(source)
+        except Exception as exc:
+            outcome = "failed"
+            delay = backoff_seconds(source.interval, source.failures + 1, self.backoff_max_seconds)
+            log.warning(
+                "import of %s failed (%d in a row), next try in %.0fs: %s", source.url, source.failures + 1, delay, exc
+            )
+            try:
+                async with acquire(self._pool, settings.db_write_acquire_timeout_seconds, "write") as conn:
+                    await conn.execute(
+                        """
+                        update public.game_sources
+                        set consecutive_failures = consecutive_failures + 1,
+                            last_error = $2,
+                            next_poll_at = now() + make_interval(secs => $3)
+                        where id = $1::uuid
+                        """,
+                        source.id,
+                        f"{type(exc).__name__}: {exc}"[:_ERROR_CHARS],
+                        delay,
+                    )
+            except Exception:
+                # The claim already moved next_poll_at one interval out; that stands.
+                log.warning("could not record the failure of %s", source.url, exc_info=True)
+        IMPORT_POLLS.labels(outcome).inc()
+        return outcome
+
+    async def _fetch(self, source: Source) -> str:
+        async with self._client.stream("GET", source.url, headers=validators(source)) as resp:
+            if resp.status_code == 304:
+                if source.failures:
+                    async with acquire(self._pool, settings.db_write_acquire_timeout_seconds, "write") as conn:
+                        await conn.execute(
+                            """
+                            update public.game_sources
+                            set consecutive_failures = 0, last_error = null
+                            where id = $1::uuid
+                            """,
+                            source.id,
+                        )
+                return "not_modified"
+            resp.raise_for_status()
+
+            async with acquire(self._pool, settings.db_write_acquire_timeout_seconds, "write") as conn:
+                result = await import_response(
+                    conn, source.game_id, resp, source.fmt, source="scheduled_import", delta=True
+                )
+                if not (result.rows or result.skipped_old):
+                    # Nothing parsed: most likely the wrong import_format. Fail rather than keep its validators.
+                    raise ImportFormatError("no_draws_in_document")
+                # Validators are only kept once the document made it in, so a failed import refetches in full.
+                await conn.execute(
+                    """
+                    update public.game_sources
+                    set etag = $2, last_modified = $3, last_import_at = now(),
+                        consecutive_failures = 0, last_error = null
+                    where id = $1::uuid
+                    """,
+                    source.id,
+                    resp.headers.get("etag"),
+                    resp.headers.get("last-modified"),
+                )
+        if result.inserted or result.updated:
+            stats_cache.invalidate(source.game_id)
+        return "imported"
+
+
+import_scheduler = ImportScheduler(
+    tick_seconds=settings.import_scheduler_tick_seconds,
+    max_concurrency=settings.import_scheduler_max_concurrency,
+    backoff_max_seconds=settings.import_backoff_max_seconds,
+    http_timeout_seconds=settings.import_http_timeout_seconds,
+)
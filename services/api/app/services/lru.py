@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Hashable, List, Tuple
+
+
+class LRUCache:
+    """Ordered map evicting least-recently-used items once max_bytes is exceeded."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Hashable) -> Any:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        self._items.move_to_end(key)
+        return item[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        self.pop(key)
+        self._items[key] = (value, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes and len(self._items) > 1:
+            _, (_, size) = self._items.popitem(last=False)
+            self.nbytes -= size
+
+    def pop(self, key: Hashable) -> Any:
+        item = self._items.pop(key, None)
+        if item is None:
+            return None
+        self.nbytes -= item[1]
+        return item[0]
+
+    def keys(self) -> List[Hashable]:
+        return list(self._items.keys())
@@ -0,0 +1,141 @@
+"""Reads (and rebuilds) the trigger-maintained draw_number_stats summary.
+
+See supabase/migrations/003_draw_number_stats.sql, and 005_draw_trend_stats.sql
+for the recency-decayed trend columns. Rebuild after a backfill
+that bypassed the triggers, or to repair drift:
+
+    cd services/api
+    python -m app.services.number_stats               # every game
+    python -m app.services.number_stats --game powerball
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+import numpy as np
+
+from app.services.scoring import NumberStats
+
+# Windows with a count_<w> column; other windows fall back to the stats cache.
+SUMMARY_WINDOWS = (50, 100, 150, 300)
+
+
+async def summary_stats(
+    conn: asyncpg.Connection, game_id: str, pool: str, window: int, lo: int, hi: int
+) -> Tuple[int, Dict[int, NumberStats]]:
+    """(window_draws, stats) for numbers lo..hi over the latest `window` draws of a pool.
+
+    Same result as the stats cache's window (scoring.compute_number_stats over
+    those draws), from a few dozen summary rows instead of the draws themselves:
+    both count a draw for a pool only when public.draw_pool_numbers /
+    scoring.pool_numbers accept it. The cache only looks at the latest
+    HISTORY_LIMIT draws, so the two differ only if fewer than `window` of those
+    count for the pool.
+    """
+    if window not in SUMMARY_WINDOWS:
+        raise ValueError(f"no summary column for window {window}")
+    recent = await conn.fetchval(
+        "select recent_draws from public.draw_pool_stats where game_id = $1::uuid and pool = $2",
+        game_id,
+        pool,
+    )
+    rows = await conn.fetch(
+        f"""
+        select n, count_{window} as count, last_seen_draws_ago
+        from public.draw_number_stats
+        where game_id = $1::uuid and pool = $2 and n between $3 and $4
+        """,
+        game_id,
+        pool,
+        lo,
+        hi,
+    )
+    stats = {n: NumberStats(count=0, last_seen_draws_ago=None) for n in range(lo, hi + 1)}
+    for r in rows:
+        ago = r["last_seen_draws_ago"]
+        stats[r["n"]] = NumberStats(
+            count=r["count"], last_seen_draws_ago=ago if ago is not None and ago < window else None
+        )
+    return min(window, recent or 0), stats
+
+
+@dataclass
+class Trend:
+    """Recency-decayed appearance counts of one pool; weights[i] is number lo + i."""
+
+    half_life_draws: float
+    mass: float  # decayed number of draws, so weights / mass is a recency-weighted appearance rate
+    latest_draw_date: Optional[date]
+    weights: np.ndarray
+
+
+async def trend_stats(conn: asyncpg.Connection, game_id: str, pool: str, lo: int, hi: int) -> Optional[Trend]:
+    """The trend summary for numbers lo..hi of a pool, or None before the pool has any draws."""
+    rows = await conn.fetch(
+        """
+        select p.trend_half_life_draws, p.trend_mass, p.trend_latest_draw_date, s.n, s.trend
+        from public.draw_pool_stats p
+        left join public.draw_number_stats s
+          on s.game_id = p.game_id and s.pool = p.pool and s.n between $3 and $4
+        where p.game_id = $1::uuid and p.pool = $2
+        """,
+        game_id,
+        pool,
+        lo,
+        hi,
+    )
+    if not rows or rows[0]["trend_latest_draw_date"] is None:
+        return None
+    weights = np.zeros(hi - lo + 1, dtype=np.float64)
+    for r in rows:
+        if r["n"] is not None:
+            weights[r["n"] - lo] = r["trend"]
+    first = rows[0]
+    return Trend(
+        half_life_draws=first["trend_half_life_draws"],
+        mass=first["trend_mass"],
+        latest_draw_date=first["trend_latest_draw_date"],
+        weights=weights,
+    )
+
+
+async def rebuild(conn: asyncpg.Connection, game_id: Optional[str] = None) -> int:
+    """Recompute the summary from public.draws (one game, or all); returns the number of rows written."""
+    return await conn.fetchval("select public.rebuild_draw_number_stats($1::uuid)", game_id)
+
+
+async def _main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--game", help="game key or id (default: all games)")
+    args = ap.parse_args(argv)
+
+    # Imported here so --help works without a configured DATABASE_URL.
+    from app.core.config import settings
+
+    conn = await asyncpg.connect(dsn=settings.database_url)
+    try:
+        game_id = None
+        if args.game:
+            game_id = await conn.fetchval(
+                "select id::text from public.games where key = $1 or id::text = $1",
+                args.game,
+            )
+            if game_id is None:
+                print(f"game not found: {args.game}", file=sys.stderr)
+                return 1
+        rows = await rebuild(conn, game_id)
+    finally:
+        await conn.close()
+    print(f"rebuilt draw_number_stats: {rows} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
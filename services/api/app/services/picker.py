@@ -1,72 +1,48 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 
+from app.services.constraints import ConstraintError, Constraints, constraint_table
 from app.services.scoring import NumberStats
 
+# Candidate lines drawn per vectorized batch by the rejection fallback.
+MIN_BATCH = 256
+MAX_BATCH = 8192
 
-@dataclass
-class Constraints:
-    odd_even: str = "any"  # any | balanced | more_odd | more_even
-    avoid_runs: bool = True
-
-
-def _odd_count(nums: List[int]) -> int:
-    return sum(1 for n in nums if n % 2 == 1)
-
-
-def _has_long_run(nums: List[int], max_run: int = 3) -> bool:
-    # long consecutive run like 12,13,14,15
-    if len(nums) < max_run + 1:
-        return False
-    s = sorted(nums)
-    run = 1
-    for i in range(1, len(s)):
-        if s[i] == s[i - 1] + 1:
-            run += 1
-            if run > max_run:
-                return True
-        else:
-            run = 1
-    return False
-
-
-def _odd_even_ok(nums: List[int], mode: str) -> bool:
-    if mode == "any":
-        return True
-    odd = _odd_count(nums)
-    even = len(nums) - odd
-    if mode == "balanced":
-        return abs(odd - even) <= 1
-    if mode == "more_odd":
-        return odd >= even
-    if mode == "more_even":
-        return even >= odd
-    return True
+# Lines per RNG shard. Fixed (never derived from the worker count) so a seed
+# always maps to the same shards and therefore the same lines.
+SHARD_LINES = 5000
 
 
 def _build_weights(stats: Dict[int, NumberStats], main_min: int, main_max: int, strategy: str) -> np.ndarray:
-    nums = np.arange(main_min, main_max + 1)
+    nums = range(main_min, main_max + 1)
     counts = np.array([stats[n].count for n in nums], dtype=float)
-
-    # last_seen: higher -> more "overdue"; None treated as a large number
     last_seen = np.array(
-        [
-            (stats[n].last_seen_draws_ago if stats[n].last_seen_draws_ago is not None else (counts.max() + 50))
-            for n in nums
-        ],
+        [stats[n].last_seen_draws_ago if stats[n].last_seen_draws_ago is not None else -1 for n in nums],
         dtype=float,
     )
+    return weights_from_arrays(counts, last_seen, strategy)
 
-    if counts.max() > 0:
-        freq = counts / counts.max()
-    else:
-        freq = np.ones_like(counts)
 
-    overdue = last_seen / (last_seen.max() if last_seen.max() > 0 else 1.0)
+def weights_from_arrays(counts: np.ndarray, last_seen: np.ndarray, strategy: str) -> np.ndarray:
+    """_build_weights over count / last-seen arrays; last_seen < 0 means not seen in the window.
+
+    Works row-wise on 2-D input (one row per history), which the backtest uses
+    to build weights for every replayed draw at once.
+    """
+    counts = np.asarray(counts, dtype=float)
+    max_count = counts.max(axis=-1, keepdims=True)
+
+    # last_seen: higher -> more "overdue"; not seen treated as a large number
+    last_seen = np.where(np.asarray(last_seen) < 0, max_count + 50, last_seen).astype(float)
+
+    freq = np.where(max_count > 0, counts / np.where(max_count > 0, max_count, 1.0), 1.0)
+
+    max_seen = last_seen.max(axis=-1, keepdims=True)
+    overdue = last_seen / np.where(max_seen > 0, max_seen, 1.0)
 
     if strategy == "random":
         w = np.ones_like(freq)
@@ -81,13 +57,156 @@ def _build_weights(stats: Dict[int, NumberStats], main_min: int, main_max: int,
     return w
 
 
-def _sample_unique(rng: np.random.Generator, nums: np.ndarray, weights: np.ndarray, k: int) -> List[int]:
-    p = weights / weights.sum()
-    choice = rng.choice(nums, size=k, replace=False, p=p)
-    return sorted(int(x) for x in choice)
+def trend_weights(trend: np.ndarray) -> np.ndarray:
+    """Sampling weights for the "trend" strategy from recency-decayed counts (see number_stats.Trend)."""
+    trend = np.asarray(trend, dtype=float)
+    top = trend.max() if trend.size else 0.0
+    w = trend / top if top > 0 else np.ones_like(trend)
+    return np.clip(w, 1e-6, None)
+
+
+def _sample_batch(rng: np.random.Generator, weights: np.ndarray, k: int, size: int) -> np.ndarray:
+    """Draw `size` weighted k-subsets without replacement at once (Gumbel-top-k).
+
+    Returns a (size, k) array of sorted zero-based indices into weights.
+    """
+    keys = np.log(weights) + rng.gumbel(size=(size, len(weights)))
+    idx = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+    idx.sort(axis=1)
+    return idx
+
+
+def _sample_with_rejection(
+    rng: np.random.Generator,
+    weights: np.ndarray,
+    k: int,
+    main_min: int,
+    main_max: int,
+    constraints: Constraints,
+    n_lines: int,
+) -> Tuple[np.ndarray, int, int, Dict[str, int]]:
+    """Batched rejection sampling; batch size follows the observed acceptance rate.
+
+    Also returns how many candidates each rule rejected (a candidate may fail several).
+    """
+    max_candidates = n_lines * 300
+    candidates = 0
+    accepted = 0
+    rejections: Dict[str, int] = {}
+    chunks: List[np.ndarray] = [np.empty((0, k), dtype=np.int64)]
+    have = 0
+    while have < n_lines and candidates < max_candidates:
+        need = n_lines - have
+        rate = max(accepted / candidates, 0.01) if candidates else 0.5
+        size = int(min(max(need / rate * 1.25, MIN_BATCH), MAX_BATCH, max_candidates - candidates))
+        idx = _sample_batch(rng, weights, k, size)
+        candidates += size
+
+        ok = np.ones(size, dtype=bool)
+        for rule, rule_ok in constraints.rule_masks(idx + main_min, main_min, main_max).items():
+            rejections[rule] = rejections.get(rule, 0) + size - int(np.count_nonzero(rule_ok))
+            ok &= rule_ok
+        accepted += int(np.count_nonzero(ok))
+
+        keep = idx[ok][:need]
+        chunks.append(keep)
+        have += len(keep)
+    return np.concatenate(chunks), candidates, accepted, rejections
+
+
+@dataclass
+class LineArrays:
+    """Sampled lines as arrays: main (n, main_count) and bonus (n, bonus_count) hold actual numbers."""
+
+    main: np.ndarray
+    bonus: Optional[np.ndarray]
+    score_hints: np.ndarray
+    candidates: int
+    accepted: int
+    method: str
+    rejections: Dict[str, int] = field(default_factory=dict)  # per constraint rule, rejection sampler only
+
+    @classmethod
+    def concat(cls, parts: List["LineArrays"]) -> "LineArrays":
+        """Join shards in order; method is the first shard's."""
+        rejections: Dict[str, int] = {}
+        for p in parts:
+            for rule, n in p.rejections.items():
+                rejections[rule] = rejections.get(rule, 0) + n
+        return cls(
+            main=np.concatenate([p.main for p in parts]),
+            bonus=np.concatenate([p.bonus for p in parts]) if parts[0].bonus is not None else None,
+            score_hints=np.concatenate([p.score_hints for p in parts]),
+            candidates=sum(p.candidates for p in parts),
+            accepted=sum(p.accepted for p in parts),
+            method=parts[0].method,
+            rejections=rejections,
+        )
+
+    def to_lines(self, strategy: str) -> List[dict]:
+        bonus_rows = self.bonus.tolist() if self.bonus is not None else None
+        out: List[dict] = []
+        for i, main in enumerate(self.main.tolist()):
+            bonus = bonus_rows[i] if bonus_rows is not None else None
+            meta = {"strategy": strategy, "score_hint": float(self.score_hints[i])}
+            out.append({"main": main, "bonus": bonus, "meta": meta})
+        return out
+
+
+@dataclass
+class SampleResult:
+    lines: List[dict]
+    candidates: int
+    accepted: int
+    method: str
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.candidates if self.candidates else 0.0
 
 
-def generate_lines(
+def shard_rng(seed: int, stream: int, shard: int) -> np.random.Generator:
+    """Independent counter-based (Philox) generator for one shard of one stream.
+
+    Keyed by SeedSequence(seed, spawn_key=(stream, shard)), so shards can be
+    produced in any order, on any worker, and still give the same lines.
+    """
+    return np.random.Generator(np.random.Philox(np.random.SeedSequence(seed, spawn_key=(stream, shard))))
+
+
+def shard_sizes(n_lines: int) -> List[int]:
+    full, rest = divmod(n_lines, SHARD_LINES)
+    return [SHARD_LINES] * full + ([rest] if rest else [])
+
+
+def sample_shard(seed: int, stream: int, shard: int, size: int, **kwargs) -> LineArrays:
+    """sample_line_arrays for one shard; builds its generator in the worker, so it is cheap to ship to a process."""
+    return sample_line_arrays(n_lines=size, rng=shard_rng(seed, stream, shard), **kwargs)
+
+
+def generate_lines(**kwargs) -> List[dict]:
+    """Generate lines for a numeric lottery; see sample_line_arrays for arguments."""
+    return sample_lines(**kwargs).lines
+
+
+def sample_lines(**kwargs) -> SampleResult:
+    """Generate lines for a numeric lottery; see sample_line_arrays for arguments.
+
+    Output format matches the web app expectations:
+    { main: [...], bonus?: [...], meta: { strategy, score_hint } }
+
+    score_hint is NOT a probability; it is a relative internal sampling score.
+    """
+    arrays = sample_line_arrays(**kwargs)
+    return SampleResult(
+        lines=arrays.to_lines(kwargs["strategy"]),
+        candidates=arrays.candidates,
+        accepted=arrays.accepted,
+        method=arrays.method,
+    )
+
+
+def sample_line_arrays(
     *,
     stats_main: Dict[int, NumberStats],
     main_count: int,
@@ -101,46 +220,67 @@ def generate_lines(
     bonus_max: int = 0,
     stats_bonus: Optional[Dict[int, NumberStats]] = None,
     rng_seed: int | None = None,
-) -> List[dict]:
-    """Generate lines for a numeric lottery.
-
-    Output format matches the web app expectations:
-    { main: [...], bonus?: [...], meta: { strategy, score_hint } }
-
-    score_hint is NOT a probability; it is a relative internal sampling score.
+    weights_main: Optional[np.ndarray] = None,
+    weights_bonus: Optional[np.ndarray] = None,
+    rng: Optional[np.random.Generator] = None,
+) -> LineArrays:
+    """Sample n_lines lines for a numeric lottery.
+
+    weights_main / weights_bonus may carry precomputed _build_weights output
+    (e.g. from the stats cache) to skip rebuilding them from the stats. rng
+    overrides rng_seed so callers producing lines in chunks can keep one stream.
+
+    Main numbers come from the exact constrained sampler (see
+    constraints.ConstraintTable), so exactly n_lines valid lines are
+    returned; if its table would be too large, batched rejection sampling
+    is used instead. Raises ConstraintError when the constraints cannot be met.
     """
-    rng = np.random.default_rng(rng_seed)
-
-    main_nums = np.arange(main_min, main_max + 1)
-    main_w = _build_weights(stats_main, main_min, main_max, strategy)
-
-    bonus_nums = np.arange(bonus_min, bonus_max + 1) if bonus_count and bonus_min and bonus_max else None
-    bonus_w = None
-    if bonus_nums is not None and stats_bonus is not None:
-        bonus_w = _build_weights(stats_bonus, bonus_min, bonus_max, strategy)
+    if rng is None:
+        rng = np.random.default_rng(rng_seed)
 
-    out: List[dict] = []
-    attempts = 0
-    while len(out) < n_lines and attempts < n_lines * 300:
-        attempts += 1
-        main = _sample_unique(rng, main_nums, main_w, main_count)
+    main_w = weights_main if weights_main is not None else _build_weights(stats_main, main_min, main_max, strategy)
 
-        if not _odd_even_ok(main, constraints.odd_even):
-            continue
-        if constraints.avoid_runs and _has_long_run(main):
-            continue
-
-        bonus = None
-        if bonus_nums is not None:
-            if bonus_w is None:
-                bonus = _sample_unique(rng, bonus_nums, np.ones_like(bonus_nums, dtype=float), bonus_count)
-            else:
-                bonus = _sample_unique(rng, bonus_nums, bonus_w, bonus_count)
-
-        # score_hint: average weight for chosen numbers (relative, not a probability)
-        idxs = [m - main_min for m in main]
-        score_hint = float(np.mean(main_w[idxs]))
-
-        out.append({"main": main, "bonus": bonus, "meta": {"strategy": strategy, "score_hint": score_hint}})
+    has_bonus = bool(bonus_count and bonus_min and bonus_max)
+    bonus_w = weights_bonus
+    if has_bonus and bonus_w is None:
+        if stats_bonus is not None:
+            bonus_w = _build_weights(stats_bonus, bonus_min, bonus_max, strategy)
+        else:
+            bonus_w = np.ones(bonus_max - bonus_min + 1, dtype=float)
 
-    return out
+    rejections: Dict[str, int] = {}
+    if constraints.is_trivial:
+        main_idx = _sample_batch(rng, main_w, main_count, n_lines)
+        candidates = accepted = n_lines
+        method = "batch"
+    else:
+        table = constraint_table(main_w, main_min, main_max, main_count, constraints)
+        if table is not None:
+            main_idx = table.sample(rng, n_lines)
+            candidates = accepted = n_lines
+            method = "exact"
+        else:
+            main_idx, candidates, accepted, rejections = _sample_with_rejection(
+                rng, main_w, main_count, main_min, main_max, constraints, n_lines
+            )
+            method = "rejection"
+            if len(main_idx) < n_lines:
+                raise ConstraintError(
+                    f"constraints_too_strict: only {len(main_idx)} of {n_lines} lines found in {candidates} candidates"
+                )
+
+    # score_hint: average weight for chosen numbers (relative, not a probability)
+    score_hints = main_w[main_idx].mean(axis=1)
+    bonus = None
+    if has_bonus:
+        bonus = _sample_batch(rng, bonus_w, bonus_count, len(main_idx)) + bonus_min
+
+    return LineArrays(
+        main=main_idx + main_min,
+        bonus=bonus,
+        score_hints=score_hints,
+        candidates=candidates,
+        accepted=accepted,
+        method=method,
+        rejections=rejections,
+    )
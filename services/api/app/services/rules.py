@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from typing import Optional
+
+
+def rule_int(rules: dict, key: str) -> Optional[int]:
+    """Integer value of a games.rules entry, or None when it is missing or not a number."""
+    value = rules.get(key)
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
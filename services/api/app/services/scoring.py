@@ -1,10 +1,14 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from itertools import chain
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 
+# public.draw_pool_numbers (migration 003) only accepts numbers of at most 9 digits.
+_MAX_DRAW_NUMBER = 999_999_999
+
 
 @dataclass
 class NumberStats:
@@ -12,25 +16,131 @@ class NumberStats:
     last_seen_draws_ago: int | None
 
 
+def pool_numbers(numbers: Any, pool: str) -> Optional[List[int]]:
+    """A draw's numbers for one pool, or None when the draw does not count for it.
+
+    Same rule as public.draw_pool_numbers, so the stats cache and the summary
+    tables see the same draws: a non-empty list of integers (not booleans).
+    """
+    value = numbers.get(pool) if isinstance(numbers, dict) else None
+    if not isinstance(value, list) or not value:
+        return None
+    for x in value:
+        if not isinstance(x, int) or isinstance(x, bool) or abs(x) > _MAX_DRAW_NUMBER:
+            return None
+    return value
+
+
+def pack_draws(draws: List[List[int]], main_min: int, main_max: int) -> np.ndarray:
+    """Pack draws into a dense 2-D array of zero-based offsets (n - main_min).
+
+    Rows keep the input order; short rows are padded and out-of-range numbers
+    are masked, both with -1.
+    """
+    size = main_max - main_min + 1
+    width = max((len(d) for d in draws), default=0)
+    if draws and all(len(d) == width for d in draws):
+        flat = np.fromiter(chain.from_iterable(draws), dtype=np.int64, count=len(draws) * width)
+        packed = flat.reshape(len(draws), width) - main_min
+    else:
+        packed = np.full((len(draws), width), -1, dtype=np.int64)
+        for i, nums in enumerate(draws):
+            packed[i, : len(nums)] = np.asarray(nums, dtype=np.int64) - main_min
+    packed[(packed < 0) | (packed >= size)] = -1
+    return packed
+
+
+def number_stats_arrays(packed: np.ndarray, size: int, windows: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized counts and last-seen over a packed, most-recent-first draw matrix.
+
+    Returns (counts, last_seen): counts has one row per window (in the order
+    given), last_seen holds the first row index each number appears in, or -1.
+    """
+    n_draws, width = packed.shape
+    counts = np.zeros((len(windows), size), dtype=np.int64)
+    last_seen = np.full(size, -1, dtype=np.int64)
+    if n_draws == 0 or width == 0:
+        return counts, last_seen
+
+    # Counts: one bincount per slice between consecutive (sorted) windows.
+    order = sorted(range(len(windows)), key=lambda i: windows[i])
+    running = np.zeros(size, dtype=np.int64)
+    start = 0
+    for i in order:
+        stop = min(max(int(windows[i]), 0), n_draws)
+        if stop > start:
+            chunk = packed[start:stop].ravel()
+            running += np.bincount(chunk[chunk >= 0], minlength=size)
+            start = stop
+        counts[i] = running
+
+    # Last seen: first occurrence of each offset in row-major order.
+    flat = packed.ravel()
+    pos = np.flatnonzero(flat >= 0)
+    first = np.full(size, flat.size, dtype=np.int64)
+    np.minimum.at(first, flat[pos], pos)
+    seen = first < flat.size
+    last_seen[seen] = first[seen] // width
+    return counts, last_seen
+
+
+def grouped_number_stats(
+    groups: np.ndarray, ago: np.ndarray, draws: List[List[int]], lows: np.ndarray, sizes: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Counts and last-seen for several games in one pass.
+
+    draws[r] is a draw of game groups[r], ago[r] draws back from its latest.
+    Game g covers numbers lows[g] .. lows[g] + sizes[g] - 1; out-of-range
+    numbers are ignored. Returns (offsets, counts, last_seen) over the games'
+    concatenated ranges: game g is [offsets[g]:offsets[g + 1]], and last_seen
+    is the smallest `ago` a number appears at, or -1.
+    """
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    lengths = np.fromiter(map(len, draws), dtype=np.int64, count=len(draws))
+    flat = np.fromiter(chain.from_iterable(draws), dtype=np.int64, count=int(lengths.sum()))
+    row = np.repeat(np.arange(len(draws)), lengths)
+
+    game = groups[row]
+    off = flat - lows[game]
+    valid = (off >= 0) & (off < sizes[game])
+    idx = (off + offsets[game])[valid]
+
+    total = int(offsets[-1])
+    counts = np.bincount(idx, minlength=total)
+    first = np.full(total, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first, idx, ago[row][valid])
+    last_seen = np.where(first == np.iinfo(np.int64).max, -1, first)
+    return offsets, counts, last_seen
+
+
+def stats_from_arrays(counts: np.ndarray, last_seen: np.ndarray, main_min: int, window: int) -> Dict[int, NumberStats]:
+    """Build the NumberStats mapping for one window from number_stats_arrays output."""
+    out: Dict[int, NumberStats] = {}
+    for i, (c, ls) in enumerate(zip(counts.tolist(), last_seen.tolist())):
+        out[main_min + i] = NumberStats(count=c, last_seen_draws_ago=ls if 0 <= ls < window else None)
+    return out
+
+
+def compute_window_stats(
+    draws: List[List[int]], main_min: int, main_max: int, windows: Sequence[int]
+) -> Dict[int, Dict[int, NumberStats]]:
+    """Compute NumberStats for several windows (most recent N draws) in one pass.
+
+    draws: list of draw main number lists, ordered most-recent-first.
+    """
+    size = main_max - main_min + 1
+    packed = pack_draws(draws, main_min, main_max)
+    counts, last_seen = number_stats_arrays(packed, size, windows)
+    return {int(w): stats_from_arrays(counts[i], last_seen, main_min, int(w)) for i, w in enumerate(windows)}
+
+
 def compute_number_stats(draws: List[List[int]], main_min: int, main_max: int) -> Dict[int, NumberStats]:
     """Compute frequency and last-seen (draws ago) for each number.
 
     draws: list of draw main number lists, ordered most-recent-first.
     """
-    counts = {n: 0 for n in range(main_min, main_max + 1)}
-    last_seen: Dict[int, int] = {}
-
-    for idx, nums in enumerate(draws):
-        for n in nums:
-            if n in counts:
-                counts[n] += 1
-                if n not in last_seen:
-                    last_seen[n] = idx
-
-    stats: Dict[int, NumberStats] = {}
-    for n in range(main_min, main_max + 1):
-        stats[n] = NumberStats(count=counts[n], last_seen_draws_ago=last_seen.get(n))
-    return stats
+    return compute_window_stats(draws, main_min, main_max, [len(draws)])[len(draws)]
 
 
 def make_weights(
@@ -0,0 +1,450 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import asyncpg
+import numpy as np
+
+from app.core.config import settings
+from app.core.executor import executor
+from app.core.http_cache import mark_stale, validated_version
+from app.core.metrics import stage
+from app.db.session import acquire
+from app.services.cooccurrence import one_hot
+from app.services.lru import LRUCache
+from app.services.picker import _build_weights
+from app.services.rules import rule_int
+from app.services.scoring import NumberStats, number_stats_arrays, pack_draws, pool_numbers, stats_from_arrays
+
+# Longest window any route asks for; one snapshot per game serves every window up to this.
+HISTORY_LIMIT = 2000
+
+# Rough per-number footprint of a NumberStats mapping entry (dict slot + dataclass + ints).
+_STATS_ITEM_BYTES = 200
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _LoadAbandoned(Exception):
+    """The caller running a coalesced load was cancelled before it finished."""
+
+
+@dataclass
+class GameSnapshot:
+    """Parsed draw history for one game, packed most-recent-first (see scoring.pack_draws)."""
+
+    game_id: str
+    rules: dict
+    latest_draw_date: Optional[date]
+    main: Optional[np.ndarray]
+    bonus: Optional[np.ndarray]
+    version: tuple  # (game_data_versions.version, games.updated_at) when loading started
+    checked_at: float
+    generation: int = 0  # StatsCache.invalidate() count when loading started
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.main, self.bonus) if a is not None) + 512
+
+
+@dataclass
+class GameHistory:
+    """Full draw history of one game as cumulative counts, oldest draw first.
+
+    main_cum[t, i] is how often offset i appeared in the first t draws, so the
+    count over draws [a, b) is main_cum[b] - main_cum[a].
+    """
+
+    snapshot: GameSnapshot
+    game_id: str
+    rules: dict
+    latest_draw_date: Optional[date]
+    dates: np.ndarray  # datetime64[D], ascending
+    main_cum: Optional[np.ndarray]
+    bonus_cum: Optional[np.ndarray]
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.dates, self.main_cum, self.bonus_cum)
+        return sum(a.nbytes for a in arrays if a is not None) + 512
+
+
+@dataclass
+class StatsEntry:
+    """Stats (and, when a strategy is given, sampling weights) for one window of a snapshot."""
+
+    snapshot: GameSnapshot
+    window: int
+    strategy: Optional[str]
+    window_draws: int
+    stats_main: Optional[Dict[int, NumberStats]]
+    stats_bonus: Optional[Dict[int, NumberStats]]
+    weights_main: Optional[np.ndarray]
+    weights_bonus: Optional[np.ndarray]
+
+    @property
+    def nbytes(self) -> int:
+        n = sum(len(s) for s in (self.stats_main, self.stats_bonus) if s) * _STATS_ITEM_BYTES
+        return n + sum(w.nbytes for w in (self.weights_main, self.weights_bonus) if w is not None) + 256
+
+
+class StatsCache:
+    """In-process cache of parsed draws, stats and weights keyed by (game_id, window, strategy).
+
+    The parsed history of a game lives under (game_id, None, None) and its
+    full-history prefix sums under (game_id, "history", None). The snapshot is
+    revalidated against the game's data version (see http_cache.data_version) at
+    most every revalidate_seconds, and whenever a request's validators were built
+    from another version; invalidate() marks it out of date.
+
+    Concurrent loads of one key are coalesced: the first caller runs it and the
+    rest await its result. A value that is out of date but less than
+    stale_seconds past revalidation is returned as-is while a background task
+    refreshes it (on a connection of its own from `pool`); without a pool, or
+    past that bound, callers wait for the reload.
+    """
+
+    def __init__(self, max_bytes: int, revalidate_seconds: float, stale_seconds: float):
+        self.revalidate_seconds = revalidate_seconds
+        self.stale_seconds = stale_seconds
+        self.pool: Optional[asyncpg.Pool] = None  # set at startup
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_served = 0
+        self.refresh_failures = 0
+        self._lru = LRUCache(max_bytes)
+        self._generations: Dict[str, int] = {}
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._refreshing: Dict[tuple, asyncio.Task] = {}
+
+    def invalidate(self, game_id: str) -> None:
+        """Mark the game's cached data out of date, including loads already in flight."""
+        self._generations[game_id] = self._generations.get(game_id, 0) + 1
+
+    def clear(self) -> None:
+        for key in self._lru.keys():
+            self._lru.pop(key)
+
+    async def stop(self) -> None:
+        """Cancel background refreshes (before the pool closes)."""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def snapshot(self, conn: asyncpg.Connection, game_id: str) -> Optional[GameSnapshot]:
+        """Return the game's parsed history, or None if the game does not exist."""
+        key = (game_id, None, None)
+        snap: Optional[GameSnapshot] = self._lru.get(key)
+        validated = validated_version(game_id)
+        if snap is not None:
+            fresh = self._current(snap) and time.monotonic() - snap.checked_at < self.revalidate_seconds
+            if fresh and validated in (None, snap.version):
+                return snap
+            if self.pool is not None and self._servable(snap):
+                self._refresh_later(key, lambda: self._pooled(lambda c: self._refresh_snapshot(c, game_id, snap)))
+                return self._stale(snap)
+        new = await self._coalesce(key, lambda: self._refresh_snapshot(conn, game_id, snap))
+        if new is not None and validated not in (None, new.version):
+            mark_stale()  # the data changed again after conditional() read its version
+        return new
+
+    async def stats(
+        self,
+        conn: asyncpg.Connection,
+        game_id: str,
+        window: int = HISTORY_LIMIT,
+        strategy: Optional[str] = None,
+    ) -> Optional[StatsEntry]:
+        """Return stats for the most recent `window` draws, plus weights if `strategy` is set."""
+        snap = await self.snapshot(conn, game_id)
+        if snap is None:
+            return None
+        key = (game_id, window, strategy)
+        entry: Optional[StatsEntry] = self._lru.get(key)
+        if entry is not None and entry.snapshot is snap:
+            self.hits += 1
+            return entry
+        if entry is not None and self._servable(entry.snapshot):
+            self._refresh_later(key, lambda: self._build(key, snap, window, strategy))
+            return self._stale(entry)
+
+        self.misses += 1
+        return await self._coalesce(key, lambda: self._build(key, snap, window, strategy))
+
+    async def history(self, conn: asyncpg.Connection, game_id: str) -> Optional[GameHistory]:
+        """Return cumulative counts over the game's whole history, or None if the game does not exist."""
+        snap = await self.snapshot(conn, game_id)
+        if snap is None:
+            return None
+        key = (game_id, "history", None)
+        hist: Optional[GameHistory] = self._lru.get(key)
+        if hist is not None and hist.snapshot is snap:
+            self.hits += 1
+            return hist
+        if hist is not None and self.pool is not None and self._servable(hist.snapshot):
+            self._refresh_later(key, lambda: self._pooled(lambda c: self._load_history(c, key, snap)))
+            return self._stale(hist)
+
+        self.misses += 1
+        return await self._coalesce(key, lambda: self._load_history(conn, key, snap))
+
+    def _current(self, snap: GameSnapshot) -> bool:
+        return snap.generation == self._generations.get(snap.game_id, 0)
+
+    def _servable(self, snap: GameSnapshot) -> bool:
+        """Recent enough to hand out while a refresh runs."""
+        return time.monotonic() - snap.checked_at < self.revalidate_seconds + self.stale_seconds
+
+    def _stale(self, value):
+        self.stale_served += 1
+        mark_stale()
+        return value
+
+    async def _coalesce(self, key: tuple, load: Callable[[], Awaitable[T]]) -> T:
+        """Run load() once for all concurrent callers of `key`."""
+        while True:
+            fut = self._inflight.get(key)
+            if fut is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(fut)
+            except _LoadAbandoned:
+                continue  # the caller running it was cancelled; take over
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            fut.set_exception(_LoadAbandoned())
+            raise
+        except Exception as exc:
+            fut.set_exception(exc)
+            raise
+        else:
+            fut.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+            if fut.done() and not fut.cancelled():
+                fut.exception()  # retrieved, even when nobody else was waiting
+
+    def _refresh_later(self, key: tuple, load: Callable[[], Awaitable[object]]) -> None:
+        if key in self._inflight or key in self._refreshing:
+            return
+        task = asyncio.get_running_loop().create_task(self._refresh(key, load))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key: tuple, load: Callable[[], Awaitable[object]]) -> None:
+        try:
+            await self._coalesce(key, load)
+        except Exception:
+            # The stale value stays; the next request past revalidation tries again.
+            self.refresh_failures += 1
+            log.warning("stats cache refresh of %s failed", key, exc_info=True)
+
+    async def _pooled(self, load: Callable[[asyncpg.Connection], Awaitable[T]]) -> T:
+        async with acquire(self.pool, settings.db_read_acquire_timeout_seconds) as conn:
+            return await load(conn)
+
+    async def _refresh_snapshot(
+        self, conn: asyncpg.Connection, game_id: str, snap: Optional[GameSnapshot]
+    ) -> Optional[GameSnapshot]:
+        generation = self._generations.get(game_id, 0)
+        if snap is not None and snap.generation == generation:
+            row = await conn.fetchrow(
+                """
+                select v.version, g.updated_at
+                from public.games g
+                left join public.game_data_versions v on v.game_id = g.id
+                where g.id = $1::uuid
+                """,
+                game_id,
+            )
+            if row is not None and tuple(row) == snap.version:
+                snap.checked_at = time.monotonic()
+                return snap
+
+        key = (game_id, None, None)
+        new = await self._load_snapshot(conn, game_id, generation)
+        if new is None:
+            for k in self._lru.keys():
+                if k[0] == game_id:
+                    self._lru.pop(k)
+        else:
+            self._lru.put(key, new, new.nbytes)
+        return new
+
+    async def _build(self, key: tuple, snap: GameSnapshot, window: int, strategy: Optional[str]) -> StatsEntry:
+        with stage("stats_build"):
+            entry = await executor.run(_build_entry, snap, window, strategy)
+        entry.snapshot = snap  # a process pool hands back a copy
+        self._lru.put(key, entry, entry.nbytes)
+        return entry
+
+    async def _load_history(self, conn: asyncpg.Connection, key: tuple, snap: GameSnapshot) -> GameHistory:
+        hist = await _load_history(conn, snap)
+        self._lru.put(key, hist, hist.nbytes)
+        return hist
+
+    async def _load_snapshot(
+        self, conn: asyncpg.Connection, game_id: str, generation: int
+    ) -> Optional[GameSnapshot]:
+        with stage("db_fetch_snapshot"):
+            # Read before the draws: a change in between makes the next revalidation reload.
+            game = await conn.fetchrow(
+                """
+                select g.id, g.rules, v.version, g.updated_at
+                from public.games g
+                left join public.game_data_versions v on v.game_id = g.id
+                where g.id::text = $1
+                """,
+                game_id,
+            )
+            if not game:
+                return None
+            rows = await conn.fetch(
+                """
+                select draw_date, numbers
+                from public.draws
+                where game_id = $1
+                order by draw_date desc
+                limit $2
+                """,
+                game["id"],
+                HISTORY_LIMIT,
+            )
+
+        rules = game["rules"] or {}
+        draws_main: List[List[int]] = []
+        draws_bonus: List[List[int]] = []
+        for r in rows:
+            main = pool_numbers(r["numbers"], "main")
+            if main is not None:
+                draws_main.append(main)
+            bonus = pool_numbers(r["numbers"], "bonus")
+            if bonus is not None:
+                draws_bonus.append(bonus)
+
+        main_min, main_max = rule_int(rules, "main_min"), rule_int(rules, "main_max")
+        bonus_min, bonus_max = rule_int(rules, "bonus_min"), rule_int(rules, "bonus_max")
+        main = bonus = None
+        with stage("snapshot_pack"):
+            if main_min is not None and main_max is not None:
+                main = await executor.run(pack_draws, draws_main, main_min, main_max)
+            if rule_int(rules, "bonus_count") and bonus_min is not None and bonus_max is not None:
+                bonus = await executor.run(pack_draws, draws_bonus, bonus_min, bonus_max)
+
+        return GameSnapshot(
+            game_id=game_id,
+            rules=rules,
+            latest_draw_date=rows[0]["draw_date"] if rows else None,
+            main=main,
+            bonus=bonus,
+            version=(game["version"], game["updated_at"]),
+            checked_at=time.monotonic(),
+            generation=generation,
+        )
+
+
+def _cumulative(draws: List[List[int]], lo: Optional[int], hi: Optional[int]) -> Optional[np.ndarray]:
+    if lo is None or hi is None:
+        return None
+    size = hi - lo + 1
+    cum = np.zeros((len(draws) + 1, size), dtype=np.int32)
+    if draws:
+        np.cumsum(one_hot(pack_draws(draws, lo, hi), size), axis=0, dtype=np.int32, out=cum[1:])
+    return cum
+
+
+async def _load_history(conn: asyncpg.Connection, snap: GameSnapshot) -> GameHistory:
+    with stage("db_fetch_history"):
+        rows = await conn.fetch(
+            """
+            select draw_date, numbers
+            from public.draws
+            where game_id = $1::uuid
+            order by draw_date asc
+            """,
+            snap.game_id,
+        )
+
+    # One row per draw in both pools, so row t of either array is the same draw.
+    draws_main: List[List[int]] = []
+    draws_bonus: List[List[int]] = []
+    for r in rows:
+        draws_main.append(pool_numbers(r["numbers"], "main") or [])
+        draws_bonus.append(pool_numbers(r["numbers"], "bonus") or [])
+
+    rules = snap.rules
+    with stage("history_build"):
+        main_cum = await executor.run(
+            _cumulative, draws_main, rule_int(rules, "main_min"), rule_int(rules, "main_max")
+        )
+        bonus_cum = None
+        if rule_int(rules, "bonus_count"):
+            bonus_cum = await executor.run(
+                _cumulative, draws_bonus, rule_int(rules, "bonus_min"), rule_int(rules, "bonus_max")
+            )
+
+    return GameHistory(
+        snapshot=snap,
+        game_id=snap.game_id,
+        rules=rules,
+        latest_draw_date=snap.latest_draw_date,
+        dates=np.array([r["draw_date"] for r in rows], dtype="datetime64[D]"),
+        main_cum=main_cum,
+        bonus_cum=bonus_cum,
+    )
+
+
+def _window_stats(packed: Optional[np.ndarray], lo: Optional[int], hi: Optional[int], window: int):
+    if packed is None or lo is None or hi is None:
+        return None
+    counts, last_seen = number_stats_arrays(packed[:window], hi - lo + 1, [window])
+    return stats_from_arrays(counts[0], last_seen, lo, window)
+
+
+def _build_entry(snap: GameSnapshot, window: int, strategy: Optional[str]) -> StatsEntry:
+    rules = snap.rules
+    main_min, main_max = rule_int(rules, "main_min"), rule_int(rules, "main_max")
+    bonus_min, bonus_max = rule_int(rules, "bonus_min"), rule_int(rules, "bonus_max")
+
+    stats_main = _window_stats(snap.main, main_min, main_max, window)
+    stats_bonus = _window_stats(snap.bonus, bonus_min, bonus_max, window)
+
+    weights_main = weights_bonus = None
+    if strategy is not None:
+        if stats_main is not None:
+            weights_main = _build_weights(stats_main, main_min, main_max, strategy)
+        if stats_bonus is not None:
+            weights_bonus = _build_weights(stats_bonus, bonus_min, bonus_max, strategy)
+
+    return StatsEntry(
+        snapshot=snap,
+        window=window,
+        strategy=strategy,
+        window_draws=min(window, len(snap.main)) if snap.main is not None else 0,
+        stats_main=stats_main,
+        stats_bonus=stats_bonus,
+        weights_main=weights_main,
+        weights_bonus=weights_bonus,
+    )
+
+
+stats_cache = StatsCache(
+    max_bytes=settings.stats_cache_max_bytes,
+    revalidate_seconds=settings.stats_cache_revalidate_seconds,
+    stale_seconds=settings.stats_cache_stale_seconds,
+)
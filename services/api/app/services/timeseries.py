@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def draw_range(dates: np.ndarray, start: Optional[date], end: Optional[date]) -> Tuple[int, int]:
+    """Half-open [a, b) draw index range with start <= draw_date <= end (ascending dates)."""
+    a = int(np.searchsorted(dates, np.datetime64(start, "D"), side="left")) if start else 0
+    b = int(np.searchsorted(dates, np.datetime64(end, "D"), side="right")) if end else len(dates)
+    return a, max(a, b)
+
+
+def sample_points(a: int, b: int, points: Optional[int]) -> np.ndarray:
+    """Draw indices in [a, b), thinned to at most `points` evenly spaced ones (last draw kept)."""
+    if points is None or b - a <= points:
+        return np.arange(a, b)
+    return np.unique(np.linspace(a, b - 1, points).round().astype(np.int64))
+
+
+def rolling_counts(cum: np.ndarray, positions: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Trailing-window counts at each draw index from a prefix-sum array (see stats_cache.GameHistory).
+
+    Returns (counts, span): counts[p, i] is how often offset i appeared in the
+    `window` draws ending at positions[p]; span[p] is the number of draws
+    actually covered, which is shorter than `window` near the start of history.
+    """
+    hi = positions + 1
+    lo = np.maximum(hi - window, 0)
+    return cum[hi] - cum[lo], hi - lo
@@ -0,0 +1,297 @@
+"""Benchmark the stats, weighting, sampling and import-parsing hot paths.
+
+Runs offline against synthetic histories (see benchmarks.synthetic):
+
+    cd services/api
+    python -m benchmarks.run                          # default sizes, compare to baseline if present
+    python -m benchmarks.run --sizes 1000,1000000     # include the 1M-draw histories
+    python -m benchmarks.run --save-baseline          # record the current numbers as the baseline
+    python -m benchmarks.run --filter picker --fail-on-regression
+
+Results are written as JSON (--out). Timings are medians over repeated runs;
+a case regresses when its median exceeds the baseline median by more than
+--threshold (relative) and --min-delta (absolute seconds).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+
+# app.core.config requires a DSN at import time; benchmarks never connect.
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/unused")
+
+import numpy as np  # noqa: E402
+
+from app.services import backtest, draw_import, gaps, picker, scoring  # noqa: E402
+from app.services.constraints import Constraints  # noqa: E402
+from app.services.stats_cache import HISTORY_LIMIT  # noqa: E402
+from benchmarks.synthetic import FORMATS, GameFormat, column_csv, history, json_document, positional_csv  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_OUT = os.path.join(HERE, "results.json")
+
+STRATEGIES = ("balanced", "hot", "cold", "random")
+
+
+@dataclass
+class Case:
+    name: str
+    params: Dict[str, object]
+    fn: Callable[[], object]
+
+    @property
+    def key(self) -> str:
+        return case_key(self.name, self.params)
+
+
+def case_key(name: str, params: Dict[str, object]) -> str:
+    return f"{name}[{','.join(f'{k}={v}' for k, v in sorted(params.items()))}]"
+
+
+@dataclass
+class Timing:
+    key: str
+    name: str
+    params: Dict[str, object]
+    median_s: float
+    min_s: float
+    repeats: int
+    baseline_s: Optional[float] = None
+    regressed: bool = False
+    extra: Dict[str, object] = field(default_factory=dict)
+
+
+def measure(fn: Callable[[], object], min_time: float, max_repeats: int) -> List[float]:
+    fn()  # warm-up: caches, lazy imports, constraint tables
+    times: List[float] = []
+    while len(times) < 3 or (sum(times) < min_time and len(times) < max_repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def constraint_presets(fmt: GameFormat) -> Dict[str, dict]:
+    k, lo, hi = fmt.main_count, fmt.main_min, fmt.main_max
+    mean = k * (lo + hi) / 2
+    decades = hi // 10 - lo // 10 + 1
+    return {
+        "none": {"avoid_runs": False},
+        "default": {},
+        "odd_even": {"odd_even": "balanced"},
+        "sum": {"sum_min": int(mean * 0.9), "sum_max": int(mean * 1.1)},
+        "decades": {"min_decades": min(k, decades) // 2 + 1, "max_per_decade": math.ceil(k / decades) + 1},
+        "combined": {
+            "odd_even": "balanced",
+            "low_high": "balanced",
+            "sum_min": int(mean * 0.85),
+            "sum_max": int(mean * 1.15),
+        },
+    }
+
+
+def _aiter(items: List[str]):
+    async def gen():
+        for item in items:
+            yield item
+
+    return gen()
+
+
+def _drain(loop: asyncio.AbstractEventLoop, records) -> int:
+    async def consume():
+        n = 0
+        async for _ in records:
+            n += 1
+        return n
+
+    return loop.run_until_complete(consume())
+
+
+def _json_chunks(doc: str, size: int = 64 * 1024) -> List[str]:
+    return [doc[i : i + size] for i in range(0, len(doc), size)]
+
+
+def cases(
+    formats: List[str], sizes: List[int], n_lines: int, loop: asyncio.AbstractEventLoop, wanted: Callable[[str], bool]
+) -> Iterator[Case]:
+    """Yield selected cases; inputs (which get large at 1M draws) are only built for those."""
+    for fmt_name in formats:
+        fmt = FORMATS[fmt_name]
+        lo, hi = fmt.main_min, fmt.main_max
+
+        for n_draws in sizes:
+            p = {"format": fmt_name, "draws": n_draws}
+            names = [
+                "scoring.compute_number_stats",
+                "gaps.gap_stats",
+                "import.positional_csv",
+                "import.column_csv",
+                "import.json",
+            ]
+            if not any(wanted(case_key(name, p)) for name in names):
+                continue
+            hist = history(fmt, n_draws)
+            main, bonus = hist["main"], hist["bonus"]
+
+            if wanted(case_key("scoring.compute_number_stats", p)):
+                draws = main.tolist()
+                yield Case("scoring.compute_number_stats", p, lambda: scoring.compute_number_stats(draws, lo, hi))
+                del draws
+            if wanted(case_key("gaps.gap_stats", p)):
+                hits = np.zeros((n_draws, hi - lo + 1), dtype=bool)
+                hits[np.arange(n_draws)[:, None], main - lo] = True
+                yield Case("gaps.gap_stats", p, lambda: gaps.gap_stats(hits))
+                del hits
+            if wanted(case_key("import.positional_csv", p)):
+                lines = positional_csv(fmt, main, bonus)
+                yield Case(
+                    "import.positional_csv", p, lambda: _drain(loop, draw_import.positional_csv_records(_aiter(lines)))
+                )
+            if wanted(case_key("import.column_csv", p)):
+                lines = column_csv(fmt, main, bonus)
+                yield Case("import.column_csv", p, lambda: _drain(loop, draw_import.column_csv_records(_aiter(lines))))
+            if wanted(case_key("import.json", p)):
+                chunks = _json_chunks(json_document(fmt, main, bonus))
+                yield Case("import.json", p, lambda: _drain(loop, draw_import.json_records(_aiter(chunks))))
+            lines = chunks = None
+
+        # Weighting and sampling only see the stats window, never the whole history.
+        window = history(fmt, HISTORY_LIMIT, seed=1)
+        stats = scoring.compute_number_stats(window["main"].tolist(), lo, hi)
+        stats_bonus = None
+        if fmt.bonus_count:
+            stats_bonus = scoring.compute_number_stats(window["bonus"].tolist(), fmt.bonus_min, fmt.bonus_max)
+
+        for strategy in STRATEGIES:
+            p = {"format": fmt_name, "strategy": strategy}
+            yield Case("scoring.make_weights", p, lambda s=strategy: scoring.make_weights(stats, s))
+            yield Case("picker._build_weights", p, lambda s=strategy: picker._build_weights(stats, lo, hi, s))
+
+            for preset, raw in constraint_presets(fmt).items():
+                kwargs = dict(
+                    stats_main=stats,
+                    main_count=fmt.main_count,
+                    main_min=lo,
+                    main_max=hi,
+                    strategy=strategy,
+                    n_lines=n_lines,
+                    constraints=Constraints.from_dict(raw),
+                    bonus_count=fmt.bonus_count,
+                    bonus_min=fmt.bonus_min,
+                    bonus_max=fmt.bonus_max,
+                    stats_bonus=stats_bonus,
+                    rng_seed=1234,
+                )
+                yield Case(
+                    "picker.generate_lines",
+                    {**p, "constraints": preset, "lines": n_lines},
+                    lambda kw=kwargs: picker.generate_lines(**kw),
+                )
+
+        # 200 replayed draws x n_lines lines, all strategies (see /v1/analytics/backtest).
+        size = hi - lo + 1
+        weights, targets = backtest.prepare(window["main"] - lo, size, 150, 200, STRATEGIES)
+        yield Case(
+            "backtest.backtest_blocks",
+            {"format": fmt_name, "draws": 200, "lines": n_lines},
+            lambda: backtest.backtest_blocks(1, 0, 0, weights, targets, n_lines, fmt.main_count, size),
+        )
+
+
+def load_baseline(path: str) -> Dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        data = json.load(f)
+    return {r["key"]: r["median_s"] for r in data.get("results", [])}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--formats", default=",".join(FORMATS), help="comma separated, from: " + ", ".join(FORMATS))
+    ap.add_argument("--sizes", default="1000,10000,100000", help="history sizes in draws (up to 1000000)")
+    ap.add_argument("--lines", type=int, default=1000, help="n_lines per generate_lines call")
+    ap.add_argument("--filter", default="", help="only run cases whose key contains this text")
+    ap.add_argument("--min-time", type=float, default=0.3, help="seconds of repeats per case")
+    ap.add_argument("--max-repeats", type=int, default=50)
+    ap.add_argument("--out", default=DEFAULT_OUT)
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline")
+    ap.add_argument("--threshold", type=float, default=0.25, help="relative slowdown that counts as a regression")
+    ap.add_argument("--min-delta", type=float, default=0.0005, help="ignore slowdowns smaller than this (seconds)")
+    ap.add_argument("--fail-on-regression", action="store_true", help="exit 1 if any case regressed")
+    args = ap.parse_args(argv)
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown:
+        ap.error(f"unknown formats: {', '.join(unknown)}")
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    baseline = load_baseline(args.baseline)
+    loop = asyncio.new_event_loop()
+    results: List[Timing] = []
+    print(f"{'case':<96} {'median':>10} {'baseline':>10}")
+    for case in cases(formats, sizes, args.lines, loop, lambda key: args.filter in key):
+        if args.filter not in case.key:
+            continue
+        times = measure(case.fn, args.min_time, args.max_repeats)
+        t = Timing(
+            key=case.key,
+            name=case.name,
+            params=case.params,
+            median_s=statistics.median(times),
+            min_s=min(times),
+            repeats=len(times),
+            baseline_s=baseline.get(case.key),
+        )
+        if t.baseline_s is not None:
+            t.regressed = (
+                t.median_s > t.baseline_s * (1 + args.threshold) and t.median_s - t.baseline_s > args.min_delta
+            )
+        results.append(t)
+        base = f"{t.median_s / t.baseline_s:>9.2f}x" if t.baseline_s else f"{'-':>10}"
+        flag = "  REGRESSION" if t.regressed else ""
+        print(f"{t.key:<96} {t.median_s * 1000:>8.2f}ms {base}{flag}", flush=True)
+    loop.close()
+
+    payload = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": [t.__dict__ for t in results],
+    }
+    targets = [args.out] + ([args.baseline] if args.save_baseline else [])
+    for path in targets:
+        with open(path, "w") as f:
+            json.dump(payload, f, indent=2)
+        print(f"wrote {path}")
+
+    regressed = [t for t in results if t.regressed]
+    if regressed:
+        print(f"{len(regressed)} regression(s) vs {args.baseline}:")
+        for t in regressed:
+            print(f"  {t.key}: {t.baseline_s * 1000:.2f}ms -> {t.median_s * 1000:.2f}ms")
+    return 1 if regressed and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Synthetic draw histories for benchmarks (no database needed)."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class GameFormat:
+    name: str
+    main_count: int
+    main_min: int
+    main_max: int
+    bonus_count: int = 0
+    bonus_min: int = 0
+    bonus_max: int = 0
+
+    @property
+    def rules(self) -> dict:
+        rules = {"main_count": self.main_count, "main_min": self.main_min, "main_max": self.main_max}
+        if self.bonus_count:
+            rules.update(bonus_count=self.bonus_count, bonus_min=self.bonus_min, bonus_max=self.bonus_max)
+        return rules
+
+
+FORMATS = {
+    "5/69": GameFormat("5/69", 5, 1, 69, 1, 1, 26),  # Powerball-like
+    "6/49": GameFormat("6/49", 6, 1, 49),
+    "20/80": GameFormat("20/80", 20, 1, 80),  # Keno-like
+}
+
+# Rows generated per numpy call; bounds the (rows x range) random matrix.
+_CHUNK = 50_000
+
+
+def draw_matrix(n_draws: int, k: int, lo: int, hi: int, seed: int = 0, skew: float = 0.0) -> np.ndarray:
+    """(n_draws, k) sorted draws of k distinct numbers from lo..hi.
+
+    skew > 0 makes low numbers more likely, so hot/cold strategies see real
+    differences between numbers instead of uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    size = hi - lo + 1
+    logw = -skew * np.linspace(0.0, 1.0, size)
+    out = np.empty((n_draws, k), dtype=np.int64)
+    for start in range(0, n_draws, _CHUNK):
+        rows = min(_CHUNK, n_draws - start)
+        keys = logw + rng.gumbel(size=(rows, size))
+        idx = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+        idx.sort(axis=1)
+        out[start : start + rows] = idx + lo
+    return out
+
+
+def history(fmt: GameFormat, n_draws: int, seed: int = 0, skew: float = 0.5) -> dict:
+    """Main (and bonus) draws most-recent-first, as the stats code expects."""
+    main = draw_matrix(n_draws, fmt.main_count, fmt.main_min, fmt.main_max, seed, skew)
+    bonus: Optional[np.ndarray] = None
+    if fmt.bonus_count:
+        bonus = draw_matrix(n_draws, fmt.bonus_count, fmt.bonus_min, fmt.bonus_max, seed + 1, skew)
+    return {"main": main, "bonus": bonus}
+
+
+def draw_dates(n_draws: int, start: date = date(1990, 1, 1)) -> Iterator[date]:
+    for i in range(n_draws):
+        yield start + timedelta(days=i)
+
+
+def positional_csv(fmt: GameFormat, main: np.ndarray, bonus: Optional[np.ndarray]) -> List[str]:
+    """Lines for the csv_url importer: draw_date, main_1..main_5[, bonus_1]."""
+    lines = ["draw_date,n1,n2,n3,n4,n5,bonus"]
+    bonus_col = bonus[:, 0].tolist() if bonus is not None else None
+    for i, (d, row) in enumerate(zip(draw_dates(len(main)), main[:, :5].tolist())):
+        tail = f",{bonus_col[i]}" if bonus_col is not None else ""
+        lines.append(f"{d.isoformat()},{','.join(map(str, row))}{tail}")
+    return lines
+
+
+def column_csv(fmt: GameFormat, main: np.ndarray, bonus: Optional[np.ndarray]) -> List[str]:
+    """Lines for /v1/import mode=csv: draw_date, main_numbers, bonus_numbers."""
+    lines = ["draw_date,main_numbers,bonus_numbers"]
+    bonus_rows = bonus.tolist() if bonus is not None else None
+    for i, (d, row) in enumerate(zip(draw_dates(len(main)), main.tolist())):
+        b = " ".join(map(str, bonus_rows[i])) if bonus_rows is not None else ""
+        lines.append(f"{d.isoformat()},{' '.join(map(str, row))},{b}")
+    return lines
+
+
+def json_document(fmt: GameFormat, main: np.ndarray, bonus: Optional[np.ndarray]) -> str:
+    """A top-level JSON array for /v1/import mode=json."""
+    bonus_rows = bonus.tolist() if bonus is not None else None
+    parts = []
+    for i, (d, row) in enumerate(zip(draw_dates(len(main)), main.tolist())):
+        b = f',"bonus":{bonus_rows[i]}' if bonus_rows is not None else ""
+        parts.append(f'{{"draw_date":"{d.isoformat()}","main":{row}{b}}}')
+    return "[" + ",".join(parts) + "]"
@@ -0,0 +1,366 @@
+"""In-memory stand-ins for asyncpg.Pool / asyncpg.Connection, for load tests.
+
+FakePool serves games and draws from a FakeStore through the same calls the
+routers and services make (fetch, fetchrow, fetchval, execute, transaction,
+copy_records_to_table). Statements are recognised by fragments of the app's
+own SQL; anything else raises NotImplementedError, so a new query shows up as
+a load-test failure rather than a silently wrong answer. Writes are applied
+immediately (transactions do not roll back), and the derived tables the
+migrations keep up to date with triggers (game_data_versions,
+draw_number_stats, draw_pool_stats) are recomputed per write.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import json
+import re
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Windows with a count_<w> column in draw_number_stats (see 003_draw_number_stats.sql).
+_SUMMARY_WINDOWS = (50, 100, 150, 300)
+# draw_pool_stats.trend_half_life_draws default (see 005_draw_trend_stats.sql).
+_TREND_HALF_LIFE = 50.0
+
+
+class FakeRecord:
+    """Enough of asyncpg.Record: access by name or position, iteration over values, dict()."""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: Dict[str, Any]):
+        self._data = data
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self._data.values())[key]
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data.values())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
+
+    def items(self):
+        return self._data.items()
+
+    def __repr__(self) -> str:
+        return f"<FakeRecord {self._data!r}>"
+
+
+def _pool_numbers(numbers: dict, pool: str) -> Optional[List[int]]:
+    # Same rule as public.draw_pool_numbers: a non-empty array of integers of at most 9 digits.
+    value = numbers.get(pool) if isinstance(numbers, dict) else None
+    if isinstance(value, list) and value and all(
+        isinstance(x, int) and not isinstance(x, bool) and abs(x) <= 999_999_999 for x in value
+    ):
+        return value
+    return None
+
+
+@dataclass
+class _GameDraws:
+    dates: List[date] = field(default_factory=list)  # ascending
+    rows: Dict[date, Tuple[dict, Optional[str]]] = field(default_factory=dict)
+
+
+class FakeStore:
+    """Games, draws and the trigger-maintained summaries, for one fake database."""
+
+    def __init__(self) -> None:
+        self.games: Dict[str, dict] = {}
+        self.draws: Dict[str, _GameDraws] = {}
+        self.versions: Dict[str, dict] = {}
+        self.summary: Dict[Tuple[str, str], Tuple[int, Dict[int, dict]]] = {}
+        self.trend: Dict[Tuple[str, str], Tuple[float, date, Dict[int, float]]] = {}
+        self.sources: Dict[Tuple[str, str], dict] = {}
+
+    def add_game(self, key: str, name: str, rules: dict, game_type: str = "synthetic") -> str:
+        game_id = str(uuid.uuid4())
+        self.games[game_id] = {
+            "id": uuid.UUID(game_id),
+            "key": key,
+            "name": name,
+            "region": "synthetic",
+            "game_type": game_type,
+            "rules": rules,
+            "is_active": True,
+            "updated_at": datetime.now(timezone.utc),
+        }
+        self.draws[game_id] = _GameDraws()
+        return game_id
+
+    def upsert_draws(self, game_id: str, rows: Sequence[Tuple[date, dict, Optional[str]]]) -> Tuple[int, int]:
+        """Insert or update draws (last row wins per date); returns (inserted, updated)."""
+        g = self.draws[game_id]
+        inserted = updated = 0
+        for d, numbers, source in rows:
+            old = g.rows.get(d)
+            if old is None:
+                bisect.insort(g.dates, d)
+                g.rows[d] = (numbers, source)
+                inserted += 1
+            else:
+                new_source = source if source is not None else old[1]
+                if old != (numbers, new_source):
+                    g.rows[d] = (numbers, new_source)
+                    updated += 1
+        if inserted or updated:
+            self._touch(game_id)
+        return inserted, updated
+
+    def latest(self, game_id: str, limit: Optional[int] = None) -> List[Tuple[date, dict, Optional[str]]]:
+        g = self.draws.get(game_id)
+        if g is None:
+            return []
+        dates = g.dates[::-1] if limit is None else g.dates[: -limit - 1 : -1]
+        return [(d, *g.rows[d]) for d in dates]
+
+    def _touch(self, game_id: str) -> None:
+        # What bump_game_data_versions, apply_draw_number_stats and apply_draw_trend do per statement.
+        g = self.draws[game_id]
+        v = self.versions.setdefault(game_id, {"version": 0})
+        v.update(
+            version=v["version"] + 1,
+            latest_draw_date=g.dates[-1] if g.dates else None,
+            updated_at=datetime.now(timezone.utc),
+        )
+        for pool in ("main", "bonus"):
+            recent: List[List[int]] = []
+            trend: Dict[int, float] = {}
+            mass, latest = 0.0, None
+            decay = 0.5 ** (1.0 / _TREND_HALF_LIFE)
+            # The migration folds appended draws in place; recomputing gives the same values.
+            valid = ((d, _pool_numbers(g.rows[d][0], pool)) for d in reversed(g.dates))
+            for ago, (d, nums) in enumerate((d, nums) for d, nums in valid if nums):
+                if ago >= 40 * _TREND_HALF_LIFE:
+                    break
+                latest = latest or d
+                if ago < max(_SUMMARY_WINDOWS):
+                    recent.append(nums)
+                mass += decay**ago
+                for n in nums:
+                    trend[n] = trend.get(n, 0.0) + decay**ago
+            self.trend[(game_id, pool)] = (mass, latest, trend)
+            stats: Dict[int, dict] = {}
+            for ago, nums in enumerate(recent):
+                for n in nums:
+                    s = stats.setdefault(n, {"last_seen_draws_ago": ago, **{f"count_{w}": 0 for w in _SUMMARY_WINDOWS}})
+                    for w in _SUMMARY_WINDOWS:
+                        if ago < w:
+                            s[f"count_{w}"] += 1
+            self.summary[(game_id, pool)] = (len(recent), stats)
+
+
+def _norm(sql: str) -> str:
+    return " ".join(sql.split()).lower()
+
+
+class FakeConnection:
+    def __init__(self, store: FakeStore, latency: float = 0.0):
+        self.store = store
+        self.latency = latency
+        self._stage: List[tuple] = []
+
+    async def _roundtrip(self) -> None:
+        # Always yield, like a real network round trip would.
+        await asyncio.sleep(self.latency)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        yield
+
+    async def copy_records_to_table(self, table: str, *, records, columns: Sequence[str]) -> str:
+        await self._roundtrip()
+        if table != "draws_stage":
+            raise NotImplementedError(f"fake db: COPY into {table}")
+        if hasattr(records, "__aiter__"):
+            async for r in records:
+                self._stage.append(tuple(r))
+        else:
+            self._stage.extend(tuple(r) for r in records)
+        return f"COPY {len(self._stage)}"
+
+    async def fetch(self, sql: str, *args) -> List[FakeRecord]:
+        await self._roundtrip()
+        return self._run(sql, args)
+
+    async def fetchrow(self, sql: str, *args) -> Optional[FakeRecord]:
+        rows = await self.fetch(sql, *args)
+        return rows[0] if rows else None
+
+    async def fetchval(self, sql: str, *args):
+        row = await self.fetchrow(sql, *args)
+        return row[0] if row is not None else None
+
+    async def execute(self, sql: str, *args) -> str:
+        await self._roundtrip()
+        self._run(sql, args)
+        return "OK"
+
+    def _run(self, sql: str, args: tuple) -> List[FakeRecord]:
+        q = _norm(sql)
+        args = tuple(str(a) if isinstance(a, uuid.UUID) else a for a in args)
+        for fragments, handler in _HANDLERS:
+            if all(f in q for f in fragments):
+                return handler(self, q, args)
+        raise NotImplementedError(f"fake db: unsupported statement: {q[:200]}")
+
+    # Handlers: (connection, normalised sql, args) -> rows
+
+    def _data_version(self, q: str, args: tuple) -> List[FakeRecord]:
+        games = self.store.games
+        ids = args[0] or []
+        scoped = [games[g] for g in ids if g in games] if args[0] is not None else list(games.values())
+        versions = [self.store.versions[g] for g in ids if g in self.store.versions]
+        return [
+            FakeRecord(
+                {
+                    "games_count": len(games),
+                    "games_updated_at": max((g["updated_at"] for g in scoped), default=None),
+                    "version": sum(v["version"] for v in versions) if versions else None,
+                    "latest_draw_date": max((v["latest_draw_date"] for v in versions if v["latest_draw_date"]),
+                                            default=None),
+                    "updated_at": max((v["updated_at"] for v in versions), default=None),
+                }
+            )
+        ]
+
+    def _latest_draw_date(self, q: str, args: tuple) -> List[FakeRecord]:
+        rows = self.store.latest(args[0], 1)
+        return [FakeRecord({"max": rows[0][0] if rows else None})]
+
+    def _game_by_id(self, q: str, args: tuple) -> List[FakeRecord]:
+        game = self.store.games.get(args[0])
+        if game is None:
+            return []
+        if q.startswith("select rules"):
+            return [FakeRecord({"rules": game["rules"]})]
+        return [FakeRecord({"id": game["id"], "rules": game["rules"]})]
+
+    def _game_version(self, q: str, args: tuple) -> List[FakeRecord]:
+        game = self.store.games.get(args[0])
+        if game is None:
+            return []
+        version = self.store.versions.get(args[0])
+        row = {"version": version["version"] if version else None, "updated_at": game["updated_at"]}
+        if q.startswith("select g.id, g.rules"):
+            row = {"id": game["id"], "rules": game["rules"], **row}
+        return [FakeRecord(row)]
+
+    def _game_by_key(self, q: str, args: tuple) -> List[FakeRecord]:
+        return [FakeRecord({"id": g["id"]}) for g in self.store.games.values() if g["key"] == args[0]][:1]
+
+    def _latest_draws(self, q: str, args: tuple) -> List[FakeRecord]:
+        return [FakeRecord({"draw_date": d, "numbers": numbers}) for d, numbers, _ in self.store.latest(*args)]
+
+    def _history(self, q: str, args: tuple) -> List[FakeRecord]:
+        rows = self.store.latest(args[0])[::-1]
+        return [FakeRecord({"draw_date": d, "numbers": numbers}) for d, numbers, _ in rows]
+
+    def _pool_recent(self, q: str, args: tuple) -> List[FakeRecord]:
+        recent, _ = self.store.summary.get((args[0], args[1]), (0, {}))
+        return [FakeRecord({"recent_draws": recent})]
+
+    def _trend(self, q: str, args: tuple) -> List[FakeRecord]:
+        game_id, pool, lo, hi = args
+        if game_id not in self.store.games:
+            return []
+        mass, latest, trend = self.store.trend.get((game_id, pool), (0.0, None, {}))
+        pool_row = {"trend_half_life_draws": _TREND_HALF_LIFE, "trend_mass": mass, "trend_latest_draw_date": latest}
+        rows = [FakeRecord({**pool_row, "n": n, "trend": w}) for n, w in sorted(trend.items()) if lo <= n <= hi]
+        return rows or [FakeRecord({**pool_row, "n": None, "trend": None})]
+
+    def _number_stats(self, q: str, args: tuple) -> List[FakeRecord]:
+        window = int(re.search(r"count_(\d+) as count", q).group(1))
+        game_id, pool, lo, hi = args
+        _, stats = self.store.summary.get((game_id, pool), (0, {}))
+        return [
+            FakeRecord({"n": n, "count": s[f"count_{window}"], "last_seen_draws_ago": s["last_seen_draws_ago"]})
+            for n, s in sorted(stats.items())
+            if lo <= n <= hi
+        ]
+
+    def _noop(self, q: str, args: tuple) -> List[FakeRecord]:
+        if "create temp table draws_stage" in q:
+            self._stage = []
+        return []
+
+    def _merge_stage(self, q: str, args: tuple) -> List[FakeRecord]:
+        latest: Dict[date, Tuple[dict, Optional[str]]] = {}
+        for draw_date, numbers, source in self._stage:
+            latest[date.fromisoformat(draw_date)] = (json.loads(numbers), source)
+        self._stage = []
+        rows = [(d, numbers, source) for d, (numbers, source) in sorted(latest.items())]
+        inserted, updated = self.store.upsert_draws(args[0], rows)
+        return [FakeRecord({"unique_dates": len(rows), "inserted": inserted, "updated": updated})]
+
+    def _source_upsert(self, q: str, args: tuple) -> List[FakeRecord]:
+        game_id, url = str(args[0]), args[1]
+        self.store.sources[(game_id, url)] = {"notes": args[2], "last_import_at": args[3]}
+        return []
+
+
+_HANDLERS: List[Tuple[Tuple[str, ...], Callable[[FakeConnection, str, tuple], List[FakeRecord]]]] = [
+    (("from public.game_data_versions",), FakeConnection._data_version),
+    (("select max(draw_date) from public.draws",), FakeConnection._latest_draw_date),
+    (("left join public.game_data_versions",), FakeConnection._game_version),
+    (("from public.games where id::text = $1",), FakeConnection._game_by_id),
+    (("select id from public.games where key=$1",), FakeConnection._game_by_key),
+    (("from public.draws", "order by draw_date desc", "limit $2"), FakeConnection._latest_draws),
+    (("from public.draws", "order by draw_date asc"), FakeConnection._history),
+    (("left join public.draw_number_stats",), FakeConnection._trend),
+    (("from public.draw_pool_stats",), FakeConnection._pool_recent),
+    (("from public.draw_number_stats",), FakeConnection._number_stats),
+    (("pg_temp.draws_stage",), FakeConnection._noop),
+    (("create temp table draws_stage",), FakeConnection._noop),
+    (("from draws_stage",), FakeConnection._merge_stage),
+    (("insert into public.game_sources",), FakeConnection._source_upsert),
+]
+
+
+class FakePool:
+    """max_size connections; acquire() waits for a free one and times out like asyncpg."""
+
+    def __init__(self, store: FakeStore, max_size: int = 10, latency: float = 0.0):
+        self.store = store
+        self.latency = latency
+        self._max_size = max_size
+        self._free = asyncio.Semaphore(max_size)
+        self._in_use = 0
+
+    async def acquire(self, *, timeout: Optional[float] = None) -> FakeConnection:
+        await asyncio.wait_for(self._free.acquire(), timeout)
+        self._in_use += 1
+        return FakeConnection(self.store, self.latency)
+
+    async def release(self, conn: FakeConnection) -> None:
+        self._in_use -= 1
+        self._free.release()
+
+    async def close(self) -> None:
+        pass
+
+    def get_size(self) -> int:
+        return self._max_size
+
+    def get_idle_size(self) -> int:
+        return self._max_size - self._in_use
+
+    def get_max_size(self) -> int:
+        return self._max_size
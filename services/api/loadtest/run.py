@@ -0,0 +1,340 @@
+"""Load-test the API in process against an in-memory database (see loadtest.fakedb).
+
+No Postgres and no network: requests go through httpx's ASGI transport, the
+pool dependencies are overridden with FakePool, and /v1/import downloads its
+CSV from a loopback feed that publishes one new draw per request.
+
+    cd services/api
+    python -m loadtest.run                                   # 20s, 32 clients, default mix
+    python -m loadtest.run --duration 60 --concurrency 128
+    python -m loadtest.run --mix generate=1 --db-latency-ms 2 --pool-size 5
+    python -m loadtest.run --history 100000 --out loadtest/results.json
+
+--mix weights the routes each client picks from (generate, analytics, draws,
+import). --db-latency-ms adds a sleep to every fake query, to stand in for
+the round trip to a real database. The report gives throughput, error counts
+by status and p50/p95/p99 latency per route. Admission control stays on, with
+each client as its own address, so its 429/503 refusals show up as errors
+(tune it with the ADMISSION_* environment variables).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+# app.core.config requires a DSN at import time; the fake pool never connects.
+os.environ.setdefault("DATABASE_URL", "postgresql://loadtest@localhost/unused")
+os.environ.setdefault("ADMIN_IMPORT_KEY", "loadtest")
+# Each simulated client sends its own address, so admission control sees separate clients.
+os.environ.setdefault("ADMISSION_CLIENT_HEADER", "x-forwarded-for")
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.executor import executor, loop_lag  # noqa: E402
+from app.core.metrics import runtime  # noqa: E402
+from app.db.deps import get_read_pool, get_write_pool  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.stats_cache import stats_cache  # noqa: E402
+from benchmarks.synthetic import FORMATS, GameFormat, draw_dates, history  # noqa: E402
+from loadtest.fakedb import FakePool, FakeStore  # noqa: E402
+
+ROUTES = ("generate", "analytics", "draws", "import")
+DEFAULT_MIX = "generate=6,analytics=3,draws=2,import=1"
+STRATEGIES = ("balanced", "hot", "cold", "random", "trend")
+# Summary-table windows and stats-cache windows (see routers/analytics.py).
+ANALYTICS_WINDOWS = (150, 300, 200, 500)
+# Rows the import feed serves per request; older ones fall out of the document.
+FEED_ROWS = 20
+
+
+@dataclass
+class Game:
+    id: str
+    key: str
+    fmt: GameFormat
+
+
+@dataclass
+class RouteStats:
+    latencies: List[float] = field(default_factory=list)
+    statuses: Dict[int, int] = field(default_factory=dict)
+    failures: Dict[str, int] = field(default_factory=dict)  # exceptions, by type
+
+    def record(self, seconds: float, status: Optional[int], error: Optional[str] = None) -> None:
+        self.latencies.append(seconds)
+        if status is not None:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+        else:
+            self.failures[error] = self.failures.get(error, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        ms = np.asarray(self.latencies) * 1000.0
+        ok = sum(n for s, n in self.statuses.items() if s < 400)
+        p50, p95, p99 = np.percentile(ms, (50, 95, 99)) if ms.size else (float("nan"),) * 3
+        return {
+            "requests": int(ms.size),
+            "ok": ok,
+            "errors": {**{str(s): n for s, n in sorted(self.statuses.items()) if s >= 400}, **self.failures},
+            "rps": round(ms.size / elapsed, 1),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+        }
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"unknown route {name!r} in --mix (choose from {', '.join(ROUTES)})")
+        mix[name] = float(weight or 1)
+    if not any(w > 0 for w in mix.values()):
+        raise SystemExit("--mix needs at least one positive weight")
+    return mix
+
+
+def build_store(n_draws: int, seed: int) -> Tuple[FakeStore, List[Game]]:
+    """One synthetic game per benchmarks.synthetic format, each with n_draws draws."""
+    store = FakeStore()
+    games = []
+    for i, fmt in enumerate(FORMATS.values()):
+        key = "synthetic_" + fmt.name.replace("/", "_")
+        game_id = store.add_game(key, f"Synthetic {fmt.name}", fmt.rules)
+        draws = history(fmt, n_draws, seed=seed + 10 * i)
+        main, bonus = draws["main"][::-1].tolist(), draws["bonus"]
+        bonus = bonus[::-1].tolist() if bonus is not None else None
+        rows = []
+        for t, d in enumerate(draw_dates(n_draws)):
+            numbers = {"main": main[t]}
+            if bonus is not None:
+                numbers["bonus"] = bonus[t]
+            rows.append((d, numbers, "synthetic"))
+        store.upsert_draws(game_id, rows)
+        games.append(Game(game_id, key, fmt))
+    return store, games
+
+
+class Feed:
+    """Positional CSV documents that gain one draw per download, like a results page between polls."""
+
+    def __init__(self, games: List[Game], store: FakeStore, seed: int):
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._rows: Dict[str, List[str]] = {}
+        self._next: Dict[str, date] = {}
+        self.games = {g.key: g for g in games}
+        for g in games:
+            latest = store.latest(g.id, 1)
+            self._next[g.key] = (latest[0][0] if latest else date(2000, 1, 1)) + timedelta(days=1)
+            self._rows[g.key] = []
+
+    def document(self, key: str) -> Optional[str]:
+        game = self.games.get(key)
+        if game is None:
+            return None
+        fmt = game.fmt
+        with self._lock:
+            main = sorted(self._rng.sample(range(fmt.main_min, fmt.main_max + 1), fmt.main_count))
+            cols = [self._next[key].isoformat(), *map(str, main[:5])]
+            if fmt.bonus_count:
+                cols.append(str(self._rng.randint(fmt.bonus_min, fmt.bonus_max)))
+            self._next[key] += timedelta(days=1)
+            rows = self._rows[key]
+            rows.append(",".join(cols))
+            del rows[:-FEED_ROWS]
+            return "\n".join(["draw_date,n1,n2,n3,n4,n5,bonus", *rows]) + "\n"
+
+    def serve(self) -> ThreadingHTTPServer:
+        feed = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = feed.document(self.path.strip("/").removesuffix(".csv"))
+                if body is None:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def request_factory(games: List[Game], feed_url: str, rng: random.Random) -> Dict[str, Callable[[], tuple]]:
+    """route -> () -> (method, url, kwargs) for one randomly parameterised request."""
+    # The positional importer reads five main numbers and one bonus.
+    importable = [g for g in games if g.fmt.main_count == 5]
+
+    def generate():
+        body = {
+            "game_id": rng.choice(games).id,
+            "n_lines": rng.choice((1, 5, 10, 50)),
+            "strategy": rng.choice(STRATEGIES),
+        }
+        return "POST", "/v1/generate", {"json": body}
+
+    def analytics():
+        params = {"game_id": rng.choice(games).id, "window": rng.choice(ANALYTICS_WINDOWS)}
+        return "GET", "/v1/analytics", {"params": params}
+
+    def draws():
+        params = {"game_id": rng.choice(games).id, "limit": rng.choice((10, 50, 200))}
+        return "GET", "/v1/draws", {"params": params}
+
+    def import_():
+        game = rng.choice(importable)
+        body = {"mode": "csv_url", "game_key": game.key, "csv_url": f"{feed_url}/{game.key}.csv", "delta": True}
+        return "POST", "/v1/import", {"json": body, "headers": {"x_admin_key": settings.admin_import_key}}
+
+    return {"generate": generate, "analytics": analytics, "draws": draws, "import": import_}
+
+
+async def client(
+    http: httpx.AsyncClient,
+    factories: Dict[str, Callable[[], tuple]],
+    mix: Dict[str, float],
+    rng: random.Random,
+    address: str,
+    deadline: float,
+    results: Dict[str, RouteStats],
+) -> None:
+    routes, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        route = rng.choices(routes, weights)[0]
+        method, url, kwargs = factories[route]()
+        kwargs.setdefault("headers", {})["x-forwarded-for"] = address
+        start = time.perf_counter()
+        try:
+            resp = await http.request(method, url, **kwargs)
+            results[route].record(time.perf_counter() - start, resp.status_code)
+        except Exception as exc:
+            results[route].record(time.perf_counter() - start, None, type(exc).__name__)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    mix = parse_mix(args.mix)
+    started = time.perf_counter()
+    store, games = build_store(args.history, args.seed)
+    print(f"built {len(games)} games x {args.history} draws in {time.perf_counter() - started:.1f}s", flush=True)
+
+    latency = args.db_latency_ms / 1000.0
+    read_pool = FakePool(store, args.pool_size, latency)
+    write_pool = FakePool(store, max(1, args.pool_size // 2), latency)
+    app.dependency_overrides[get_read_pool] = lambda: read_pool
+    app.dependency_overrides[get_write_pool] = lambda: write_pool
+    # What _startup does, minus init_db and the import scheduler.
+    stats_cache.pool = read_pool
+    runtime.pools = {"read": read_pool, "write": write_pool}
+    executor.start()
+    loop_lag.start()
+
+    server = Feed(games, store, args.seed).serve()
+    feed_url = f"http://127.0.0.1:{server.server_address[1]}"
+    results = {route: RouteStats() for route in mix}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as http:
+            for game in games:
+                # Warm the stats cache so the first seconds do not measure cold loads only.
+                await http.post("/v1/generate", json={"game_id": game.id, "n_lines": 1})
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(
+                *(
+                    client(http, request_factory(games, feed_url, random.Random(args.seed + i)), mix,
+                           random.Random(args.seed - i), f"10.0.{i // 250}.{i % 250 + 1}", deadline, results)
+                    for i in range(args.concurrency)
+                )
+            )
+            elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        await loop_lag.stop()
+        await stats_cache.stop()
+        executor.shutdown()
+        app.dependency_overrides.clear()
+
+    routes = {route: stats.summary(elapsed) for route, stats in results.items()}
+    total = sum(r["requests"] for r in routes.values())
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "mix": mix,
+            "history": args.history,
+            "db_latency_ms": args.db_latency_ms,
+            "pool_size": args.pool_size,
+            "seed": args.seed,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "total_rps": round(total / elapsed, 1),
+        "stats_cache": {
+            "hits": stats_cache.hits,
+            "misses": stats_cache.misses,
+            "coalesced": stats_cache.coalesced,
+            "stale_served": stats_cache.stale_served,
+        },
+        "routes": routes,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds of load after warm-up")
+    ap.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="route weights, from: " + ", ".join(ROUTES))
+    ap.add_argument("--history", type=int, default=2000, help="draws per synthetic game")
+    ap.add_argument("--db-latency-ms", type=float, default=0.0, help="added to every fake query")
+    ap.add_argument("--pool-size", type=int, default=10, help="read pool size (the write pool gets half)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="", help="also write the report as JSON here")
+    args = ap.parse_args(argv)
+
+    report = asyncio.run(run(args))
+
+    print(f"{'route':<10} {'requests':>9} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}  errors")
+    for route, r in report["routes"].items():
+        errors = ", ".join(f"{k}: {v}" for k, v in r["errors"].items()) or "-"
+        print(
+            f"{route:<10} {r['requests']:>9} {r['rps']:>8.1f} {r['p50_ms']:>7.2f}ms {r['p95_ms']:>7.2f}ms "
+            f"{r['p99_ms']:>7.2f}ms  {errors}"
+        )
+    print(f"total {report['total_rps']:.1f} req/s over {report['elapsed_s']:.1f}s, stats cache {report['stats_cache']}")
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"wrote {args.out}")
+    # A route that never succeeded means the harness (or the app) is broken, not slow.
+    return 1 if any(not r["ok"] for r in report["routes"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+-- Mooses Place - data versions for HTTP conditional caching (ETag / Last-Modified)
+
+-- Games: bumped on any edit (rules, is_active, ...)
+alter table public.games add column if not exists updated_at timestamptz not null default now();
+
+create or replace function public.touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.updated_at = now();
+  return new;
+end;
+$$;
+
+drop trigger if exists games_touch_updated_at on public.games;
+create trigger games_touch_updated_at
+  before update on public.games
+  for each row execute function public.touch_updated_at();
+
+-- Draws: one version row per game, bumped once per statement that touches its draws
+create table if not exists public.game_data_versions (
+  game_id uuid primary key references public.games(id) on delete cascade,
+  latest_draw_date date,
+  version bigint not null default 1,
+  updated_at timestamptz not null default now()
+);
+
+create or replace function public.bump_game_data_versions()
+returns trigger
+language plpgsql
+as $$
+declare
+  ids uuid[];
+begin
+  -- Transition tables only exist for the events the trigger was created for.
+  if tg_op = 'INSERT' then
+    select array_agg(distinct game_id) into ids from new_rows;
+  elsif tg_op = 'DELETE' then
+    select array_agg(distinct game_id) into ids from old_rows;
+  else
+    select array_agg(distinct game_id) into ids
+    from (select game_id from new_rows union select game_id from old_rows) s;
+  end if;
+
+  insert into public.game_data_versions as v (game_id, latest_draw_date)
+  select g.id, (select max(d.draw_date) from public.draws d where d.game_id = g.id)
+  from public.games g
+  where g.id = any(ids)  -- skips games removed by a cascading delete
+  on conflict (game_id) do update
+    set latest_draw_date = excluded.latest_draw_date,
+        version = v.version + 1,
+        updated_at = now();
+  return null;
+end;
+$$;
+
+drop trigger if exists draws_version_ins on public.draws;
+create trigger draws_version_ins
+  after insert on public.draws
+  referencing new table as new_rows
+  for each statement execute function public.bump_game_data_versions();
+
+drop trigger if exists draws_version_upd on public.draws;
+create trigger draws_version_upd
+  after update on public.draws
+  referencing old table as old_rows new table as new_rows
+  for each statement execute function public.bump_game_data_versions();
+
+drop trigger if exists draws_version_del on public.draws;
+create trigger draws_version_del
+  after delete on public.draws
+  referencing old table as old_rows
+  for each statement execute function public.bump_game_data_versions();
+
+-- Backfill for existing draws
+insert into public.game_data_versions (game_id, latest_draw_date)
+select game_id, max(draw_date) from public.draws group by game_id
+on conflict (game_id) do nothing;
+
+alter table public.game_data_versions enable row level security;
+create policy "public read game versions" on public.game_data_versions for select using (true);
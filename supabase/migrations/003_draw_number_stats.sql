@@ -0,0 +1,262 @@
+-- Mooses Place - per-number draw summary, kept current by triggers on public.draws
+--
+-- draw_number_stats: one row per (game, pool, number) that appears in the game's draws.
+--   count / last_seen_date        all-time, maintained from each statement's changed rows
+--   count_<w> / last_seen_draws_ago  over the latest 50/100/150/300 draws of that pool,
+--                                 recomputed from those 300 draws for the games a statement touched
+-- draw_pool_stats: how many draws those windows cover, per (game, pool).
+--
+-- A draw counts for a pool only when numbers->pool is a non-empty array of integers of at most
+-- 9 digits, the same rule as the API's scoring.pool_numbers. Rebuild with:
+--   select public.rebuild_draw_number_stats();
+
+create table if not exists public.draw_number_stats (
+  game_id uuid not null references public.games(id) on delete cascade,
+  pool text not null check (pool in ('main', 'bonus')),
+  n int not null,
+  count bigint not null default 0,
+  last_seen_date date,
+  last_seen_draws_ago int,  -- 0 = in the latest draw; null when not in the latest 300
+  count_50 int not null default 0,
+  count_100 int not null default 0,
+  count_150 int not null default 0,
+  count_300 int not null default 0,
+  updated_at timestamptz not null default now(),
+  primary key (game_id, pool, n)
+);
+
+create table if not exists public.draw_pool_stats (
+  game_id uuid not null references public.games(id) on delete cascade,
+  pool text not null check (pool in ('main', 'bonus')),
+  recent_draws int not null default 0,  -- draws in the 300 window (fewer for young games)
+  updated_at timestamptz not null default now(),
+  primary key (game_id, pool)
+);
+
+-- The pool's numbers, or null unless it is a non-empty array of (int-sized) integers.
+-- One regex over jsonb's canonical "[1, 2, 3]" text: much cheaper per row than walking the elements.
+create or replace function public.draw_pool_numbers(numbers jsonb, pool text)
+returns int[]
+language sql
+immutable
+as $$
+  select case when (numbers -> pool)::text ~ '^\[-?[0-9]{1,9}(, -?[0-9]{1,9})*\]$'
+    then string_to_array(btrim((numbers -> pool)::text, '[]'), ', ')::int[]
+  end
+$$;
+
+-- (pool, n) for every number of a draw, both pools.
+create or replace function public.draw_pool_entries(numbers jsonb)
+returns table (pool text, n int)
+language sql
+immutable
+as $$
+  select p.pool, x.n
+  from (values ('main'), ('bonus')) p(pool)
+  cross join lateral unnest(public.draw_pool_numbers(numbers, p.pool)) x(n)
+$$;
+
+-- Net change per (game, pool, number) of one statement.
+do $$
+begin
+  if to_regtype('public.draw_number_delta') is null then
+    create type public.draw_number_delta as (
+      game_id uuid,
+      pool text,
+      n int,
+      delta bigint,
+      added date,    -- latest draw_date the number was added at
+      removed date   -- latest draw_date it was removed from
+    );
+  end if;
+end;
+$$;
+
+-- Window columns and last_seen_draws_ago from the latest 300 draws of each pool.
+create or replace function public.refresh_draw_number_windows(game_ids uuid[])
+returns void
+language sql
+as $$
+  with targets as (
+    select g.id as game_id, p.pool
+    from public.games g
+    cross join (values ('main'), ('bonus')) p(pool)
+    where g.id = any(game_ids)
+  ),
+  recent as (
+    select t.game_id, t.pool, r.nums,
+      (row_number() over (partition by t.game_id, t.pool order by r.draw_date desc) - 1)::int as ago
+    from targets t
+    cross join lateral (
+      select d.draw_date, public.draw_pool_numbers(d.numbers, t.pool) as nums
+      from public.draws d
+      where d.game_id = t.game_id and public.draw_pool_numbers(d.numbers, t.pool) is not null
+      order by d.draw_date desc
+      limit 300
+    ) r
+  ),
+  pools as (
+    insert into public.draw_pool_stats as ps (game_id, pool, recent_draws)
+    select t.game_id, t.pool, (select count(*) from recent r where r.game_id = t.game_id and r.pool = t.pool)
+    from targets t
+    on conflict (game_id, pool) do update
+      set recent_draws = excluded.recent_draws, updated_at = now()
+  ),
+  hits as (
+    select r.game_id, r.pool, x.n,
+      min(r.ago) as ago,
+      count(*) filter (where r.ago < 50) as c50,
+      count(*) filter (where r.ago < 100) as c100,
+      count(*) filter (where r.ago < 150) as c150,
+      count(*) as c300
+    from recent r
+    cross join lateral unnest(r.nums) x(n)
+    group by 1, 2, 3
+  )
+  update public.draw_number_stats s
+  set last_seen_draws_ago = h.ago,
+      count_50 = coalesce(h.c50, 0),
+      count_100 = coalesce(h.c100, 0),
+      count_150 = coalesce(h.c150, 0),
+      count_300 = coalesce(h.c300, 0),
+      updated_at = now()
+  from public.draw_number_stats s2
+  left join hits h using (game_id, pool, n)
+  where s2.game_id = any(game_ids)
+    and (s.game_id, s.pool, s.n) = (s2.game_id, s2.pool, s2.n)
+$$;
+
+create or replace function public.apply_draw_number_stats()
+returns trigger
+language plpgsql
+as $$
+declare
+  deltas public.draw_number_delta[];
+  ids uuid[];
+begin
+  -- Transition tables only exist for the events the trigger was created for.
+  if tg_op = 'INSERT' then
+    select array_agg(row(game_id, pool, n, delta, added, null)::public.draw_number_delta) into deltas
+    from (
+      select r.game_id, x.pool, x.n, count(*) as delta, max(r.draw_date) as added
+      from new_rows r cross join lateral public.draw_pool_entries(r.numbers) x
+      group by 1, 2, 3
+    ) d;
+  elsif tg_op = 'DELETE' then
+    select array_agg(row(game_id, pool, n, delta, null, removed)::public.draw_number_delta) into deltas
+    from (
+      select r.game_id, x.pool, x.n, -count(*) as delta, max(r.draw_date) as removed
+      from old_rows r cross join lateral public.draw_pool_entries(r.numbers) x
+      group by 1, 2, 3
+    ) d;
+  else
+    -- Net out rows whose numbers did not change (e.g. an upsert that only touched source).
+    select array_agg(row(game_id, pool, n, delta, added, removed)::public.draw_number_delta) into deltas
+    from (
+      select game_id, pool, n, sum(net) as delta,
+        max(draw_date) filter (where net > 0) as added,
+        max(draw_date) filter (where net < 0) as removed
+      from (
+        select game_id, draw_date, pool, n, sum(sign) as net
+        from (
+          select r.game_id, r.draw_date, x.pool, x.n, 1 as sign
+          from new_rows r cross join lateral public.draw_pool_entries(r.numbers) x
+          union all
+          select r.game_id, r.draw_date, x.pool, x.n, -1
+          from old_rows r cross join lateral public.draw_pool_entries(r.numbers) x
+        ) c
+        group by 1, 2, 3, 4
+        having sum(sign) <> 0
+      ) e
+      group by 1, 2, 3
+    ) d;
+  end if;
+
+  if deltas is null then
+    return null;
+  end if;
+
+  insert into public.draw_number_stats as s (game_id, pool, n, count, last_seen_date)
+  select d.game_id, d.pool, d.n, d.delta, d.added
+  from unnest(deltas) d
+  where exists (select 1 from public.games g where g.id = d.game_id)  -- skips cascading game deletes
+  on conflict (game_id, pool, n) do update
+    set count = s.count + excluded.count,
+        last_seen_date = greatest(s.last_seen_date, excluded.last_seen_date),
+        updated_at = now();
+
+  -- The latest occurrence of a number went away: look up the one before it.
+  update public.draw_number_stats s
+  set last_seen_date = (
+    select max(dr.draw_date)
+    from public.draws dr
+    where dr.game_id = s.game_id and public.draw_pool_numbers(dr.numbers, s.pool) @> array[s.n]
+  )
+  from unnest(deltas) d
+  where d.removed is not null
+    and (s.game_id, s.pool, s.n) = (d.game_id, d.pool, d.n)
+    and s.last_seen_date = d.removed;
+
+  delete from public.draw_number_stats s
+  using unnest(deltas) d
+  where (s.game_id, s.pool, s.n) = (d.game_id, d.pool, d.n) and s.count <= 0;
+
+  select array_agg(distinct d.game_id) into ids from unnest(deltas) d;
+  perform public.refresh_draw_number_windows(ids);
+  return null;
+end;
+$$;
+
+drop trigger if exists draws_number_stats_ins on public.draws;
+create trigger draws_number_stats_ins
+  after insert on public.draws
+  referencing new table as new_rows
+  for each statement execute function public.apply_draw_number_stats();
+
+drop trigger if exists draws_number_stats_upd on public.draws;
+create trigger draws_number_stats_upd
+  after update on public.draws
+  referencing old table as old_rows new table as new_rows
+  for each statement execute function public.apply_draw_number_stats();
+
+drop trigger if exists draws_number_stats_del on public.draws;
+create trigger draws_number_stats_del
+  after delete on public.draws
+  referencing old table as old_rows
+  for each statement execute function public.apply_draw_number_stats();
+
+-- Recompute everything (one game, or all when null) from public.draws; for backfills and repairs.
+create or replace function public.rebuild_draw_number_stats(p_game_id uuid default null)
+returns int
+language plpgsql
+as $$
+declare
+  ids uuid[];
+  n_rows int;
+begin
+  select array_agg(id) into ids from public.games where p_game_id is null or id = p_game_id;
+  if ids is null then
+    return 0;
+  end if;
+
+  delete from public.draw_number_stats where game_id = any(ids);
+  insert into public.draw_number_stats (game_id, pool, n, count, last_seen_date)
+  select d.game_id, x.pool, x.n, count(*), max(d.draw_date)
+  from public.draws d
+  cross join lateral public.draw_pool_entries(d.numbers) x
+  where d.game_id = any(ids)
+  group by 1, 2, 3;
+  get diagnostics n_rows = row_count;
+
+  perform public.refresh_draw_number_windows(ids);
+  return n_rows;
+end;
+$$;
+
+-- Backfill for existing draws
+select public.rebuild_draw_number_stats();
+
+alter table public.draw_number_stats enable row level security;
+create policy "public read draw number stats" on public.draw_number_stats for select using (true);
+alter table public.draw_pool_stats enable row level security;
+create policy "public read draw pool stats" on public.draw_pool_stats for select using (true);
@@ -0,0 +1,28 @@
+-- Mooses Place - game_sources as scheduled import state (see services/api/app/services/import_scheduler.py)
+--
+-- One row per (game, url). Active rows are polled every poll_interval_seconds with a
+-- conditional GET (etag / last_modified are the validators of the last successful import);
+-- failures push next_poll_at out exponentially. Rows are inactive until enabled:
+--   update public.game_sources set is_active = true, poll_interval_seconds = 1800 where ...;
+
+alter table public.game_sources
+  add column if not exists is_active boolean not null default false,
+  add column if not exists import_format text not null default 'positional_csv'
+    check (import_format in ('positional_csv', 'csv', 'json')),
+  add column if not exists poll_interval_seconds int not null default 3600 check (poll_interval_seconds >= 60),
+  add column if not exists etag text,
+  add column if not exists last_modified text,  -- raw Last-Modified header, sent back as If-Modified-Since
+  add column if not exists last_checked_at timestamptz,
+  add column if not exists next_poll_at timestamptz not null default now(),
+  add column if not exists consecutive_failures int not null default 0,
+  add column if not exists last_error text;
+
+-- The admin import used to log a row per run; keep the latest per (game, url).
+delete from public.game_sources a
+using public.game_sources b
+where a.game_id = b.game_id
+  and a.source_url = b.source_url
+  and (coalesce(a.last_import_at, a.created_at), a.id) < (coalesce(b.last_import_at, b.created_at), b.id);
+
+create unique index if not exists game_sources_game_url_key on public.game_sources (game_id, source_url);
+create index if not exists game_sources_due_idx on public.game_sources (next_poll_at) where is_active;
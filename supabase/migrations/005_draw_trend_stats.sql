@@ -0,0 +1,220 @@
+-- Mooses Place - recency-decayed number frequencies ("trend"), kept current by triggers on public.draws
+--
+-- draw_number_stats.trend: sum of decay^ago over the draws of the pool containing the number,
+--   ago = 0 for the latest draw and decay = 0.5^(1 / trend_half_life_draws).
+-- draw_pool_stats.trend_mass: the same sum over all of the pool's draws, so trend / trend_mass is
+--   a recency-weighted appearance rate.
+--
+-- Draws inserted after a pool's trend_latest_draw_date (the usual import) are folded in with one
+-- pass over the pool's numbers: trend = trend * decay^m + the new draws' terms. Anything else
+-- (backfills, updates, deletes) recomputes the game from its latest 40 half-lives of draws; older
+-- draws weigh less than 2^-40. Changing a pool's half-life recomputes it:
+--   update public.draw_pool_stats set trend_half_life_draws = 100 where game_id = '...' and pool = 'main';
+
+alter table public.draw_number_stats
+  add column if not exists trend float8 not null default 0;
+
+alter table public.draw_pool_stats
+  add column if not exists trend_half_life_draws float8 not null default 50 check (trend_half_life_draws > 0),
+  add column if not exists trend_mass float8 not null default 0,
+  add column if not exists trend_latest_draw_date date;  -- latest draw folded into trend
+
+-- Recompute trend and trend_mass for every pool of the given games.
+create or replace function public.refresh_draw_trend(game_ids uuid[])
+returns void
+language sql
+as $$
+  with targets as (
+    select ps.game_id, ps.pool,
+      0.5 ^ (1.0 / ps.trend_half_life_draws) as decay,
+      ceil(40 * ps.trend_half_life_draws)::int as horizon
+    from public.draw_pool_stats ps
+    where ps.game_id = any(game_ids)
+  ),
+  recent as (
+    select t.game_id, t.pool, t.decay, r.draw_date, r.nums,
+      row_number() over (partition by t.game_id, t.pool order by r.draw_date desc) - 1 as ago
+    from targets t
+    cross join lateral (
+      select d.draw_date, public.draw_pool_numbers(d.numbers, t.pool) as nums
+      from public.draws d
+      where d.game_id = t.game_id and public.draw_pool_numbers(d.numbers, t.pool) is not null
+      order by d.draw_date desc
+      limit t.horizon
+    ) r
+  ),
+  pools as (
+    update public.draw_pool_stats ps
+    set trend_mass = coalesce(m.mass, 0),
+        trend_latest_draw_date = m.latest,
+        updated_at = now()
+    from targets t
+    left join (
+      select game_id, pool, sum(decay ^ ago) as mass, max(draw_date) as latest
+      from recent
+      group by 1, 2
+    ) m using (game_id, pool)
+    where (ps.game_id, ps.pool) = (t.game_id, t.pool)
+  ),
+  hits as (
+    select r.game_id, r.pool, x.n, sum(r.decay ^ r.ago) as trend
+    from recent r
+    cross join lateral unnest(r.nums) x(n)
+    group by 1, 2, 3
+  )
+  update public.draw_number_stats s
+  set trend = coalesce(h.trend, 0)
+  from public.draw_number_stats s2
+  left join hits h using (game_id, pool, n)
+  where s2.game_id = any(game_ids)
+    and (s.game_id, s.pool, s.n) = (s2.game_id, s2.pool, s2.n)
+$$;
+
+-- Fires after draws_number_stats_* (triggers run in name order), so every number has its row.
+create or replace function public.apply_draw_trend()
+returns trigger
+language plpgsql
+as $$
+declare
+  ids uuid[];
+begin
+  -- Transition tables only exist for the events the trigger was created for.
+  if tg_op = 'INSERT' then
+    -- Pools that cannot be folded: draws at or before the latest folded one, or so many new
+    -- draws that decay^m would underflow.
+    select array_agg(distinct game_id) into ids
+    from (
+      select a.game_id
+      from (
+        select r.game_id, p.pool, r.draw_date
+        from new_rows r
+        cross join (values ('main'), ('bonus')) p(pool)
+        where public.draw_pool_numbers(r.numbers, p.pool) is not null
+      ) a
+      join public.draw_pool_stats ps using (game_id, pool)
+      group by a.game_id, a.pool, ps.trend_latest_draw_date, ps.trend_half_life_draws
+      having min(a.draw_date) <= ps.trend_latest_draw_date or count(*) > 40 * ps.trend_half_life_draws
+    ) s;
+
+    with added as (
+      select r.game_id, p.pool, public.draw_pool_numbers(r.numbers, p.pool) as nums, r.draw_date,
+        row_number() over (partition by r.game_id, p.pool order by r.draw_date desc) - 1 as ago
+      from new_rows r
+      cross join (values ('main'), ('bonus')) p(pool)
+      where public.draw_pool_numbers(r.numbers, p.pool) is not null
+        and not (r.game_id = any(coalesce(ids, '{}')))
+    ),
+    folds as (
+      select a.game_id, a.pool, count(*) as m, max(a.draw_date) as latest,
+        0.5 ^ (1.0 / ps.trend_half_life_draws) as decay
+      from added a
+      join public.draw_pool_stats ps using (game_id, pool)
+      group by a.game_id, a.pool, ps.trend_half_life_draws
+    ),
+    hits as (
+      select a.game_id, a.pool, x.n, sum(f.decay ^ a.ago) as trend
+      from added a
+      join folds f using (game_id, pool)
+      cross join lateral unnest(a.nums) x(n)
+      group by 1, 2, 3
+    ),
+    pools as (
+      update public.draw_pool_stats ps
+      set trend_mass = ps.trend_mass * f.decay ^ f.m + (1 - f.decay ^ f.m) / (1 - f.decay),
+          trend_latest_draw_date = f.latest,
+          updated_at = now()
+      from folds f
+      where (ps.game_id, ps.pool) = (f.game_id, f.pool)
+    )
+    update public.draw_number_stats s
+    -- Terms below 1e-12 are dropped rather than decayed further: float8 underflow is an error.
+    set trend = case when s.trend < 1e-12 then 0 else s.trend * f.decay ^ f.m end + coalesce(h.trend, 0)
+    from public.draw_number_stats s2
+    join folds f using (game_id, pool)
+    left join hits h using (game_id, pool, n)
+    where (s.game_id, s.pool, s.n) = (s2.game_id, s2.pool, s2.n);
+  elsif tg_op = 'DELETE' then
+    select array_agg(distinct game_id) into ids from old_rows;
+  else
+    -- Only games whose draws actually changed (an upsert may just touch source).
+    select array_agg(distinct game_id) into ids
+    from (
+      (select game_id, draw_date, numbers from new_rows except select game_id, draw_date, numbers from old_rows)
+      union all
+      (select game_id, draw_date, numbers from old_rows except select game_id, draw_date, numbers from new_rows)
+    ) c;
+  end if;
+
+  if ids is not null then
+    perform public.refresh_draw_trend(ids);
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists draws_trend_ins on public.draws;
+create trigger draws_trend_ins
+  after insert on public.draws
+  referencing new table as new_rows
+  for each statement execute function public.apply_draw_trend();
+
+drop trigger if exists draws_trend_upd on public.draws;
+create trigger draws_trend_upd
+  after update on public.draws
+  referencing old table as old_rows new table as new_rows
+  for each statement execute function public.apply_draw_trend();
+
+drop trigger if exists draws_trend_del on public.draws;
+create trigger draws_trend_del
+  after delete on public.draws
+  referencing old table as old_rows
+  for each statement execute function public.apply_draw_trend();
+
+create or replace function public.apply_draw_trend_half_life()
+returns trigger
+language plpgsql
+as $$
+begin
+  perform public.refresh_draw_trend(array[new.game_id]);
+  return null;
+end;
+$$;
+
+drop trigger if exists draw_pool_stats_trend_half_life on public.draw_pool_stats;
+create trigger draw_pool_stats_trend_half_life
+  after update of trend_half_life_draws on public.draw_pool_stats
+  for each row
+  when (old.trend_half_life_draws is distinct from new.trend_half_life_draws)
+  execute function public.apply_draw_trend_half_life();
+
+-- rebuild_draw_number_stats (003) recreates the number rows; recompute their trend too.
+create or replace function public.rebuild_draw_number_stats(p_game_id uuid default null)
+returns int
+language plpgsql
+as $$
+declare
+  ids uuid[];
+  n_rows int;
+begin
+  select array_agg(id) into ids from public.games where p_game_id is null or id = p_game_id;
+  if ids is null then
+    return 0;
+  end if;
+
+  delete from public.draw_number_stats where game_id = any(ids);
+  insert into public.draw_number_stats (game_id, pool, n, count, last_seen_date)
+  select d.game_id, x.pool, x.n, count(*), max(d.draw_date)
+  from public.draws d
+  cross join lateral public.draw_pool_entries(d.numbers) x
+  where d.game_id = any(ids)
+  group by 1, 2, 3;
+  get diagnostics n_rows = row_count;
+
+  perform public.refresh_draw_number_windows(ids);
+  perform public.refresh_draw_trend(ids);
+  return n_rows;
+end;
+$$;
+
+-- Backfill for existing draws
+select public.refresh_draw_trend(array(select id from public.games));